@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from typing import Any, Dict, Optional
+import os
+import hmac
+
+from app.core.profiler import profile, ProfilerBusy, PROFILE_MAX_SECONDS
+
+router = APIRouter()
+
+# Shared secret for the admin endpoints; they are disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(token: Optional[str]) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Admin endpoints are disabled")
+    if not token or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+@router.get("/profile")
+def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=PROFILE_MAX_SECONDS, description="How long to sample"),
+    interval_ms: float = Query(5.0, ge=1, le=1000, description="Time between stack samples"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$", description="collapsed (flamegraph.pl/speedscope) or json"),
+    include_idle: bool = Query(False, description="Keep samples of threads blocked in waits and selects"),
+    allocations: int = Query(0, ge=0, le=200, description="Also return this many top tracemalloc allocation sites (json only)"),
+    x_admin_token: Optional[str] = Header(None),
+) -> Any:
+    """Sample the stacks of the worker serving this request.
+
+    Only the process that receives the request is profiled; with several
+    workers, the pid in the response tells which one it was.
+    """
+    require_admin(x_admin_token)
+    try:
+        result: Dict[str, Any] = profile(seconds, interval_ms, include_idle, allocations if format == "json" else 0)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    if format == "json":
+        return result
+    return PlainTextResponse(
+        "\n".join(result["collapsed"]) + "\n",
+        headers={"X-Profile-Pid": str(result["pid"]), "X-Profile-Samples": str(result["samples"])},
+    )
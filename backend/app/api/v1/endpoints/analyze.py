@@ -1,22 +1,38 @@
-from fastapi import APIRouter, Query, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import Dict, Any
+from fastapi import APIRouter, Query, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, joinedload
+from typing import Dict, Any, Iterator, List, Optional
 import os
+import json
+import time
+import uuid
+import logging
 
-from app.db.database import get_db
+from app.db.database import get_db, SessionLocal
 from app.db.models import Scan as ScanModel, Segmentation as SegmentationModel
-from app.services.mri_segmenter import MRISegmenter
-from app.services.ct_analyzer import CTAnalyzer
-from app.services.xray_model import XRayModel
-from app.services.histo_classifier import HistoClassifier
+from app.core.schemas import BatchAnalysisRequest
+from app.services import model_registry
+from app.services.mask_writer import mask_writer
+from app.services.instrumentation import StageTimer, stage_listener
+from app.services.events import StageProgress, publish_job
+from app.core.metrics import observe_inference
+from app.core.http_cache import not_modified, patient_version
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Maximum images accepted by one batch request
+ANALYZE_BATCH_MAX_ITEMS = int(os.getenv("ANALYZE_BATCH_MAX_ITEMS", "256"))
+
 @router.get("/")
 async def analyze(
     scan_id: str = Query(None),
     filename: str = Query(None),
     modality: str = Query(None),
+    tta_views: int = Query(None, ge=1, le=8, description="Histopathology test-time augmentation views"),
+    tta_budget_ms: float = Query(None, gt=0, description="Latency budget that caps the TTA views"),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """Analyze a medical scan using the appropriate ML model based on modality"""
@@ -42,6 +58,7 @@ async def analyze(
         file_path = str(scan.file_path)
         modality = scan.modality.upper()
         body_part = str(scan.body_part)
+        patient_row_id = str(scan.patient_id)
         
     elif filename and modality:
         # Direct file analysis (for histopathology or other direct analysis)
@@ -53,6 +70,7 @@ async def analyze(
             )
         modality = modality.upper()
         body_part = "Breast"  # Default for histopathology
+        patient_row_id = None
         
     else:
         raise HTTPException(
@@ -60,19 +78,28 @@ async def analyze(
             detail="Either scan_id or both filename and modality must be provided"
         )
     
+    # Subscribers of /api/v1/events follow analyses of stored scans
+    progress = StageProgress(scan_id, patient_row_id) if scan_id else None
+    if scan_id:
+        publish_job(scan_id, patient_row_id, "running", modality=modality)
+    
     try:
-        if modality == "MRI":
-            segmenter = MRISegmenter()
-            result = segmenter.analyze(file_path, body_part)
-        elif modality == "CT":
-            analyzer = CTAnalyzer()
-            result = analyzer.analyze(file_path, body_part)
-        elif modality == "XRAY":
-            model = XRayModel()
-            result = model.analyze(file_path, body_part)
-        elif modality == "HISTOPATH":
-            classifier = HistoClassifier()
-            result = classifier.analyze(file_path, body_part)
+        if modality in model_registry.registered():
+            # Analyzers are shared per process so model weights are loaded once
+            analyzer = model_registry.get(modality)
+            
+            def run() -> Dict[str, Any]:
+                token = stage_listener.set(progress)
+                try:
+                    if modality == "HISTOPATH":
+                        return analyzer.analyze(file_path, body_part, tta_views=tta_views, tta_budget_ms=tta_budget_ms)
+                    return analyzer.analyze(file_path, body_part)
+                finally:
+                    stage_listener.reset(token)
+            
+            # Off the event loop, so event streams and other requests keep flowing
+            result = await run_in_threadpool(run)
+            observe_inference(modality, float(result.get("processing_time_seconds", 0.0)))
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -87,12 +114,23 @@ async def analyze(
             tumor_volume_mm3=float(result.get("tumor_volume_mm3", 0.0)),
             confidence_score=float(result.get("confidence_score", 0.0)),
             segmentation_method=result.get("model_name", "Unknown"),
-            processing_time_seconds=float(result.get("processing_time_seconds", 0.0))
+            processing_time_seconds=float(result.get("processing_time_seconds", 0.0)),
+            mask_status=result.get("mask_status"),
+            stage_timings=result.get("analysis_details", {}).get("stage_timings")
         )
         
         db.add(segmentation)
         db.commit()
         db.refresh(segmentation)
+        mask_writer.reconcile(db, segmentation)
+        if scan_id:
+            publish_job(
+                scan_id, patient_row_id, "completed",
+                segmentation_id=str(segmentation.id),
+                tumor_volume_cc=float(segmentation.tumor_volume_cc),
+                confidence_score=float(segmentation.confidence_score),
+                mask_status=segmentation.mask_status,
+            )
         
         return {
             "scan_id": str(scan_id),
@@ -104,30 +142,229 @@ async def analyze(
             "confidence_score": float(segmentation.confidence_score),
             "processing_time_seconds": float(segmentation.processing_time_seconds),
             "mask_path": str(segmentation.mask_path),
+            "mask_status": segmentation.mask_status,
             "analysis_details": result.get("analysis_details", {}),
             "status": "completed"
         }
         
     except Exception as e:
+        if scan_id:
+            publish_job(scan_id, patient_row_id, "failed", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Analysis failed: {str(e)}"
         )
 
+@router.post("/batch")
+def analyze_batch(request: BatchAnalysisRequest, db: Session = Depends(get_db)) -> StreamingResponse:
+    """Classify many histopathology images with one model instance, streaming NDJSON results.
+
+    Each line is a result or error for one input, emitted as soon as its
+    batch completes, followed by a summary line. Segmentation rows for
+    scan inputs are written in a single transaction once every batch has
+    run; the summary reports whether that commit succeeded.
+    """
+    item_count = len(request.scan_ids) + len(request.filenames)
+    if not item_count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide at least one scan_id or filename"
+        )
+    if item_count > ANALYZE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch too large: {item_count} items (maximum {ANALYZE_BATCH_MAX_ITEMS})"
+        )
+    
+    items = _resolve_batch_items(request, db)
+    return StreamingResponse(
+        _run_batch(items, request.tta_views, request.tta_budget_ms), media_type="application/x-ndjson"
+    )
+
+def _resolve_batch_items(request: BatchAnalysisRequest, db: Session) -> List[Dict[str, Any]]:
+    """Look up every input up front and pre-assign segmentation IDs"""
+    items: List[Dict[str, Any]] = []
+    
+    scans = {}
+    analyzed = set()
+    if request.scan_ids:
+        scans = {scan.id: scan for scan in db.query(ScanModel).filter(ScanModel.id.in_(request.scan_ids))}
+        analyzed = {
+            scan_id for (scan_id,) in
+            db.query(SegmentationModel.scan_id).filter(SegmentationModel.scan_id.in_(request.scan_ids))
+        }
+    seen = set()
+    for scan_id in request.scan_ids:
+        item = {"index": len(items), "scan_id": scan_id, "filename": None}
+        scan = scans.get(scan_id)
+        if scan_id in seen:
+            item["error"] = f"Duplicate scan ID {scan_id}"
+        elif scan is None:
+            item["error"] = f"Scan with ID {scan_id} not found"
+        elif scan.modality.upper() != "HISTOPATH":
+            item["error"] = f"Batch analysis supports HISTOPATH scans only, got {scan.modality}"
+        elif scan_id in analyzed:
+            item["error"] = f"Analysis already exists for scan {scan_id}"
+        else:
+            item.update(file_path=str(scan.file_path), body_part=str(scan.body_part))
+        seen.add(scan_id)
+        items.append(item)
+    
+    for filename in request.filenames:
+        item = {"index": len(items), "scan_id": None, "filename": filename}
+        file_path = os.path.join("data/uploads", filename)
+        if os.path.basename(filename) != filename:
+            item["error"] = f"Invalid filename: {filename}"
+        elif not os.path.exists(file_path):
+            item["error"] = f"File {filename} not found in uploads directory"
+        else:
+            item.update(file_path=file_path, body_part=request.body_part)
+        items.append(item)
+    
+    for item in items:
+        if "error" not in item:
+            item["segmentation_id"] = str(uuid.uuid4())
+    return items
+
+def _run_batch(items: List[Dict[str, Any]], tta_views: Optional[int], tta_budget_ms: Optional[float]) -> Iterator[bytes]:
+    from app.services.histo_pipeline import DecodePipeline
+    
+    start_time = time.perf_counter()
+    completed = 0
+    segmentations = []
+    
+    def emit(item: Dict[str, Any], result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> bytes:
+        nonlocal completed
+        line = {"index": item["index"], "scan_id": item["scan_id"], "filename": item["filename"]}
+        if error is not None:
+            line.update(type="error", status="failed", error=error)
+        else:
+            completed += 1
+            line.update(
+                type="result",
+                status="completed",
+                segmentation_id=item["segmentation_id"],
+                model_name=result.get("model_name", "Unknown"),
+                confidence_score=float(result.get("confidence_score", 0.0)),
+                processing_time_seconds=float(result.get("processing_time_seconds", 0.0)),
+                mask_path=result.get("mask_path", ""),
+                mask_status=result.get("mask_status"),
+                analysis_details=result.get("analysis_details", {}),
+            )
+            if item["scan_id"]:
+                segmentations.append(SegmentationModel(
+                    id=item["segmentation_id"],
+                    scan_id=item["scan_id"],
+                    mask_path=result.get("mask_path", ""),
+                    tumor_volume_cc=float(result.get("tumor_volume_cc", 0.0)),
+                    tumor_volume_mm3=float(result.get("tumor_volume_mm3", 0.0)),
+                    confidence_score=float(result.get("confidence_score", 0.0)),
+                    segmentation_method=result.get("model_name", "Unknown"),
+                    processing_time_seconds=float(result.get("processing_time_seconds", 0.0)),
+                    mask_status=result.get("mask_status"),
+                    stage_timings=result.get("analysis_details", {}).get("stage_timings")
+                ))
+        return (json.dumps(line) + "\n").encode()
+    
+    runnable = []
+    for item in items:
+        if "error" in item:
+            yield emit(item, error=item["error"])
+        else:
+            runnable.append(item)
+    
+    classifier = model_registry.get("HISTOPATH")
+    
+    # Whole-slide scans go through the tiled path one at a time; everything
+    # else is decoded ahead of the model and classified in real batches
+    images: Dict[str, List[Dict[str, Any]]] = {}
+    for item in runnable:
+        if classifier.is_slide(item["file_path"]):
+            result = classifier.analyze(item["file_path"], item["body_part"])
+            observe_inference("HISTOPATH", float(result.get("processing_time_seconds", 0.0)))
+            yield emit(item, result)
+        else:
+            images.setdefault(item["file_path"], []).append(item)
+    
+    pipeline = DecodePipeline(classifier)
+    # The budget applies to each forward pass of a full pipeline batch
+    views = classifier.tta_views_for(tta_views, tta_budget_ms, pipeline.batch_size)
+    batch_start = time.perf_counter()
+    try:
+        for paths, probabilities, errors in pipeline.run(list(images), views):
+            elapsed = time.perf_counter() - batch_start
+            if paths:
+                observe_inference("HISTOPATH", elapsed, len(paths))
+            for path, error in errors.items():
+                for item in images[path]:
+                    yield emit(item, error=f"Failed to preprocess image: {error}")
+            for path, row in zip(paths, probabilities if probabilities is not None else []):
+                prediction = classifier.format_prediction(row)
+                for item in images[path]:
+                    # Decode and inference overlap in the pipeline, so each image
+                    # gets an even share of the time its batch took
+                    share = elapsed / len(paths)
+                    timer = StageTimer()
+                    timer.add("pipeline_batch", share)
+                    result = classifier.image_result(prediction, item["body_part"], timer, views, share)
+                    yield emit(item, result)
+            batch_start = time.perf_counter()
+    except Exception as e:
+        logger.error(f"Batch analysis failed: {e}")
+        yield (json.dumps({"type": "error", "status": "failed", "error": f"Batch analysis failed: {e}"}) + "\n").encode()
+    
+    # One transaction for every scan-backed result
+    persisted = False
+    persist_error = None
+    if segmentations:
+        db = SessionLocal()
+        try:
+            db.add_all(segmentations)
+            db.commit()
+            persisted = True
+        except Exception as e:
+            db.rollback()
+            persist_error = str(e)
+            logger.error(f"Failed to store batch segmentations: {e}")
+        finally:
+            db.close()
+    
+    summary = {
+        "type": "summary",
+        "total": len(items),
+        "completed": completed,
+        "failed": len(items) - completed,
+        "segmentations_stored": len(segmentations) if persisted else 0,
+        "elapsed_seconds": time.perf_counter() - start_time,
+    }
+    if persist_error:
+        summary["error"] = f"Failed to store segmentations: {persist_error}"
+    yield (json.dumps(summary) + "\n").encode()
+
 @router.get("/status/{scan_id}")
 async def get_analysis_status(
     scan_id: str,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """Get the analysis status for a specific scan"""
     
-    scan = db.query(ScanModel).filter(ScanModel.id == scan_id).first()
+    scan = db.query(ScanModel).options(joinedload(ScanModel.patient)).filter(ScanModel.id == scan_id).first()
     if not scan:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Scan with ID {scan_id} not found"
         )
     
+    # A new segmentation or mask state bumps the patient's revision, so
+    # polls between changes are answered without touching the segmentation
+    version = patient_version(scan.patient)
+    cached = not_modified(request, version)
+    if cached is not None:
+        return cached
+    response.headers.update(version.headers())
+    
     segmentation = db.query(SegmentationModel).filter(SegmentationModel.scan_id == scan_id).first()
     
     if segmentation:
@@ -139,6 +376,8 @@ async def get_analysis_status(
             "model_name": str(segmentation.segmentation_method),
             "tumor_volume_cc": float(segmentation.tumor_volume_cc),
             "confidence_score": float(segmentation.confidence_score),
+            "mask_status": segmentation.mask_status,
+            "stage_timings": segmentation.stage_timings,
             "created_at": segmentation.created_at.isoformat()
         }
     else:
@@ -0,0 +1,90 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import AsyncIterator, List, Optional
+import os
+import asyncio
+
+from app.db.database import get_db
+from app.db.models import Patient as PatientModel
+from app.core.responses import dumps
+from app.services.events import broker, patient_topic, scan_topic
+
+router = APIRouter()
+
+# Idle streams get a comment line this often so proxies keep them open
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+# Patients plus scans one stream may follow
+EVENTS_MAX_TOPICS = 100
+# Milliseconds browsers wait before reconnecting a dropped stream
+EVENTS_RETRY_MS = 3000
+
+@router.get("/")
+def stream_events(
+    patient_id: Optional[List[str]] = Query(None, description="Patients whose analyses and alerts to follow (repeatable)"),
+    scan_id: Optional[List[str]] = Query(None, description="Scans whose analyses to follow (repeatable)"),
+    db: Session = Depends(get_db)
+) -> StreamingResponse:
+    """Server-sent events for analysis state, stage progress, mask state and new alerts.
+
+    Event types are ``job`` (running, completed, failed), ``stage``, ``mask``
+    and ``alert``; each ``data`` line is one JSON object.
+    """
+    patient_ids = patient_id or []
+    scan_ids = scan_id or []
+    if not patient_ids and not scan_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Subscribe to at least one patient_id or scan_id"
+        )
+    if len(patient_ids) + len(scan_ids) > EVENTS_MAX_TOPICS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {EVENTS_MAX_TOPICS} patients and scans per stream"
+        )
+    if broker.full:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many open event streams on this worker"
+        )
+    
+    topics = [scan_topic(s) for s in scan_ids]
+    if patient_ids:
+        # Events are keyed by patient row id, which clients never see
+        rows = db.query(PatientModel.id, PatientModel.patient_id).filter(PatientModel.patient_id.in_(patient_ids)).all()
+        missing = set(patient_ids) - {business_id for _, business_id in rows}
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Patients not found: {', '.join(sorted(missing))}"
+            )
+        topics += [patient_topic(row_id) for row_id, _ in rows]
+    
+    return StreamingResponse(
+        _stream(topics),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _stream(topics: List[str]) -> AsyncIterator[str]:
+    # Subscribed only once the body is being sent, so an unsent response cannot leak a subscriber
+    subscription = broker.subscribe(topics)
+    if subscription is None:
+        yield f"event: error\ndata: {dumps({'detail': 'Too many open event streams on this worker'}).decode()}\n\n"
+        return
+    reported_drops = 0
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if subscription.dropped != reported_drops:
+                # The client fell behind; tell it to refetch rather than trust the stream
+                yield f"event: lagged\ndata: {dumps({'dropped': subscription.dropped - reported_drops}).decode()}\n\n"
+                reported_drops = subscription.dropped
+            yield f"event: {event['type']}\ndata: {dumps(event).decode()}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
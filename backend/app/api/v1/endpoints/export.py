@@ -0,0 +1,192 @@
+from fastapi import APIRouter, Query, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from typing import Any, Iterator, List, Optional, Sequence
+from datetime import datetime
+import os
+import logging
+
+from app.db.database import engine
+from app.db.models import Patient as PatientModel, Scan as ScanModel, Segmentation as SegmentationModel
+from app.core.responses import dumps
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Rows fetched from the database cursor and encoded per batch
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "10000"))
+
+# Exported columns; patient names are left out of research exports
+EXPORT_COLUMNS = [
+    ("segmentation_id", SegmentationModel.id),
+    ("scan_id", ScanModel.id),
+    ("patient_id", PatientModel.patient_id),
+    ("patient_gender", PatientModel.gender),
+    ("patient_date_of_birth", PatientModel.date_of_birth),
+    ("diagnosis", PatientModel.diagnosis),
+    ("scan_date", ScanModel.scan_date),
+    ("modality", ScanModel.modality),
+    ("scan_type", ScanModel.scan_type),
+    ("body_part", ScanModel.body_part),
+    ("file_size", ScanModel.file_size),
+    ("segmentation_method", SegmentationModel.segmentation_method),
+    ("tumor_volume_cc", SegmentationModel.tumor_volume_cc),
+    ("tumor_volume_mm3", SegmentationModel.tumor_volume_mm3),
+    ("confidence_score", SegmentationModel.confidence_score),
+    ("processing_time_seconds", SegmentationModel.processing_time_seconds),
+    ("mask_status", SegmentationModel.mask_status),
+    ("segmented_at", SegmentationModel.created_at),
+]
+EXPORT_KEYS = [name for name, _ in EXPORT_COLUMNS]
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+@router.get("/segmentations")
+def export_segmentations(
+    format: str = Query("ndjson", pattern="^(ndjson|arrow|parquet)$", description="ndjson, arrow (IPC stream) or parquet"),
+    modality: Optional[List[str]] = Query(None, description="Modalities to include (repeatable)"),
+    body_part: Optional[str] = Query(None),
+    start_date: Optional[datetime] = Query(None, description="Earliest scan date (inclusive)"),
+    end_date: Optional[datetime] = Query(None, description="Latest scan date (exclusive)"),
+) -> StreamingResponse:
+    """Stream every segmentation with its scan and patient metadata.
+
+    Rows are read from a server-side cursor and encoded batch by batch, so
+    memory stays constant however many rows match.
+    """
+    if format != "ndjson":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{format} export requires pyarrow, which is not installed; use format=ndjson"
+            )
+
+    query = export_query(modality, body_part, start_date, end_date)
+    media_type, extension = FORMATS[format]
+    return StreamingResponse(
+        ENCODERS[format](_batches(query)),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=segmentations.{extension}"},
+    )
+
+def export_query(
+    modality: Optional[List[str]] = None,
+    body_part: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    """Select the export columns for the filtered segmentations, oldest scan first"""
+    query = (
+        select(*[column.label(name) for name, column in EXPORT_COLUMNS])
+        .join(ScanModel, SegmentationModel.scan_id == ScanModel.id)
+        .join(PatientModel, ScanModel.patient_id == PatientModel.id)
+        .order_by(ScanModel.scan_date, SegmentationModel.id)
+    )
+    if modality:
+        query = query.where(ScanModel.modality.in_([m.upper() for m in modality]))
+    if body_part:
+        query = query.where(ScanModel.body_part == body_part)
+    if start_date:
+        query = query.where(ScanModel.scan_date >= start_date)
+    if end_date:
+        query = query.where(ScanModel.scan_date < end_date)
+    return query
+
+def _batches(query) -> Iterator[Sequence[Any]]:
+    """Row batches from a server-side cursor on a connection owned by the stream"""
+    # The request's session is closed before a streaming body runs, so the
+    # generator holds its own connection for as long as the client reads
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_ROWS).execute(query)
+        for rows in result.partitions():
+            yield rows
+
+def _ndjson(batches: Iterator[Sequence[Any]]) -> Iterator[bytes]:
+    keys = EXPORT_KEYS
+    # Each batch is encoded as one compact JSON array, which costs a fraction of
+    # a dumps call per row, and then split into lines. Rows are flat objects that
+    # all open with the same key, and a quote inside a string is always escaped,
+    # so this separator only ever occurs between two rows.
+    first = b'{"' + keys[0].encode() + b'":'
+    separator = b"}," + first
+    for rows in batches:
+        if rows:
+            array = dumps([dict(zip(keys, row)) for row in rows])
+            yield array[1:-1].replace(separator, b"}\n" + first) + b"\n"
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    types = {
+        "patient_date_of_birth": pa.timestamp("us"),
+        "scan_date": pa.timestamp("us"),
+        "segmented_at": pa.timestamp("us"),
+        "file_size": pa.int64(),
+        "tumor_volume_cc": pa.float64(),
+        "tumor_volume_mm3": pa.float64(),
+        "confidence_score": pa.float64(),
+        "processing_time_seconds": pa.float64(),
+    }
+    return pa.schema([(name, types.get(name, pa.string())) for name in EXPORT_KEYS])
+
+def _record_batch(rows: Sequence[Any], schema):
+    import pyarrow as pa
+
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+    )
+
+class _ChunkSink:
+    """Write-only file object whose contents are drained after every batch"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+def _arrow_stream(batches: Iterator[Sequence[Any]]) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema) as writer:
+        for rows in batches:
+            writer.write_batch(_record_batch(rows, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+def _parquet(batches: Iterator[Sequence[Any]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    # One row group per batch; the footer is written when the writer closes
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd") as writer:
+        for rows in batches:
+            writer.write_batch(_record_batch(rows, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+ENCODERS = {"ndjson": _ndjson, "arrow": _arrow_stream, "parquet": _parquet}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from typing import List, Dict, Any
@@ -6,7 +6,11 @@ from datetime import datetime, timedelta
 
 from app.db.database import get_db
 from app.db.models import Patient as PatientModel, Scan as ScanModel, Segmentation as SegmentationModel, MonitoringAlert as AlertModel
-from app.core.schemas import PatientDashboard, Scan as ScanSchema, MonitoringAlert
+from app.core.schemas import PatientDashboard, Patient as PatientSchema, Scan as ScanSchema, Segmentation as SegmentationSchema, MonitoringAlert
+from app.core.responses import FastJSONResponse, row_dict, row_dicts
+from app.core.http_cache import Version, not_modified, patient_version
+from app.core.query_cache import patient_tag, query_cache
+from app.api.v1.endpoints.patients import cached_patient
 
 router = APIRouter()
 
@@ -76,7 +80,7 @@ def check_for_alerts(patient_id: str, db: Session) -> List[Dict[str, Any]]:
     return alerts
 
 @router.get("/patient/{patient_id}/dashboard", response_model=PatientDashboard)
-async def get_patient_dashboard(patient_id: str, db: Session = Depends(get_db)):
+async def get_patient_dashboard(patient_id: str, request: Request, db: Session = Depends(get_db)):
     """Get comprehensive dashboard data for a patient"""
     # Get patient
     patient = db.query(PatientModel).filter(PatientModel.patient_id == patient_id).first()
@@ -86,6 +90,12 @@ async def get_patient_dashboard(patient_id: str, db: Session = Depends(get_db)):
             detail=f"Patient with ID {patient_id} not found"
         )
     
+    # Unchanged since the client's copy: skip the scan, alert and trend queries
+    version = patient_version(patient)
+    cached = not_modified(request, version)
+    if cached is not None:
+        return cached
+    
     # Get all scans for the patient
     scans = db.query(ScanModel).filter(ScanModel.patient_id == patient.id).order_by(desc(ScanModel.scan_date)).all()
     
@@ -106,39 +116,45 @@ async def get_patient_dashboard(patient_id: str, db: Session = Depends(get_db)):
     # Calculate tumor trend
     tumor_trend = calculate_tumor_trend(patient_id, db)
     
-    return PatientDashboard(
-        patient=patient,
-        scans=[ScanSchema.model_validate(scan) for scan in scans],
-        latest_segmentation=latest_segmentation,
-        alerts=[MonitoringAlert.model_validate(alert) for alert in alerts],
-        tumor_trend=tumor_trend
-    )
+    # Rows come straight from the database, so they are serialized without
+    # re-validation; response_model still documents the shape
+    return FastJSONResponse({
+        "patient": row_dict(patient, PatientSchema),
+        "scans": row_dicts(scans, ScanSchema),
+        "latest_segmentation": row_dict(latest_segmentation, SegmentationSchema),
+        "alerts": row_dicts(alerts, MonitoringAlert),
+        "tumor_trend": tumor_trend
+    }, headers=version.headers())
 
 @router.get("/patient/{patient_id}/trend")
-async def get_tumor_trend(patient_id: str, db: Session = Depends(get_db)):
+async def get_tumor_trend(patient_id: str, request: Request, db: Session = Depends(get_db)):
     """Get tumor volume trend over time"""
-    patient = db.query(PatientModel).filter(PatientModel.patient_id == patient_id).first()
-    if not patient:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Patient with ID {patient_id} not found"
-        )
-    
-    trend_data = calculate_tumor_trend(patient_id, db)
-    return {"trend_data": trend_data}
+    # The cached patient entry answers the 404 and 304 cases without a query
+    meta, _ = cached_patient(patient_id, db)
+    cached = not_modified(request, Version.from_headers(meta["headers"]))
+    if cached is not None:
+        return cached
+    
+    _, body = query_cache.get_or_load(
+        f"trend/{patient_id}",
+        lambda: ([patient_tag(meta["id"])], {}, {"trend_data": calculate_tumor_trend(patient_id, db)}),
+    )
+    return Response(body, media_type="application/json", headers=meta["headers"])
 
 @router.get("/patient/{patient_id}/alerts")
-async def get_patient_alerts(patient_id: str, db: Session = Depends(get_db)):
+async def get_patient_alerts(patient_id: str, request: Request, db: Session = Depends(get_db)):
     """Get all alerts for a patient"""
-    patient = db.query(PatientModel).filter(PatientModel.patient_id == patient_id).first()
-    if not patient:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Patient with ID {patient_id} not found"
-        )
+    meta, _ = cached_patient(patient_id, db)
+    cached = not_modified(request, Version.from_headers(meta["headers"]))
+    if cached is not None:
+        return cached
+    
+    def load():
+        alerts = db.query(AlertModel).filter(AlertModel.patient_id == meta["id"]).order_by(desc(AlertModel.created_at)).all()
+        return [patient_tag(meta["id"])], {}, {"alerts": row_dicts(alerts, MonitoringAlert)}
     
-    alerts = db.query(AlertModel).filter(AlertModel.patient_id == patient.id).order_by(desc(AlertModel.created_at)).all()
-    return {"alerts": alerts}
+    _, body = query_cache.get_or_load(f"alerts/{patient_id}", load)
+    return Response(body, media_type="application/json", headers=meta["headers"])
 
 @router.post("/patient/{patient_id}/check-alerts")
 async def check_patient_alerts(patient_id: str, db: Session = Depends(get_db)):
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, Dict, List, Tuple
 from datetime import datetime
 
 from app.db.database import get_db
 from app.db.models import Patient as PatientModel
 from app.core.schemas import Patient, PatientCreate
+from app.core.http_cache import Version, not_modified, patient_version
+from app.core.query_cache import PATIENTS_TAG, patient_tag, query_cache
+from app.core.responses import row_dict, row_dicts
 
 router = APIRouter()
 
@@ -26,22 +29,38 @@ def create_patient(patient: PatientCreate, db: Session = Depends(get_db)):
     db.refresh(db_patient)
     return db_patient
 
+def cached_patient(patient_id: str, db: Session) -> Tuple[Dict[str, Any], bytes]:
+    """Patient JSON, read through the query cache, with its row id and cache headers as metadata"""
+    def load():
+        patient = db.query(PatientModel).filter(PatientModel.patient_id == patient_id).first()
+        if patient is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Patient with ID {patient_id} not found"
+            )
+        meta = {"id": patient.id, "headers": patient_version(patient).headers()}
+        return [patient_tag(patient.id)], meta, row_dict(patient, Patient)
+    
+    return query_cache.get_or_load(f"patients/{patient_id}", load)
+
 @router.get("/", response_model=List[Patient])
 def get_patients(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all patients with pagination"""
-    patients = db.query(PatientModel).offset(skip).limit(limit).all()
-    return patients
+    def load():
+        patients = db.query(PatientModel).offset(skip).limit(limit).all()
+        return [PATIENTS_TAG], {}, row_dicts(patients, Patient)
+    
+    _, body = query_cache.get_or_load(f"patients?skip={skip}&limit={limit}", load)
+    return Response(body, media_type="application/json")
 
 @router.get("/{patient_id}", response_model=Patient)
-def get_patient(patient_id: str, db: Session = Depends(get_db)):
+def get_patient(patient_id: str, request: Request, db: Session = Depends(get_db)):
     """Get a specific patient by ID"""
-    patient = db.query(PatientModel).filter(PatientModel.patient_id == patient_id).first()
-    if patient is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Patient with ID {patient_id} not found"
-        )
-    return patient
+    meta, body = cached_patient(patient_id, db)
+    cached = not_modified(request, Version.from_headers(meta["headers"]))
+    if cached is not None:
+        return cached
+    return Response(body, media_type="application/json", headers=meta["headers"])
 
 @router.put("/{patient_id}", response_model=Patient)
 def update_patient(patient_id: str, patient_update: PatientCreate, db: Session = Depends(get_db)):
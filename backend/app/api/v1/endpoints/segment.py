@@ -1,17 +1,19 @@
 from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, status, Form
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import shutil
 import os
+import time
 import uuid
 from datetime import datetime
-import nibabel as nib  # type: ignore
-import numpy as np
 from typing import Optional
 
 from app.db.database import get_db
 from app.db.models import Scan as ScanModel, Segmentation as SegmentationModel, Patient as PatientModel
+from app.core.metrics import observe_upload
 from app.core.schemas import UploadResponse, SegmentationResponse
+from app.services.mask_writer import mask_writer, MASK_PENDING
 
 router = APIRouter()
 
@@ -30,11 +32,16 @@ def simulate_tumor_segmentation(file_path: str) -> dict:
     # This is a placeholder for actual TumorTrace integration
     # In production, this would call the TumorTrace model
     
+    # Imaging libraries are imported on first use to keep API startup light
+    import nibabel as nib  # type: ignore
+    import numpy as np
+    from app.services.volume_cache import load_volume
+    
     try:
         # Try to load with nibabel for NIfTI files
         if file_path.endswith(('.nii.gz', '.nii')):
-            img = nib.load(file_path)  # type: ignore
-            data = img.get_fdata() # type: ignore
+            volume = load_volume(file_path)
+            data = volume.data
             
             # Simulate segmentation by finding regions with high intensity
             # This is just a placeholder - real segmentation would use ML models
@@ -45,15 +52,15 @@ def simulate_tumor_segmentation(file_path: str) -> dict:
             volume_mm3 = np.sum(mask)
             volume_cc = volume_mm3 / 1000  # Convert to cc
             
-            # Save simulated mask
-            mask_filename = f"mask_{uuid.uuid4()}.nii.gz"
-            mask_path = os.path.join(MASKS_DIR, mask_filename)
+            # Queue simulated mask for background persistence
+            mask_path = mask_writer.mask_path("mask")
             
-            mask_img = nib.Nifti1Image(mask.astype(np.uint8), img.affine, img.header)  # type: ignore
-            nib.save(mask_img, mask_path)  # type: ignore
+            mask_img = nib.Nifti1Image(mask.astype(np.uint8), volume.affine, volume.header)  # type: ignore
+            mask_writer.submit(mask_img, mask_path)
             
             return {
                 "mask_path": mask_path,
+                "mask_status": MASK_PENDING,
                 "tumor_volume_mm3": float(volume_mm3),
                 "tumor_volume_cc": float(volume_cc),
                 "confidence_score": 0.85,  # Simulated confidence
@@ -118,11 +125,13 @@ async def upload_scan(
     file_path = os.path.join(UPLOAD_DIR, unique_filename)
     
     # Save file
+    save_start = time.perf_counter()
     with open(file_path, "wb") as f:
         shutil.copyfileobj(file.file, f)
     
     # Get file size
     file_size = os.path.getsize(file_path)
+    observe_upload(modality.upper(), file_size, time.perf_counter() - save_start)
     
     # Parse scan date
     try:
@@ -171,8 +180,9 @@ async def process_segmentation(scan_id: str, db: Session = Depends(get_db)):
             detail=f"Segmentation already exists for scan {scan_id}"
         )
     
-    # Simulate segmentation processing
-    segmentation_result = simulate_tumor_segmentation(str(scan.file_path))
+    # Simulate segmentation processing off the event loop; it decodes the
+    # volume and may wait for room in the mask writer queue
+    segmentation_result = await run_in_threadpool(simulate_tumor_segmentation, str(scan.file_path))
     
     # Create segmentation record
     segmentation = SegmentationModel(
@@ -181,12 +191,14 @@ async def process_segmentation(scan_id: str, db: Session = Depends(get_db)):
         tumor_volume_cc=segmentation_result["tumor_volume_cc"],
         tumor_volume_mm3=segmentation_result["tumor_volume_mm3"],
         confidence_score=segmentation_result["confidence_score"],
-        processing_time_seconds=segmentation_result["processing_time_seconds"]
+        processing_time_seconds=segmentation_result["processing_time_seconds"],
+        mask_status=segmentation_result.get("mask_status")
     )
     
     db.add(segmentation)
     db.commit()
     db.refresh(segmentation)
+    mask_writer.reconcile(db, segmentation)
     
     return SegmentationResponse(
         scan_id=str(scan_id),
@@ -195,7 +207,8 @@ async def process_segmentation(scan_id: str, db: Session = Depends(get_db)):
         tumor_volume_mm3=float(segmentation.tumor_volume_mm3),
         confidence_score=float(segmentation.confidence_score),
         processing_time_seconds=float(segmentation.processing_time_seconds),
-        mask_path=str(segmentation.mask_path)
+        mask_path=str(segmentation.mask_path),
+        mask_status=segmentation.mask_status
     )
 
 @router.get("/{scan_id}/segmentation", response_model=SegmentationResponse)
@@ -215,5 +228,6 @@ async def get_segmentation(scan_id: str, db: Session = Depends(get_db)):
         tumor_volume_mm3=float(segmentation.tumor_volume_mm3),
         confidence_score=float(segmentation.confidence_score),
         processing_time_seconds=float(segmentation.processing_time_seconds),
-        mask_path=str(segmentation.mask_path)
+        mask_path=str(segmentation.mask_path),
+        mask_status=segmentation.mask_status
     )
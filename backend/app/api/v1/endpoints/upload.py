@@ -3,12 +3,14 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 import shutil
 import os
+import time
 import uuid
 from datetime import datetime
 from typing import Optional
 
 from app.db.database import get_db
 from app.db.models import Scan as ScanModel, Patient as PatientModel
+from app.core.metrics import observe_upload
 from app.core.schemas import UploadResponse
 
 router = APIRouter()
@@ -95,11 +97,13 @@ async def upload_image(
     file_path = os.path.join(UPLOAD_DIR, unique_filename)
     
     # Save file
+    save_start = time.perf_counter()
     with open(file_path, "wb") as f:
         shutil.copyfileobj(file.file, f)
     
     # Get file size
     file_size = os.path.getsize(file_path)
+    observe_upload(modality.upper(), file_size, time.perf_counter() - save_start)
     
     # Parse scan date
     try:
@@ -0,0 +1,120 @@
+"""
+Response compression for large, complete bodies.
+
+Brotli is preferred when the client accepts it and the brotli package is
+installed, gzip otherwise. Streamed bodies (NDJSON, server-sent events,
+exports) are passed through untouched so they reach the client as they are
+produced.
+"""
+
+import os
+import gzip
+from typing import Any, Callable, Dict, List, Optional
+
+import anyio
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Brotli quality 4 compresses about as fast as gzip level 6 with smaller output
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# Larger bodies are compressed on a worker thread to keep the event loop responsive
+COMPRESSION_THREAD_BYTES = 256 * 1024
+
+# Streaming or already-compressed content types
+SKIP_CONTENT_TYPES = (
+    "application/x-ndjson",
+    "text/event-stream",
+    "application/vnd.apache.arrow",
+    "application/vnd.apache.parquet",
+    "application/octet-stream",
+    "application/gzip",
+    "image/",
+)
+
+
+def _accepted(headers: List[Any]) -> Optional[str]:
+    for name, value in headers:
+        if name == b"accept-encoding":
+            encodings = {part.split(b";")[0].strip() for part in value.lower().split(b",")}
+            if brotli is not None and b"br" in encodings:
+                return "br"
+            if b"gzip" in encodings:
+                return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing single-message response bodies"""
+
+    def __init__(self, app: Any, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        encoding = _accepted(scope.get("headers", [])) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Dict[str, Any]] = None
+        passthrough = False
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+                if b"content-encoding" in headers or content_type.startswith(SKIP_CONTENT_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Hold the headers until the first body chunk shows whether the body is complete
+                    start_message = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if start_message is not None:
+                pending, start_message = start_message, None
+                body = message.get("body", b"")
+                if message.get("more_body", False) or len(body) < self.minimum_size:
+                    # Streamed or small: send as produced
+                    passthrough = True
+                    await send(pending)
+                    await send(message)
+                    return
+                if len(body) >= COMPRESSION_THREAD_BYTES:
+                    compressed = await anyio.to_thread.run_sync(compress, body, encoding)
+                else:
+                    compressed = compress(body, encoding)
+                vary = [value for name, value in pending.get("headers", []) if name.lower() == b"vary"]
+                headers = [
+                    (name, value) for name, value in pending.get("headers", [])
+                    if name.lower() not in (b"content-length", b"vary")
+                ]
+                headers += [
+                    (b"content-encoding", encoding.encode()),
+                    (b"content-length", str(len(compressed)).encode()),
+                    (b"vary", b", ".join(vary + [b"Accept-Encoding"])),
+                ]
+                await send({**pending, "headers": headers})
+                await send({"type": "http.response.body", "body": compressed})
+                return
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,73 @@
+"""
+Conditional GETs for patient-scoped reads.
+
+Responses carry a weak ETag built from the patient's revision counter and a
+Last-Modified date from its last revision. A request whose If-None-Match (or,
+without one, If-Modified-Since) still matches gets a bodyless 304 before the
+endpoint runs its heavy queries. ``Cache-Control: no-cache`` lets browsers
+keep the body but revalidate on every poll.
+"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, NamedTuple, Optional
+
+from fastapi import Request, Response, status
+
+# Patient data must not be stored by shared caches
+CACHE_CONTROL = "private, no-cache"
+
+
+class Version(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+
+    @classmethod
+    def from_headers(cls, headers: Dict[str, str]) -> "Version":
+        """Rebuild a version from the headers it produced, e.g. a cached entry's"""
+        modified = headers.get("Last-Modified")
+        return cls(headers["ETag"], parsedate_to_datetime(modified) if modified else None)
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"ETag": self.etag, "Cache-Control": CACHE_CONTROL}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+
+def patient_version(patient: Any) -> Version:
+    """Version stamp of a patient row (ORM object or row with id, revision and timestamps)"""
+    modified = patient.revised_at or patient.updated_at or patient.created_at
+    if modified is not None:
+        modified = modified.replace(tzinfo=timezone.utc, microsecond=0)
+    return Version(f'W/"{patient.id}.{patient.revision or 0}"', modified)
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so the W/ prefix is ignored on both sides
+    return any(_opaque(candidate) == _opaque(etag) for candidate in header.split(","))
+
+
+def not_modified(request: Request, version: Version) -> Optional[Response]:
+    """A 304 response when the client's cached copy is current, otherwise None"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, version.etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is None or version.last_modified is None:
+            return None
+        try:
+            fresh = version.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+    if not fresh:
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=version.headers())
@@ -0,0 +1,340 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Updates are lock-free: every thread writes to its own shard (a plain dict
+keyed by label values), and shards are only merged when /metrics is
+scraped. The lock is taken once per thread and metric, when the thread's
+shard is created. Each worker process keeps its own metrics.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Record request, inference and cache metrics and serve /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Add X-DB-Query-Count / X-DB-Query-Time-Ms headers to every response
+DB_DEBUG_HEADERS = os.getenv("DB_DEBUG_HEADERS", "0") == "1"
+# Executions of one statement shape within a request that are reported as an N+1 candidate
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+THROUGHPUT_BUCKETS = (1e5, 1e6, 1e7, 5e7, 1e8, 5e8, 1e9)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, ...], Any]] = []
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self) -> Dict[Tuple[str, ...], Any]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshots(self) -> Iterable[Dict[Tuple[str, ...], Any]]:
+        with self._lock:
+            shards = list(self._shards)
+        # dict.copy() is atomic, so a shard being written by its owner is safe to read
+        return [shard.copy() for shard in shards]
+
+    def _labels(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic total"""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def _totals(self) -> Dict[Tuple[str, ...], float]:
+        totals: Dict[Tuple[str, ...], float] = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0.0) + value
+        return totals
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(labels)} {_number(value)}" for labels, value in sorted(self._totals().items())]
+
+
+class Gauge(Counter):
+    """Value that goes up and down; per-thread deltas are summed at scrape time"""
+
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class GaugeFunc(_Metric):
+    """Gauge computed at scrape time, so the hot path pays nothing"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def _samples(self) -> List[str]:
+        try:
+            values = self.collect()
+        except Exception:
+            return []
+        return [f"{self.name}{self._labels(labels)} {_number(value)}" for labels, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """Bucketed observations; each shard entry is [bucket counts..., +Inf count, sum]"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            entry = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def _samples(self) -> List[str]:
+        merged: Dict[Tuple[str, ...], List[float]] = {}
+        for shard in self._snapshots():
+            for labels, entry in shard.items():
+                entry = list(entry)
+                total = merged.setdefault(labels, [0] * len(entry))
+                for i, value in enumerate(entry):
+                    total[i] += value
+        lines = []
+        for labels, entry in sorted(merged.items()):
+            cumulative = 0
+            bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, entry):
+                cumulative += count
+                le = 'le="' + bound + '"'
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_number(entry[-1])}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+REGISTRY: List[_Metric] = []
+
+# Per-request statistics filled in by hooks elsewhere (e.g. the SQL cursor events).
+# The object is shared, not copied, with threadpool workers serving the request.
+class RequestStats:
+    __slots__ = ("route", "queries", "query_seconds", "shapes")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.queries = 0
+        self.query_seconds = 0.0
+        # Executions per normalized statement, for N+1 detection
+        self.shapes: Dict[str, int] = {}
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statement shapes executed at least threshold times, most frequent first"""
+        return sorted(((shape, n) for shape, n in self.shapes.items() if n >= threshold), key=lambda item: -item[1])
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def _cache_stats() -> Dict[str, Dict[str, Any]]:
+    caches = {}
+    # Only report caches that are already loaded; never import the imaging stack here
+    volume_cache = sys.modules.get("app.services.volume_cache")
+    if volume_cache is not None:
+        caches["volume"] = volume_cache.volume_cache.stats()
+    model_registry = sys.modules.get("app.services.model_registry")
+    if model_registry is not None:
+        histo = model_registry.loaded().get("HISTOPATH")
+        if histo is not None and histo.tensor_cache is not None:
+            caches["tensor"] = histo.tensor_cache.stats()
+    query_cache = sys.modules.get("app.core.query_cache")
+    if query_cache is not None and query_cache.query_cache.backend is not None:
+        caches["query"] = query_cache.query_cache.stats()
+    return caches
+
+
+def _mask_queue_depth() -> Dict[Tuple[str, ...], float]:
+    mask_writer = sys.modules.get("app.services.mask_writer")
+    return {(): mask_writer.mask_writer.queue_depth()} if mask_writer is not None else {}
+
+
+def _event_stat(key: str) -> Callable[[], Dict[Tuple[str, ...], float]]:
+    def collect() -> Dict[Tuple[str, ...], float]:
+        events = sys.modules.get("app.services.events")
+        return {(): events.broker.stats()[key]} if events is not None else {}
+    return collect
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency including the response body", ["method", "route"])
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served", ["method", "route"])
+DB_QUERIES = Histogram("db_queries_per_request", "SQL statements executed per HTTP request", ["route"], QUERY_BUCKETS)
+DB_QUERY_TIME = Histogram("db_query_seconds_per_request", "Time spent executing SQL per HTTP request", ["route"])
+DB_QUERIES_TOTAL = Counter("db_queries_total", "SQL statements executed by route", ["route"])
+DB_SLOW_QUERIES = Counter("db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS by route", ["route"])
+DB_N_PLUS_ONE = Counter("db_n_plus_one_total", "Requests that repeated one statement shape N_PLUS_ONE_THRESHOLD times or more", ["route"])
+INFERENCE_LATENCY = Histogram("inference_duration_seconds", "Analyzer latency per call or batch", ["modality"])
+INFERENCE_BATCH = Histogram("inference_batch_size", "Inputs per analyzer call or batch", ["modality"], SIZE_BUCKETS)
+INFERENCE_ITEMS = Counter("inference_items_total", "Inputs analyzed", ["modality"])
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes received in scan uploads", ["modality"])
+UPLOAD_THROUGHPUT = Histogram("upload_throughput_bytes_per_second", "Per-upload write throughput", ["modality"], THROUGHPUT_BUCKETS)
+CACHE_HIT_RATIO = GaugeFunc(
+    "cache_hit_ratio", "Hit ratio of the decoded data caches", ["cache"],
+    lambda: {(name,): stats["hit_ratio"] for name, stats in _cache_stats().items()},
+)
+CACHE_LOOKUPS = GaugeFunc(
+    "cache_lookups", "Lookups of the decoded data caches by result", ["cache", "result"],
+    lambda: {
+        (name, result): stats[key]
+        for name, stats in _cache_stats().items() for result, key in (("hit", "hits"), ("miss", "misses"))
+    },
+)
+MASK_QUEUE_DEPTH = GaugeFunc("mask_writer_queue_depth", "Masks waiting to be written", [], _mask_queue_depth)
+EVENT_SUBSCRIBERS = GaugeFunc("event_subscribers", "Open /api/v1/events streams", [], _event_stat("subscribers"))
+EVENT_DROPS = GaugeFunc("event_drops", "Events dropped from the queues of slow subscribers since start", [], _event_stat("dropped"))
+
+
+def observe_inference(modality: str, seconds: float, batch_size: int = 1) -> None:
+    """Record one analyzer call or batched forward pass"""
+    if METRICS_ENABLED:
+        INFERENCE_LATENCY.observe(seconds, modality)
+        INFERENCE_BATCH.observe(batch_size, modality)
+        INFERENCE_ITEMS.inc(modality, amount=batch_size)
+
+
+def observe_upload(modality: str, size: int, seconds: float) -> None:
+    """Record one stored upload"""
+    if METRICS_ENABLED:
+        UPLOAD_BYTES.inc(modality, amount=size)
+        if seconds > 0:
+            UPLOAD_THROUGHPUT.observe(size / seconds, modality)
+
+
+def record_query(shape: str, seconds: float, slow: bool = False) -> Optional[str]:
+    """Count one SQL statement against the current request; returns its route, if any"""
+    stats = current_request.get()
+    if stats is None:
+        return None
+    stats.queries += 1
+    stats.query_seconds += seconds
+    stats.shapes[shape] = stats.shapes.get(shape, 0) + 1
+    if slow and METRICS_ENABLED:
+        DB_SLOW_QUERIES.inc(stats.route)
+    return stats.route
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format"""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by its route template"""
+
+    def __init__(self, app: Any):
+        self.app = app
+        self._routes: Optional[List[Any]] = None
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not (METRICS_ENABLED or DB_DEBUG_HEADERS):
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route(scope)
+        stats = RequestStats(route)
+        token = current_request.set(stats)
+        status_code = "500"
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = str(message["status"])
+                if DB_DEBUG_HEADERS:
+                    # Streamed bodies may run more queries after the headers are sent
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-db-query-count", str(stats.queries).encode()),
+                        (b"x-db-query-time-ms", f"{stats.query_seconds * 1000:.1f}".encode()),
+                    ]
+            await send(message)
+
+        if METRICS_ENABLED:
+            HTTP_IN_FLIGHT.inc(method, route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            repeated = stats.repeated()
+            for shape, count in repeated:
+                logger.warning(f"Possible N+1 in {method} {route}: {count} executions of {shape[:300]}")
+            if METRICS_ENABLED:
+                HTTP_LATENCY.observe(time.perf_counter() - start, method, route)
+                HTTP_IN_FLIGHT.dec(method, route)
+                HTTP_REQUESTS.inc(method, route, status_code)
+                DB_QUERIES.observe(stats.queries, route)
+                DB_QUERY_TIME.observe(stats.query_seconds, route)
+                if stats.queries:
+                    DB_QUERIES_TOTAL.inc(route, amount=stats.queries)
+                if repeated:
+                    DB_N_PLUS_ONE.inc(route)
+
+    def _route(self, scope: Dict[str, Any]) -> str:
+        """Route template (e.g. /api/v1/patients/{patient_id}) to keep label cardinality bounded"""
+        from starlette.routing import Match
+
+        if self._routes is None:
+            self._routes = list(getattr(scope.get("app"), "routes", []))
+        for route in self._routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unknown")
+        return "unmatched"
@@ -0,0 +1,143 @@
+"""
+On-demand statistical profiler for live worker processes.
+
+A sampler thread reads every other thread's stack through
+sys._current_frames() at a fixed interval and counts collapsed stacks
+(the format read by flamegraph.pl and speedscope). Nothing is installed
+while no profile is running, so an idle worker pays no overhead.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+# Longest profile a single request may run
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+# Frames per stack kept in the profile (deeper frames are cut from the root end)
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "128"))
+
+# Innermost functions of threads that are blocked rather than running
+IDLE_FUNCTIONS = {"wait", "select", "poll", "accept", "get", "recv", "recv_into", "readinto"}
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a profile is requested while another one is running"""
+
+
+class StackSampler:
+    """Samples the stacks of all threads of this process"""
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False, exclude: Iterable[int] = ()):
+        self.interval = interval
+        self.include_idle = include_idle
+        # Thread ids left out of the profile, e.g. the thread waiting for it
+        self.exclude = set(exclude)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def run(self, seconds: float) -> None:
+        """Sample on the calling thread for the given number of seconds"""
+        self.exclude.add(threading.get_ident())
+        deadline = time.perf_counter() + seconds
+        next_sample = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            self._sample()
+            next_sample += self.interval
+            # Skip missed ticks instead of sampling in a burst to catch up
+            if next_sample < now:
+                next_sample = now + self.interval
+            time.sleep(max(0.0, next_sample - time.perf_counter()))
+
+    def _sample(self) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        self.samples += 1
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in self.exclude:
+                continue
+            if not self.include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                continue
+            frames: List[str] = []
+            while frame is not None and len(frames) < PROFILE_MAX_DEPTH:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            frames.append(names.get(thread_id, f"thread-{thread_id}"))
+            self.stacks[";".join(reversed(frames))] += 1
+
+    def collapsed(self) -> List[str]:
+        """One "root;...;leaf count" line per distinct stack, most frequent first"""
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+
+def _allocation_top(snapshot: "tracemalloc.Snapshot", limit: int) -> List[Dict[str, Any]]:
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    top = []
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        top.append({
+            "location": f"{frame.filename}:{frame.lineno}",
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count,
+        })
+    return top
+
+
+_profile_lock = threading.Lock()
+
+
+def profile(
+    seconds: float,
+    interval_ms: float = 5.0,
+    include_idle: bool = False,
+    allocations: int = 0,
+) -> Dict[str, Any]:
+    """Profile this process for the given time; blocks the calling thread.
+
+    With allocations > 0, tracemalloc runs for the same window and the top
+    allocation sites still alive at the end are returned as well.
+    """
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running in this process")
+    started_tracing = False
+    try:
+        if allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+
+        sampler = StackSampler(interval_ms / 1000.0, include_idle, exclude=[threading.get_ident()])
+        logger.info(f"Profiling pid {os.getpid()} for {seconds:.1f} s every {interval_ms:g} ms")
+        start = time.perf_counter()
+        thread = threading.Thread(target=sampler.run, args=(seconds,), name="stack-sampler", daemon=True)
+        thread.start()
+        thread.join()
+        elapsed = time.perf_counter() - start
+
+        result: Dict[str, Any] = {
+            "pid": os.getpid(),
+            "duration_s": round(elapsed, 3),
+            "interval_ms": interval_ms,
+            "samples": sampler.samples,
+            "collapsed": sampler.collapsed(),
+        }
+        if allocations:
+            result["allocations"] = _allocation_top(tracemalloc.take_snapshot(), allocations)
+        return result
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _profile_lock.release()
@@ -0,0 +1,396 @@
+"""
+Read-through cache for patient-scoped query results.
+
+Entries are encoded JSON bodies plus a small metadata dict (e.g. the ETag
+headers), stored with a TTL in an LRU-capped backend and tagged with the
+patients they were built from. Committed writes to patients, scans,
+segmentations and alerts invalidate the matching tags (see
+``app.db.revisions``), so readers never see data older than the last commit
+of their own process; other workers see it at the latest after the TTL with
+the in-process backend, and immediately with the socket backend.
+
+Invalidation is a clock: every invalidation advances it and stamps the
+affected tags. An entry stores the clock read before its data was loaded and
+is valid only while none of its tags has a later stamp, which also discards
+results loaded concurrently with a write.
+
+Backends (QUERY_CACHE_BACKEND): "memory" keeps the cache in each process,
+"socket" shares one cache server between the workers of a host, "off"
+disables caching. Start the server from ``backend/`` with
+``python -m app.core.query_cache``.
+"""
+
+import os
+import json
+import time
+import socket
+import struct
+import logging
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.models import Patient
+from app.db.revisions import on_revised_commit
+from app.core.responses import dumps
+
+logger = logging.getLogger(__name__)
+
+# "memory" (per process), "socket" (shared cache server) or "off"
+QUERY_CACHE_BACKEND = os.getenv("QUERY_CACHE_BACKEND", "memory")
+# Upper bound on staleness for writes the invalidation hooks cannot see
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "60"))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "10000"))
+QUERY_CACHE_SOCKET = os.getenv("QUERY_CACHE_SOCKET", "/tmp/tumortrace-query-cache.sock")
+
+# Tag of every patient list page
+PATIENTS_TAG = "patients"
+
+# (metadata, encoded JSON body)
+Entry = Tuple[Dict[str, Any], bytes]
+
+
+def patient_tag(patient_row_id: str) -> str:
+    return f"patient:{patient_row_id}"
+
+
+class CacheBackend:
+    """Shared storage of cache entries; implementations are thread-safe"""
+
+    name = "base"
+
+    def get(self, key: str) -> Tuple[Optional[Entry], int]:
+        """The entry (or None) and the current invalidation clock"""
+        raise NotImplementedError
+
+    def set(self, key: str, entry: Entry, tags: List[str], ttl: float, clock: int) -> None:
+        """Store an entry loaded after the clock was read; dropped if a tag was invalidated since"""
+        raise NotImplementedError
+
+    def invalidate(self, tags: List[str]) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """LRU dict with per-entry expiry and tag clocks"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, int, Tuple[str, ...], Entry]]" = OrderedDict()
+        self._tag_clocks: Dict[str, int] = {}
+        self._clock = 0
+        # Sets loaded before this clock are refused (the tag clocks were reset)
+        self._floor = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def _stale(self, stored: int, tags: Iterable[str]) -> bool:
+        return stored < self._floor or any(self._tag_clocks.get(tag, 0) > stored for tag in tags)
+
+    def get(self, key: str) -> Tuple[Optional[Entry], int]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None, self._clock
+            expires, stored, tags, entry = item
+            if expires < time.monotonic() or self._stale(stored, tags):
+                del self._entries[key]
+                return None, self._clock
+            self._entries.move_to_end(key)
+            return entry, self._clock
+
+    def set(self, key: str, entry: Entry, tags: List[str], ttl: float, clock: int) -> None:
+        with self._lock:
+            if self._stale(clock, tags):
+                return
+            self._entries[key] = (time.monotonic() + ttl, clock, tuple(tags), entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, tags: List[str]) -> None:
+        with self._lock:
+            self._clock += 1
+            for tag in tags:
+                self._tag_clocks[tag] = self._clock
+            # One clock per tag ever invalidated; start over rather than grow without bound
+            if len(self._tag_clocks) > 4 * self.max_entries:
+                self._entries.clear()
+                self._tag_clocks.clear()
+                self._floor = self._clock
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "evictions": self._evictions, "max_entries": self.max_entries}
+
+
+# Socket protocol: each message is a (header length, body length) prefix,
+# a JSON header and an optional raw body
+_PREFIX = struct.Struct("!II")
+
+
+def _send(sock: socket.socket, header: Dict[str, Any], body: bytes = b"") -> None:
+    encoded = json.dumps(header).encode("utf-8")
+    sock.sendall(_PREFIX.pack(len(encoded), len(body)) + encoded + body)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks, remaining = [], size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError("query cache connection closed")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    header_size, body_size = _PREFIX.unpack(_recv_exact(sock, _PREFIX.size))
+    header = json.loads(_recv_exact(sock, header_size))
+    return header, _recv_exact(sock, body_size) if body_size else b""
+
+
+class SocketBackend(CacheBackend):
+    """Client of a cache server on a local unix socket, one connection per thread"""
+
+    name = "socket"
+
+    def __init__(self, path: str = QUERY_CACHE_SOCKET, timeout: float = 0.5):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def _call(self, header: Dict[str, Any], body: bytes = b"") -> Tuple[Dict[str, Any], bytes]:
+        # A connection broken by a server restart is retried once on a new one
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                _send(sock, header, body)
+                return _recv(sock)
+            except OSError:
+                sock = getattr(self._local, "sock", None)
+                self._local.sock = None
+                if sock is not None:
+                    sock.close()
+                if attempt:
+                    raise
+
+    def get(self, key: str) -> Tuple[Optional[Entry], int]:
+        header, body = self._call({"op": "get", "key": key})
+        entry = (header["meta"], body) if header.get("hit") else None
+        return entry, header["clock"]
+
+    def set(self, key: str, entry: Entry, tags: List[str], ttl: float, clock: int) -> None:
+        meta, body = entry
+        self._call({"op": "set", "key": key, "meta": meta, "tags": tags, "ttl": ttl, "clock": clock}, body)
+
+    def invalidate(self, tags: List[str]) -> None:
+        self._call({"op": "invalidate", "tags": tags})
+
+    def stats(self) -> Dict[str, Any]:
+        return self._call({"op": "stats"})[0]
+
+
+class _CacheRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        backend: MemoryBackend = self.server.backend
+        while True:
+            try:
+                header, body = _recv(self.request)
+            except (ConnectionError, OSError):
+                return
+            op = header.get("op")
+            if op == "get":
+                entry, clock = backend.get(header["key"])
+                if entry is None:
+                    _send(self.request, {"hit": False, "clock": clock})
+                else:
+                    _send(self.request, {"hit": True, "clock": clock, "meta": entry[0]}, entry[1])
+            elif op == "set":
+                backend.set(header["key"], (header["meta"], body), header["tags"], header["ttl"], header["clock"])
+                _send(self.request, {"ok": True})
+            elif op == "invalidate":
+                backend.invalidate(header["tags"])
+                _send(self.request, {"ok": True})
+            elif op == "stats":
+                _send(self.request, backend.stats())
+            else:
+                _send(self.request, {"error": f"unknown op {op}"})
+
+
+class CacheServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves a MemoryBackend to the workers of one host"""
+
+    daemon_threads = True
+
+    def __init__(self, path: str = QUERY_CACHE_SOCKET, max_entries: int = QUERY_CACHE_MAX_ENTRIES):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.backend = MemoryBackend(max_entries)
+        super().__init__(path, _CacheRequestHandler)
+        # Only processes of the same user may read or write patient data
+        os.chmod(path, 0o600)
+
+
+class QueryCache:
+    """Read-through access to a backend, with this process's hit ratio"""
+
+    def __init__(self, backend: Optional[CacheBackend], ttl: float = QUERY_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self._hits = 0
+        self._misses = 0
+        self._errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def get_or_load(self, key: str, load: Callable[[], Tuple[Iterable[str], Dict[str, Any], Any]]) -> Entry:
+        """The cached entry for key, or load() -> (tags, metadata, JSON content) stored on a miss.
+
+        Backend failures fall through to load(); the cache never fails a request.
+        """
+        backend = self.backend
+        if backend is None:
+            _, meta, content = load()
+            return meta, dumps(content)
+
+        clock = None
+        try:
+            entry, clock = backend.get(key)
+        except Exception as e:
+            self._error("get", e)
+            entry = None
+        self._count(entry is not None)
+        if entry is not None:
+            return entry
+
+        tags, meta, content = load()
+        entry = (meta, dumps(content))
+        if clock is not None:
+            try:
+                backend.set(key, entry, list(tags), self.ttl, clock)
+            except Exception as e:
+                self._error("set", e)
+        return entry
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        if self.backend is None:
+            return
+        try:
+            self.backend.invalidate(list(tags))
+        except Exception as e:
+            # Entries of these tags live until their TTL
+            self._error("invalidate", e)
+
+    def _error(self, op: str, error: Exception) -> None:
+        with self._lock:
+            self._errors += 1
+        logger.warning(f"Query cache {op} failed on the {self.backend.name} backend: {error}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio of this process's lookups"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "backend": self.backend.name if self.backend is not None else "off",
+                "hits": self._hits,
+                "misses": self._misses,
+                "errors": self._errors,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+            }
+
+
+def create_backend(name: str = QUERY_CACHE_BACKEND) -> Optional[CacheBackend]:
+    if name == "off":
+        return None
+    if name == "memory":
+        return MemoryBackend()
+    if name == "socket":
+        return SocketBackend()
+    raise ValueError(f"Unsupported QUERY_CACHE_BACKEND: {name}. Supported backends: memory, socket, off")
+
+
+# Process-wide cache used by the read endpoints
+query_cache = QueryCache(create_backend())
+
+
+# Invalidation. Revisions cover each patient's own entries; creating,
+# updating or deleting patients also changes the patient list pages.
+_TAGS_KEY = "_query_cache_tags"
+
+
+@on_revised_commit
+def _invalidate_revised(patient_ids) -> None:
+    query_cache.invalidate(patient_tag(patient_id) for patient_id in patient_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_patient_tags(session, flush_context):
+    tags = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Patient):
+            tags.add(PATIENTS_TAG)
+            if obj in session.deleted:
+                tags.add(patient_tag(obj.id))
+    if tags:
+        session.info.setdefault(_TAGS_KEY, set()).update(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_patient_tags(session):
+    tags = session.info.pop(_TAGS_KEY, None)
+    if tags:
+        query_cache.invalidate(tags)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_patient_tags(session, previous_transaction):
+    session.info.pop(_TAGS_KEY, None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the query cache to the workers of this host")
+    parser.add_argument("--socket", default=QUERY_CACHE_SOCKET)
+    parser.add_argument("--max-entries", type=int, default=QUERY_CACHE_MAX_ENTRIES)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with CacheServer(args.socket, args.max_entries) as server:
+        logger.info(f"Query cache listening on {args.socket} ({args.max_entries} entries)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Fast JSON path for large responses built from trusted ORM rows.
+
+Rows are copied into plain dicts using the response schema's field names
+and encoded with orjson, skipping per-row Pydantic validation and FastAPI's
+response-model pass. Without orjson installed the stdlib encoder is used.
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Type
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode to JSON bytes with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson; datetimes use the same ISO format as Pydantic"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def row_dict(row: Optional[Any], schema: Type[BaseModel]) -> Optional[Dict[str, Any]]:
+    """The schema's fields read straight from an ORM row, without validation"""
+    if row is None:
+        return None
+    return {name: getattr(row, name) for name in schema.model_fields}
+
+
+def row_dicts(rows: Iterable[Any], schema: Type[BaseModel]) -> List[Dict[str, Any]]:
+    fields = list(schema.model_fields)
+    return [{name: getattr(row, name) for name in fields} for row in rows]
@@ -57,7 +57,9 @@ class Segmentation(SegmentationBase):
     id: str
     scan_id: str
     mask_path: str
+    mask_status: Optional[str] = None
     processing_time_seconds: Optional[float]
+    stage_timings: Optional[dict] = None
     created_at: datetime
     
     class Config:
@@ -82,6 +84,14 @@ class MonitoringAlert(MonitoringAlertBase):
     class Config:
         from_attributes = True
 
+# Request schemas
+class BatchAnalysisRequest(BaseModel):
+    filenames: List[str] = Field(default_factory=list, description="Images in the uploads directory")
+    scan_ids: List[str] = Field(default_factory=list, description="Histopathology scan IDs")
+    body_part: str = Field("Breast", description="Body part recorded for filename inputs")
+    tta_views: Optional[int] = Field(None, ge=1, le=8, description="Test-time augmentation views averaged per image")
+    tta_budget_ms: Optional[float] = Field(None, gt=0, description="Per-batch latency budget that caps the TTA views")
+
 # Response schemas
 class UploadResponse(BaseModel):
     filename: str
@@ -97,6 +107,7 @@ class SegmentationResponse(BaseModel):
     confidence_score: float
     processing_time_seconds: float
     mask_path: str
+    mask_status: Optional[str] = None
 
 class PatientDashboard(BaseModel):
     patient: Patient
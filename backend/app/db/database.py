@@ -1,13 +1,21 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 import os
+import re
+import time
+import logging
 from dotenv import load_dotenv
+from app.core.metrics import current_request, record_query
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Database URL - use environment variable or default to SQLite for development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cancer_monitoring.db")
+# Statements slower than this are logged with the shape of their parameters
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
 
 # Create engine
 engine = create_engine(
@@ -15,6 +23,44 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
 )
 
+# Expanded IN lists render one placeholder per value; collapse them so that
+# the same query with different list lengths has one shape
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)\s*\)")
+
+def statement_shape(statement: str) -> str:
+    """Whitespace-normalized statement with IN lists collapsed"""
+    return _IN_LIST.sub("(?, ...)", " ".join(statement.split()))
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """Types of the bound parameters; values are never logged since they may hold patient data"""
+    if executemany and isinstance(parameters, (list, tuple)):
+        return f"{len(parameters)} x {parameter_shape(parameters[0]) if parameters else '()'}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+# Time every statement and count it against the HTTP request being served
+@event.listens_for(engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+@event.listens_for(engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+    slow = elapsed * 1000 >= SLOW_QUERY_MS
+    # Statements outside a request (startup, background writers) are only checked for slowness
+    shape = statement_shape(statement) if slow or current_request.get() is not None else None
+    route = record_query(shape, elapsed, slow) if shape is not None else None
+    if slow:
+        logger.warning(
+            f"Slow query ({elapsed * 1000:.1f} ms) in {route or 'background'}: "
+            f"{shape[:500]} params={parameter_shape(parameters, executemany)}"
+        )
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -27,4 +73,28 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+def add_missing_columns(bind, metadata):
+    """Add columns introduced after a table was first created.
+
+    ``create_all`` never alters existing tables, so nullable columns added to
+    the models later are appended here to keep existing databases usable.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    ddl += f" DEFAULT {getattr(default, 'text', default)}"
+                conn.execute(text(ddl))
+
+# Registers the session hooks that keep Patient.revision current
+from app.db import revisions  # noqa: E402,F401
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, ForeignKey, Boolean, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -18,6 +18,9 @@ class Patient(Base):
     diagnosis = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped whenever the patient or its scans, segmentations or alerts change (app.db.revisions)
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
+    revised_at = Column(DateTime)
     
     # Relationships
     scans = relationship("Scan", back_populates="patient", cascade="all, delete-orphan")
@@ -45,11 +48,13 @@ class Segmentation(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     scan_id = Column(String, ForeignKey("scans.id"), nullable=False)
     mask_path = Column(String, nullable=False)
+    mask_status = Column(String)  # pending, ready, failed; None when no mask file is written
     tumor_volume_cc = Column(Float)
     tumor_volume_mm3 = Column(Float)
     confidence_score = Column(Float)
     segmentation_method = Column(String, default="TumorTrace")
     processing_time_seconds = Column(Float)
+    stage_timings = Column(JSON)  # Per-stage milliseconds of the analysis and the process peak RSS
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
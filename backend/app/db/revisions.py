@@ -0,0 +1,98 @@
+"""
+Per-patient revision counter.
+
+Every flush that writes a patient, or one of its scans, segmentations or
+alerts, bumps ``Patient.revision`` and ``Patient.revised_at`` in the same
+transaction. Read endpoints use the pair as a cheap version stamp for the
+whole patient record (see ``app.core.http_cache``).
+"""
+
+from datetime import datetime
+from itertools import chain
+from typing import Callable, Iterable, List, Set
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from app.db.models import Patient, Scan, Segmentation, MonitoringAlert
+
+# session.info key holding the patients revised since the last commit
+REVISED_KEY = "revised_patients"
+_PENDING_KEY = "_pending_revisions"
+
+
+def affected_patients(session: Session) -> Set[str]:
+    """Row ids of the patients touched by the objects pending in a flush"""
+    patient_ids: Set[str] = set()
+    scan_ids: Set[str] = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Patient):
+            # New patients start at revision 0 and deleted ones have no row left
+            if obj not in session.new and obj not in session.deleted:
+                patient_ids.add(obj.id)
+        elif isinstance(obj, (Scan, MonitoringAlert)):
+            patient_ids.add(obj.patient_id)
+        elif isinstance(obj, Segmentation):
+            scan_ids.add(obj.scan_id)
+    if scan_ids:
+        rows = session.connection().execute(select(Scan.patient_id).where(Scan.id.in_(scan_ids)))
+        patient_ids.update(patient_id for (patient_id,) in rows)
+    patient_ids.discard(None)
+    return patient_ids
+
+
+def bump_revisions(session: Session, patient_ids: Iterable[str]) -> None:
+    """Bump the revision of the given patients within the session's transaction.
+
+    Writes that bypass the unit of work (bulk updates) call this directly.
+    """
+    patient_ids = set(patient_ids)
+    if not patient_ids:
+        return
+    session.connection().execute(
+        update(Patient.__table__)
+        .where(Patient.__table__.c.id.in_(patient_ids))
+        .values(revision=Patient.__table__.c.revision + 1, revised_at=datetime.utcnow())
+    )
+    session.info.setdefault(_PENDING_KEY, set()).update(patient_ids)
+    session.info.setdefault(REVISED_KEY, set()).update(patient_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_after_flush(session, flush_context):
+    bump_revisions(session, affected_patients(session))
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expire_revisions(session, flush_context):
+    # Loaded patients would otherwise keep serving the pre-bump revision
+    for patient_id in session.info.pop(_PENDING_KEY, ()):
+        patient = session.identity_map.get(identity_key(Patient, patient_id))
+        if patient is not None:
+            session.expire(patient, ["revision", "revised_at"])
+
+
+# Called with the ids of the revised patients once their transaction commits
+_commit_callbacks: List[Callable[[Set[str]], None]] = []
+
+
+def on_revised_commit(callback: Callable[[Set[str]], None]) -> Callable[[Set[str]], None]:
+    """Register a callback for committed revisions (e.g. cache invalidation)"""
+    _commit_callbacks.append(callback)
+    return callback
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_revised(session):
+    session.info.pop(_PENDING_KEY, None)
+    revised = session.info.pop(REVISED_KEY, None)
+    if revised:
+        for callback in _commit_callbacks:
+            callback(revised)
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_revised(session):
+    session.info.pop(REVISED_KEY, None)
+    session.info.pop(_PENDING_KEY, None)
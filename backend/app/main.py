@@ -1,11 +1,40 @@
+import os
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.v1.endpoints import segment, patients, monitor, upload, analyze
-from app.db.database import engine
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.api.v1.endpoints import segment, patients, monitor, upload, analyze, admin, export, events
+from app.db.database import engine, add_missing_columns
 from app.db.models import Base
+from app.services.mask_writer import mask_writer
+from app.services import model_registry
+from app.services.warmup import model_warmup, WARMUP_ENABLED
+from app.services.events import broker
+from app.core import metrics
+from app.core.compression import CompressionMiddleware
+
+# Process role: "api" serves records and uploads without loading any model,
+# "worker" serves analysis with models loaded at startup, "all" serves both
+# and loads models on first use
+APP_ROLE = os.getenv("APP_ROLE", "all")
+ROLE_ROUTERS = {
+    "api": ["patients", "monitor", "upload", "export", "events", "admin"],
+    "worker": ["segment", "analyze", "admin"],
+    "all": ["patients", "segment", "monitor", "upload", "analyze", "export", "events", "admin"],
+}
+if APP_ROLE not in ROLE_ROUTERS:
+    raise ValueError(f"Unsupported APP_ROLE: {APP_ROLE}. Supported roles: {', '.join(ROLE_ROUTERS)}")
+
+# gzip/brotli for responses larger than COMPRESSION_MIN_BYTES
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") == "1"
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine, Base.metadata)
+
+# Load analyzer models before workers are forked (gunicorn --preload)
+if model_registry.PRELOAD_MODELS or APP_ROLE == "worker":
+    model_registry.preload()
 
 app = FastAPI(
     title="Cancer Patient Monitoring API",
@@ -22,27 +51,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include all routers
-app.include_router(patients.router, prefix="/api/v1/patients", tags=["Patients"])
-app.include_router(segment.router, prefix="/api/v1/segment", tags=["Segmentation"])
-app.include_router(monitor.router, prefix="/api/v1/monitor", tags=["Monitoring"])
-app.include_router(upload.router, prefix="/api/v1/upload", tags=["Upload"])
-app.include_router(analyze.router, prefix="/api/v1/analyze", tags=["Analysis"])
+# Compress large JSON bodies; streamed responses pass through
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Request latency, in-flight and per-request query metrics for /metrics,
+# plus N+1 detection and the optional query-count debug headers
+if metrics.METRICS_ENABLED or metrics.DB_DEBUG_HEADERS:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Include the routers served by this role
+routers = {
+    "patients": (patients.router, "/api/v1/patients", "Patients"),
+    "segment": (segment.router, "/api/v1/segment", "Segmentation"),
+    "monitor": (monitor.router, "/api/v1/monitor", "Monitoring"),
+    "upload": (upload.router, "/api/v1/upload", "Upload"),
+    "analyze": (analyze.router, "/api/v1/analyze", "Analysis"),
+    "export": (export.router, "/api/v1/export", "Export"),
+    "events": (events.router, "/api/v1/events", "Events"),
+    "admin": (admin.router, "/api/v1/admin", "Admin"),
+}
+for name in ROLE_ROUTERS[APP_ROLE]:
+    router, prefix, tag = routers[name]
+    app.include_router(router, prefix=prefix, tags=[tag])
+
+@app.on_event("startup")
+def start_model_warmup():
+    """Warm the analyzers in the background; /ready reports when they are usable"""
+    if WARMUP_ENABLED and "analyze" in ROLE_ROUTERS[APP_ROLE]:
+        model_warmup.start()
+    else:
+        model_warmup.skip()
+
+@app.on_event("startup")
+async def start_event_broker():
+    """Bind the event broker to this worker's loop so any thread can publish"""
+    broker.start(asyncio.get_running_loop())
+
+@app.on_event("shutdown")
+def drain_mask_writer():
+    """Finish writing queued masks before the process exits"""
+    mask_writer.shutdown()
+
+@app.on_event("shutdown")
+def stop_event_broker():
+    broker.stop()
 
 @app.get("/")
 def read_root():
     return {
         "msg": "Cancer Monitoring API is running",
         "version": "1.0.0",
+        "role": APP_ROLE,
         "endpoints": {
             "patients": "/api/v1/patients",
             "segmentation": "/api/v1/segment", 
             "monitoring": "/api/v1/monitor",
             "upload": "/api/v1/upload",
-            "analysis": "/api/v1/analyze"
+            "analysis": "/api/v1/analyze",
+            "export": "/api/v1/export",
+            "events": "/api/v1/events"
         }
     }
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "cancer-monitoring-api"}
+    return {"status": "healthy", "service": "cancer-monitoring-api", "role": APP_ROLE}
+
+@app.get("/ready")
+def readiness_check():
+    """Succeeds only once model warm-up has finished"""
+    body = {"ready": model_warmup.ready, "role": APP_ROLE, "warmup": model_warmup.status()}
+    return JSONResponse(status_code=200 if model_warmup.ready else 503, content=body)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus text exposition of this worker process's metrics"""
+    if not metrics.METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,36 +1,135 @@
 import os
 import uuid
-import time
+import logging
 import numpy as np
-from typing import Dict, Any
+import nibabel as nib
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from typing import Dict, Any, List, Tuple
+
+from app.services.inference_runtime import InferenceRuntime, build_model
+from app.services.instrumentation import StageTimer
+from app.services.mask_writer import mask_writer, MASK_PENDING
+from app.services.precision import MODEL_PRECISION
+from app.services.volume_cache import load_volume
+
+logger = logging.getLogger(__name__)
 
 MASKS_DIR = "data/masks"
 os.makedirs(MASKS_DIR, exist_ok=True)
 
+# Weights for the segmenter; without them a small seeded model is used
+CT_MODEL_PATH = os.getenv("CT_MODEL_PATH", "models/ct_unet3d.pt")
+# Channels of the first U-Net level (doubled at every level below)
+CT_BASE_CHANNELS = int(os.getenv("CT_BASE_CHANNELS", "8"))
+# Cubic sliding-window patch edge in voxels (must be divisible by 4)
+CT_PATCH_SIZE = int(os.getenv("CT_PATCH_SIZE", "64"))
+# Fraction of each patch shared with its neighbours
+CT_PATCH_OVERLAP = float(os.getenv("CT_PATCH_OVERLAP", "0.25"))
+# Patches per forward pass
+CT_PATCH_BATCH = int(os.getenv("CT_PATCH_BATCH", "4"))
+# Isotropic spacing the volume is resampled to before inference
+CT_TARGET_SPACING_MM = float(os.getenv("CT_TARGET_SPACING_MM", "2.0"))
+# Connected components smaller than this are discarded
+CT_MIN_LESION_MM3 = float(os.getenv("CT_MIN_LESION_MM3", "100"))
+CT_PRECISION = os.getenv("CT_PRECISION", MODEL_PRECISION)
+
+# HU window (level, width) per body part
+HU_WINDOWS = {
+    "Brain": (40, 80),
+    "Chest": (-600, 1500),
+    "Abdomen": (40, 400),
+    "Pelvis": (40, 400),
+}
+DEFAULT_HU_WINDOW = (40, 400)
+
+# The segmenter does not classify lesions; report the most common type per site
+LESION_TYPES = {
+    "Brain": "glioblastoma",
+    "Chest": "lung_nodule",
+    "Abdomen": "liver_lesion",
+    "Pelvis": "prostate_lesion",
+}
+
+class ConvBlock3D(nn.Module):
+    """Two 3x3x3 convolutions with instance norm and leaky ReLU (nnU-Net style)"""
+
+    def __init__(self, in_channels: int, out_channels: int):
+        super(ConvBlock3D, self).__init__()
+        self.block = nn.Sequential(
+            nn.Conv3d(in_channels, out_channels, kernel_size=3, padding=1),
+            nn.InstanceNorm3d(out_channels, affine=True),
+            nn.LeakyReLU(0.01, inplace=True),
+            nn.Conv3d(out_channels, out_channels, kernel_size=3, padding=1),
+            nn.InstanceNorm3d(out_channels, affine=True),
+            nn.LeakyReLU(0.01, inplace=True),
+        )
+
+    def forward(self, x):
+        return self.block(x)
+
+class UNet3D(nn.Module):
+    """Three-level 3D U-Net producing background/lesion logits"""
+
+    def __init__(self, in_channels: int = 1, num_classes: int = 2, base_channels: int = CT_BASE_CHANNELS):
+        super(UNet3D, self).__init__()
+        c = base_channels
+        self.enc1 = ConvBlock3D(in_channels, c)
+        self.enc2 = ConvBlock3D(c, c * 2)
+        self.bottleneck = ConvBlock3D(c * 2, c * 4)
+        self.pool = nn.MaxPool3d(2)
+        self.up2 = nn.ConvTranspose3d(c * 4, c * 2, kernel_size=2, stride=2)
+        self.dec2 = ConvBlock3D(c * 4, c * 2)
+        self.up1 = nn.ConvTranspose3d(c * 2, c, kernel_size=2, stride=2)
+        self.dec1 = ConvBlock3D(c * 2, c)
+        self.head = nn.Conv3d(c, num_classes, kernel_size=1)
+
+    def forward(self, x):
+        e1 = self.enc1(x)
+        e2 = self.enc2(self.pool(e1))
+        b = self.bottleneck(self.pool(e2))
+        d2 = self.dec2(torch.cat([self.up2(b), e2], dim=1))
+        d1 = self.dec1(torch.cat([self.up1(d2), e1], dim=1))
+        return self.head(d1)
+
 class CTAnalyzer:
-    """CT scan analysis service using nnUNet-like processing"""
-    
-    def __init__(self):
+    """CT scan analysis service using an nnU-Net-style 3D U-Net"""
+
+    def __init__(self, model_path: str = CT_MODEL_PATH):
         self.model_name = "nnUNet"
-    
+        self.patch_size = (CT_PATCH_SIZE,) * 3
+
+        model, weights = build_model(lambda: UNet3D(), model_path)
+        self.runtime = InferenceRuntime(
+            model, (1, 1) + self.patch_size, max_batch=CT_PATCH_BATCH, precision=CT_PRECISION, weights=weights
+        )
+
     def analyze(self, file_path: str, body_part: str) -> Dict[str, Any]:
         """Analyze CT scan and perform tumor detection/segmentation"""
-        start_time = time.time()
-        
+        timer = StageTimer()
+
         try:
-            # Simulate nnUNet analysis
-            # In production, this would call the actual nnUNet model
-            result = self._simulate_nnunet_analysis(file_path, body_part)
-            
-            # Save segmentation mask
-            mask_filename = f"ct_mask_{uuid.uuid4()}.nii.gz"
-            mask_path = os.path.join(MASKS_DIR, mask_filename)
-            
-            processing_time = time.time() - start_time
-            
+            with timer.stage("load"):
+                hu, spacing, affine, header = self.load_volume(file_path)
+            with timer.stage("preprocess"):
+                window = HU_WINDOWS.get(body_part, DEFAULT_HU_WINDOW)
+                volume = self.preprocess(hu, spacing, window)
+            with timer.stage("inference"):
+                probabilities, patch_count = self._sliding_window(volume)
+            with timer.stage("postprocess"):
+                result = self._postprocess(probabilities, hu, spacing)
+            with timer.stage("mask_write"):
+                # Queue segmentation mask for background persistence
+                mask_path = mask_writer.mask_path("ct_mask")
+                mask_writer.submit(nib.Nifti1Image(result["mask"], affine, header), mask_path)
+
+            processing_time = timer.elapsed
+
             return {
                 "model_name": self.model_name,
                 "mask_path": mask_path,
+                "mask_status": MASK_PENDING,
                 "tumor_volume_mm3": result["volume_mm3"],
                 "tumor_volume_cc": result["volume_cc"],
                 "confidence_score": result["confidence"],
@@ -38,78 +137,130 @@ class CTAnalyzer:
                 "analysis_details": {
                     "body_part": body_part,
                     "segmentation_method": "nnUNet",
-                    "tumor_count": result.get("tumor_count", 1),
-                    "largest_tumor_volume_cc": result.get("largest_tumor_volume_cc", result["volume_cc"]),
-                    "hounsfield_units": result.get("hounsfield_units", {}),
-                    "lesion_type": result.get("lesion_type", "unknown")
+                    "runtime": self.runtime.name,
+                    "weights": self.runtime.weights,
+                    "tumor_count": result["tumor_count"],
+                    "largest_tumor_volume_cc": result["largest_tumor_volume_cc"],
+                    "hounsfield_units": result["hounsfield_units"],
+                    "hu_window": {"level": window[0], "width": window[1]},
+                    "lesion_type": LESION_TYPES.get(body_part, "unknown"),
+                    "patches": patch_count,
+                    "stage_timings": timer.report(processing_time)
                 }
             }
-                
+
         except Exception as e:
-            # Fallback to simulated data
-            return self._fallback_analysis(file_path, body_part, start_time, str(e))
-    
-    def _simulate_nnunet_analysis(self, file_path: str, body_part: str) -> Dict[str, Any]:
-        """Simulate nnUNet analysis results"""
-        # Simulate different analysis based on body part
-        body_part_analysis = {
-            "Brain": {
-                "volume_mm3": 25000.0,
-                "volume_cc": 25.0,
-                "confidence": 0.89,
-                "tumor_count": 1,
-                "lesion_type": "glioblastoma",
-                "hounsfield_units": {"min": 30, "max": 80, "mean": 55}
-            },
-            "Chest": {
-                "volume_mm3": 15000.0,
-                "volume_cc": 15.0,
-                "confidence": 0.91,
-                "tumor_count": 1,
-                "lesion_type": "lung_nodule",
-                "hounsfield_units": {"min": -100, "max": 50, "mean": -25}
-            },
-            "Abdomen": {
-                "volume_mm3": 35000.0,
-                "volume_cc": 35.0,
-                "confidence": 0.87,
-                "tumor_count": 1,
-                "lesion_type": "liver_lesion",
-                "hounsfield_units": {"min": 20, "max": 70, "mean": 45}
-            },
-            "Pelvis": {
-                "volume_mm3": 20000.0,
-                "volume_cc": 20.0,
-                "confidence": 0.85,
-                "tumor_count": 1,
-                "lesion_type": "prostate_lesion",
-                "hounsfield_units": {"min": 30, "max": 60, "mean": 45}
+            logger.error(f"CT analysis failed for {file_path}: {str(e)}")
+            return self._fallback_analysis(file_path, body_part, timer, str(e))
+
+    def load_volume(self, file_path: str) -> Tuple[np.ndarray, Tuple[float, float, float], np.ndarray, Any]:
+        """Return (HU volume, voxel spacing in mm, affine, NIfTI header or None)"""
+        if file_path.endswith(('.nii.gz', '.nii')):
+            # Decoded volumes are shared read-only through the volume cache
+            volume = load_volume(file_path)
+            spacing = tuple(float(s) for s in volume.header.get_zooms()[:3])
+            # Multi-volume files: analyze the first volume
+            hu = volume.data if volume.data.ndim == 3 else volume.data[..., 0]
+            return hu, spacing, volume.affine, volume.header
+        if file_path.lower().endswith(".dcm"):
+            return self._load_dicom(file_path)
+        raise ValueError(f"Unsupported CT format: {os.path.basename(file_path)}")
+
+    def _load_dicom(self, file_path: str) -> Tuple[np.ndarray, Tuple[float, float, float], np.ndarray, Any]:
+        import pydicom
+
+        dataset = pydicom.dcmread(file_path)
+        pixels = dataset.pixel_array.astype(np.float32)
+        if pixels.ndim == 2:
+            pixels = pixels[None]
+        hu = pixels * float(getattr(dataset, "RescaleSlope", 1)) + float(getattr(dataset, "RescaleIntercept", 0))
+        row, col = (float(s) for s in getattr(dataset, "PixelSpacing", (1.0, 1.0)))
+        depth = float(getattr(dataset, "SliceThickness", 1.0) or 1.0)
+        # Frames are stacked first in DICOM; keep the NIfTI (x, y, z) axis order
+        hu = np.ascontiguousarray(hu.transpose(2, 1, 0))
+        spacing = (col, row, depth)
+        return hu, spacing, np.diag(list(spacing) + [1.0]), None
+
+    def preprocess(self, hu: np.ndarray, spacing: Tuple[float, float, float], window: Tuple[float, float]) -> torch.Tensor:
+        """Window HU to [0, 1] and resample to the target spacing as a (1, 1, D, H, W) tensor"""
+        level, width = window
+        low, high = level - width / 2, level + width / 2
+        windowed = (np.clip(hu, low, high) - low) / (high - low)
+        volume = torch.from_numpy(windowed.astype(np.float32))[None, None]
+        size = [max(1, round(n * s / CT_TARGET_SPACING_MM)) for n, s in zip(hu.shape, spacing)]
+        return F.interpolate(volume, size=size, mode="trilinear", align_corners=False)
+
+    def warmup(self, batch_size: int) -> None:
+        self.runtime.warmup(batch_size)
+
+    def _sliding_window(self, volume: torch.Tensor) -> Tuple[torch.Tensor, int]:
+        """Average softmax lesion probabilities over overlapping patches"""
+        patch = self.patch_size
+        # Pad so every axis holds at least one patch
+        pads = [max(0, p - n) for n, p in zip(volume.shape[2:], patch)]
+        padded = F.pad(volume, [0, pads[2], 0, pads[1], 0, pads[0]])
+        shape = padded.shape[2:]
+
+        step = [max(1, int(p * (1 - CT_PATCH_OVERLAP))) for p in patch]
+        starts = [_window_starts(n, p, s) for n, p, s in zip(shape, patch, step)]
+        corners = [(z, y, x) for z in starts[0] for y in starts[1] for x in starts[2]]
+
+        totals = torch.zeros(shape)
+        counts = torch.zeros(shape)
+        for start in range(0, len(corners), self.runtime.max_batch):
+            group = corners[start:start + self.runtime.max_batch]
+            batch = torch.cat([
+                padded[:, :, z:z + patch[0], y:y + patch[1], x:x + patch[2]] for z, y, x in group
+            ])
+            lesion = torch.softmax(self.runtime.forward(batch), dim=1)[:, 1].cpu()
+            for (z, y, x), probabilities in zip(group, lesion):
+                totals[z:z + patch[0], y:y + patch[1], x:x + patch[2]] += probabilities
+                counts[z:z + patch[0], y:y + patch[1], x:x + patch[2]] += 1
+
+        probabilities = totals / counts.clamp(min=1)
+        depth, height, width = volume.shape[2:]
+        return probabilities[:depth, :height, :width], len(corners)
+
+    def _postprocess(self, probabilities: torch.Tensor, hu: np.ndarray, spacing: Tuple[float, float, float]) -> Dict[str, Any]:
+        from skimage.measure import label
+
+        # Back to the original grid so volumes use the true voxel size
+        probabilities = F.interpolate(
+            probabilities[None, None], size=hu.shape, mode="trilinear", align_corners=False
+        )[0, 0].numpy()
+        voxel_mm3 = float(np.prod(spacing))
+
+        components = label(probabilities >= 0.5, connectivity=3)
+        sizes = np.bincount(components.ravel())[1:]
+        keep = [i + 1 for i, size in enumerate(sizes) if size * voxel_mm3 >= CT_MIN_LESION_MM3]
+        mask = np.isin(components, keep)
+
+        volume_mm3 = float(mask.sum() * voxel_mm3)
+        lesion_sizes: List[float] = [float(sizes[i - 1] * voxel_mm3) for i in keep]
+        if mask.any():
+            confidence = float(probabilities[mask].mean())
+            lesion_hu = hu[mask]
+            hounsfield_units = {
+                "min": float(lesion_hu.min()), "max": float(lesion_hu.max()), "mean": float(lesion_hu.mean())
             }
-        }
-        
-        analysis = body_part_analysis.get(body_part, {
-            "volume_mm3": 30000.0,
-            "volume_cc": 30.0,
-            "confidence": 0.83,
-            "tumor_count": 1,
-            "lesion_type": "unknown",
-            "hounsfield_units": {"min": 0, "max": 100, "mean": 50}
-        })
-        
+        else:
+            confidence = float(1.0 - probabilities.mean())
+            hounsfield_units = {}
+
         return {
-            "volume_mm3": float(analysis["volume_mm3"]),
-            "volume_cc": float(analysis["volume_cc"]),
-            "confidence": analysis["confidence"],
-            "tumor_count": analysis["tumor_count"],
-            "largest_tumor_volume_cc": float(analysis["volume_cc"]),
-            "lesion_type": analysis["lesion_type"],
-            "hounsfield_units": analysis["hounsfield_units"]
+            "mask": mask.astype(np.uint8),
+            "volume_mm3": volume_mm3,
+            "volume_cc": volume_mm3 / 1000,
+            "confidence": confidence,
+            "tumor_count": len(keep),
+            "largest_tumor_volume_cc": max(lesion_sizes, default=0.0) / 1000,
+            "hounsfield_units": hounsfield_units
         }
-    
-    def _fallback_analysis(self, file_path: str, body_part: str, start_time: float, error: str) -> Dict[str, Any]:
+
+    def _fallback_analysis(self, file_path: str, body_part: str, timer: StageTimer, error: str) -> Dict[str, Any]:
         """Fallback analysis when processing fails"""
-        processing_time = time.time() - start_time
-        
+        processing_time = timer.elapsed
+
         return {
             "model_name": self.model_name,
             "mask_path": f"/masks/fallback_ct_{uuid.uuid4()}.nii.gz",
@@ -121,9 +272,17 @@ class CTAnalyzer:
                 "body_part": body_part,
                 "segmentation_method": "nnUNet",
                 "error": error,
+                "stage_timings": timer.report(processing_time),
                 "tumor_count": 1,
                 "largest_tumor_volume_cc": 25.0,
                 "lesion_type": "unknown",
                 "hounsfield_units": {"min": 0, "max": 100, "mean": 50}
             }
-        } 
\ No newline at end of file
+        }
+
+def _window_starts(length: int, patch: int, step: int) -> List[int]:
+    """Patch start offsets covering [0, length) with the last patch flush to the end"""
+    starts = list(range(0, max(1, length - patch + 1), step))
+    if starts[-1] + patch < length:
+        starts.append(length - patch)
+    return starts
@@ -0,0 +1,267 @@
+"""
+Publish/subscribe for server-pushed events (/api/v1/events).
+
+Events are dicts published to topics such as ``scan:<scan id>`` and
+``patient:<patient row id>``. Subscribers are connections on this process's
+event loop, each with a small bounded queue; publishers may run on any
+thread and never block. The broker is chosen with EVENTS_BROKER: "memory"
+fans out within one process, "redis" relays through Redis pub/sub so that
+events raised on one worker reach subscribers connected to another.
+"""
+
+import os
+import json
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.models import MonitoringAlert
+from app.core.responses import dumps
+
+logger = logging.getLogger(__name__)
+
+# "memory" (single process) or "redis" (multi-worker deployments)
+EVENTS_BROKER = os.getenv("EVENTS_BROKER", "memory")
+EVENTS_REDIS_URL = os.getenv("EVENTS_REDIS_URL", "redis://localhost:6379/0")
+EVENTS_REDIS_CHANNEL = os.getenv("EVENTS_REDIS_CHANNEL", "tumortrace-events")
+# Events buffered per subscriber; a client that falls further behind loses the oldest
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "64"))
+# Open event streams per process
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "10000"))
+
+
+def scan_topic(scan_id: str) -> str:
+    return f"scan:{scan_id}"
+
+
+def patient_topic(patient_row_id: str) -> str:
+    return f"patient:{patient_row_id}"
+
+
+class Subscription:
+    """One connected client: its topics and a bounded queue of pending events"""
+
+    __slots__ = ("topics", "queue", "dropped")
+
+    def __init__(self, topics: Iterable[str], size: int):
+        self.topics = frozenset(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(size)
+        self.dropped = 0
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        """Queue an event without blocking; a full queue drops its oldest event (returns True)"""
+        dropped = self.queue.full()
+        if dropped:
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+        return dropped
+
+
+class Broker:
+    """Fan-out of published events to the subscribers of this process.
+
+    Subscriptions are created and consumed on the bound event loop;
+    ``publish`` is safe to call from any thread.
+    """
+
+    name = "memory"
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE, max_subscribers: int = EVENTS_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._subscribers = 0
+        self._published = 0
+        self._dropped = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Bind the event loop that owns the subscriptions"""
+        self._loop = loop
+
+    def stop(self) -> None:
+        self._loop = None
+
+    @property
+    def full(self) -> bool:
+        return self._subscribers >= self.max_subscribers
+
+    def subscribe(self, topics: Iterable[str]) -> Optional[Subscription]:
+        """Register a subscriber, or return None when the process is at capacity"""
+        if self.full:
+            return None
+        subscription = Subscription(topics, self.queue_size)
+        for topic in subscription.topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        self._subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+        self._subscribers -= 1
+
+    def publish(self, topics: Iterable[str], event: Dict[str, Any]) -> None:
+        """Send an event to every subscriber of any of the topics"""
+        self._dispatch(list(topics), event)
+
+    def _dispatch(self, topics: List[str], event: Dict[str, Any]) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._deliver(topics, event)
+        else:
+            # Subscriber queues are not thread-safe; hand the event to the loop
+            loop.call_soon_threadsafe(self._deliver, topics, event)
+
+    def _deliver(self, topics: List[str], event: Dict[str, Any]) -> None:
+        self._published += 1
+        seen: Set[Subscription] = set()
+        for topic in topics:
+            for subscription in self._topics.get(topic, ()):
+                if subscription not in seen:
+                    seen.add(subscription)
+                    if subscription.offer(event):
+                        self._dropped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "broker": self.name,
+            "subscribers": self._subscribers,
+            "topics": len(self._topics),
+            "published": self._published,
+            "dropped": self._dropped,
+        }
+
+
+class RedisBroker(Broker):
+    """Relays events through a Redis channel so every worker delivers them.
+
+    Publishing goes to Redis only; a listener thread per process feeds the
+    messages (including this process's own) into the local fan-out.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = EVENTS_REDIS_URL, channel: str = EVENTS_REDIS_CHANNEL, **kwargs: Any):
+        super().__init__(**kwargs)
+        import redis  # optional dependency, only needed for this broker
+
+        self.channel = channel
+        self._redis = redis.Redis.from_url(url)
+        self._pubsub = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        super().start(loop)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(self.channel)
+        self._thread = threading.Thread(target=self._listen, name="events-redis", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        super().stop()
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+    def publish(self, topics: Iterable[str], event: Dict[str, Any]) -> None:
+        try:
+            self._redis.publish(self.channel, dumps({"topics": list(topics), "event": event}))
+        except Exception as e:
+            logger.warning(f"Failed to publish event to Redis: {e}")
+
+    def _listen(self) -> None:
+        pubsub = self._pubsub
+        try:
+            for message in pubsub.listen():
+                payload = json.loads(message["data"])
+                self._dispatch(payload["topics"], payload["event"])
+        except Exception as e:
+            if self._loop is not None:
+                logger.error(f"Redis event listener stopped: {e}")
+
+
+def create_broker(name: str = EVENTS_BROKER) -> Broker:
+    if name == "memory":
+        return Broker()
+    if name == "redis":
+        return RedisBroker()
+    raise ValueError(f"Unsupported EVENTS_BROKER: {name}. Supported brokers: memory, redis")
+
+
+# Process-wide broker shared by the publishers and the /events endpoint
+broker = create_broker()
+
+
+def scan_topics(scan_id: str, patient_row_id: Optional[str]) -> List[str]:
+    """Topics of events about a scan: its own and its patient's"""
+    return [scan_topic(scan_id)] + ([patient_topic(patient_row_id)] if patient_row_id else [])
+
+
+def publish_job(scan_id: str, patient_row_id: Optional[str], state: str, **fields: Any) -> None:
+    """Announce a state change of the analysis of a scan"""
+    broker.publish(scan_topics(scan_id, patient_row_id), {"type": "job", "scan_id": scan_id, "state": state, **fields})
+
+
+class StageProgress:
+    """Stage listener (see instrumentation.stage_listener) publishing analysis progress"""
+
+    def __init__(self, scan_id: str, patient_row_id: Optional[str]):
+        self.topics = scan_topics(scan_id, patient_row_id)
+        self.scan_id = scan_id
+        self._last: Optional[str] = None
+
+    def __call__(self, stage: str, elapsed_seconds: float) -> None:
+        # Tiled analyses enter the same stages over and over; report changes only
+        if stage == self._last:
+            return
+        self._last = stage
+        broker.publish(self.topics, {
+            "type": "stage", "scan_id": self.scan_id, "stage": stage, "elapsed_ms": round(elapsed_seconds * 1000, 1),
+        })
+
+
+# New alerts are announced once their transaction commits, wherever they are created
+_NEW_ALERTS_KEY = "_new_alerts"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_alerts(session, flush_context):
+    # Captured now, since committing expires the objects' attributes
+    alerts = [{
+        "type": "alert",
+        "id": obj.id,
+        "patient_id": obj.patient_id,
+        "alert_type": obj.alert_type,
+        "severity": obj.severity,
+        "message": obj.message,
+        "created_at": obj.created_at,
+    } for obj in session.new if isinstance(obj, MonitoringAlert)]
+    if alerts:
+        session.info.setdefault(_NEW_ALERTS_KEY, []).extend(alerts)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_alerts(session):
+    for alert in session.info.pop(_NEW_ALERTS_KEY, ()):
+        broker.publish([patient_topic(alert["patient_id"])], alert)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_alerts(session, previous_transaction):
+    session.info.pop(_NEW_ALERTS_KEY, None)
@@ -6,13 +6,49 @@ import torch.nn as nn
 import torchvision.transforms as transforms
 from PIL import Image
 import numpy as np
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import logging
 
+from app.services.tensor_cache import TensorCache, HISTO_TENSOR_CACHE_DIR
+from app.services.slide_tiler import SlideReader, Tile
+from app.services.mask_writer import MASKS_DIR, MASK_READY
+from app.services.inference_backends import verified_backend, HISTO_RUNTIME
+from app.services.precision import apply_precision, MODEL_PRECISION
+from app.services.instrumentation import StageTimer
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Eager inference precision: fp32 or bf16 (autocast, channels-last)
+HISTO_PRECISION = os.getenv("HISTO_PRECISION", MODEL_PRECISION)
+
+# Slides with at least this many pixels are classified tile by tile
+HISTO_SLIDE_MIN_PIXELS = int(os.getenv("HISTO_SLIDE_MIN_PIXELS", str(4096 * 4096)))
+# Tiles classified per forward pass in whole-slide mode
+HISTO_TILE_BATCH = int(os.getenv("HISTO_TILE_BATCH", "32"))
+
+# Test-time augmentation views averaged per prediction (1 = off, at most 8)
+HISTO_TTA_VIEWS = int(os.getenv("HISTO_TTA_VIEWS", "1"))
+# Default latency budget that caps the number of views (0 = no budget)
+HISTO_TTA_BUDGET_MS = float(os.getenv("HISTO_TTA_BUDGET_MS", "0"))
+# Smoothing factor of the per-sample forward latency estimate
+HISTO_LATENCY_EMA_ALPHA = 0.2
+
+MALIGNANT_CLASSES = ["In Situ Carcinoma", "Invasive Carcinoma"]
+
+# Dihedral views of an (N, C, H, W) batch, in the order they are added
+TTA_VIEWS = [
+    ("identity", lambda x: x),
+    ("hflip", lambda x: x.flip(3)),
+    ("vflip", lambda x: x.flip(2)),
+    ("rot180", lambda x: x.flip(2, 3)),
+    ("rot90", lambda x: x.rot90(1, (2, 3))),
+    ("rot270", lambda x: x.rot90(3, (2, 3))),
+    ("transpose", lambda x: x.transpose(2, 3)),
+    ("antitranspose", lambda x: x.flip(2, 3).transpose(2, 3)),
+]
+
 class BreastCancerCNN(nn.Module):
     """CNN model for breast cancer classification"""
     
@@ -59,11 +95,21 @@ class BreastCancerCNN(nn.Module):
         x = self.fc3(x)
         
         return x
+    
+    def fold_batchnorm(self) -> "BreastCancerCNN":
+        """Fold each eval-mode BatchNorm into the preceding convolution in place"""
+        for conv_name, bn_name in [("conv1", "bn1"), ("conv2", "bn2"), ("conv3", "bn3"), ("conv4", "bn4")]:
+            bn = getattr(self, bn_name)
+            if isinstance(bn, nn.BatchNorm2d):
+                fused = nn.utils.fusion.fuse_conv_bn_eval(getattr(self, conv_name), bn)
+                setattr(self, conv_name, fused)
+                setattr(self, bn_name, nn.Identity())
+        return self
 
 class HistoClassifier:
     """Histopathology image classification service using CNN"""
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None, runtime: Optional[str] = None):
         self.model_name = "BreastCancerCNN"
         self.class_names = ["Normal", "Benign", "In Situ Carcinoma", "Invasive Carcinoma"]
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -85,20 +131,46 @@ class HistoClassifier:
         self.model.eval()
         
         # Define image transformations
+        self.image_size = (224, 224)
+        self.mean = [0.485, 0.456, 0.406]
+        self.std = [0.229, 0.224, 0.225]
         self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
+            transforms.Resize(self.image_size),
             transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+            transforms.Normalize(mean=self.mean, std=self.std)
         ])
+        
+        # Preprocessed inputs are cached on disk so re-scoring skips decoding
+        self.tensor_cache = (
+            TensorCache(HISTO_TENSOR_CACHE_DIR, self.image_size, self.mean, self.std)
+            if HISTO_TENSOR_CACHE_DIR else None
+        )
+        
+        # Exported runtimes must match the eager model before they are used
+        self.runtime = verified_backend(
+            runtime or HISTO_RUNTIME, self.model, self.device, (2, 3) + self.image_size
+        )
+        # bf16 autocast falls back to fp32 on CPUs without native support
+        self.runtime = apply_precision(
+            self.runtime, self.model, self.device, (2, 3) + self.image_size, HISTO_PRECISION
+        )
+        
+        # Rotations only keep the input shape for square images
+        self.max_tta_views = len(TTA_VIEWS) if self.image_size[0] == self.image_size[1] else 4
+        # Running estimate of forward-pass milliseconds per stacked sample
+        self.sample_latency_ms: Optional[float] = None
     
     def preprocess_image(self, image_path: str) -> torch.Tensor:
         """Preprocess image for model inference"""
         try:
-            # Load and convert image
-            image = Image.open(image_path).convert('RGB')
-            
-            # Apply transformations
-            image_tensor = self.transform(image)
+            if self.tensor_cache is not None:
+                image_tensor = torch.from_numpy(self.tensor_cache.get_normalized(image_path))
+            else:
+                # Load and convert image
+                image = Image.open(image_path).convert('RGB')
+                
+                # Apply transformations
+                image_tensor = self.transform(image)
             
             # Add batch dimension
             image_tensor = image_tensor.unsqueeze(0)
@@ -108,39 +180,116 @@ class HistoClassifier:
         except Exception as e:
             raise ValueError(f"Failed to preprocess image {image_path}: {str(e)}")
     
-    def predict(self, image_tensor: torch.Tensor) -> Dict[str, Any]:
+    def preprocess_batch(self, image_paths: List[str]) -> torch.Tensor:
+        """Preprocess several images into one contiguous (N, 3, H, W) batch"""
+        try:
+            if self.tensor_cache is not None:
+                batch = torch.from_numpy(self.tensor_cache.load_batch(image_paths))
+            else:
+                batch = torch.stack([
+                    self.transform(Image.open(image_path).convert('RGB')) for image_path in image_paths
+                ])
+            return batch.to(self.device)
+            
+        except Exception as e:
+            raise ValueError(f"Failed to preprocess batch: {str(e)}")
+    
+    def decode_into(self, image_path: str, out: np.ndarray) -> None:
+        """Decode and normalize one image into a (3, H, W) float32 slot of a batch buffer"""
+        if self.tensor_cache is not None:
+            self.tensor_cache.copy_into(image_path, out)
+        else:
+            with Image.open(image_path) as image:
+                self._normalize_into(image.convert('RGB'), out)
+    
+    def _normalize_into(self, image: Image.Image, out: np.ndarray) -> None:
+        # Same Resize -> ToTensor -> Normalize steps as self.transform, written in place
+        resized = image.resize(self.image_size[::-1], Image.BILINEAR)
+        np.copyto(out, np.asarray(resized, dtype=np.float32).transpose(2, 0, 1))
+        out /= 255.0
+        out -= np.asarray(self.mean, dtype=np.float32).reshape(3, 1, 1)
+        out /= np.asarray(self.std, dtype=np.float32).reshape(3, 1, 1)
+    
+    def predict_proba(self, batch: torch.Tensor, tta_views: int = 1) -> torch.Tensor:
+        """Return class probabilities for a preprocessed (N, 3, H, W) batch.
+        
+        With tta_views > 1 the flipped and rotated views of every image are
+        stacked into one batch, run in a single forward pass, and averaged.
+        """
+        views = max(1, min(tta_views, self.max_tta_views))
+        if views > 1:
+            stacked = torch.cat([view(batch) for _, view in TTA_VIEWS[:views]])
+        else:
+            stacked = batch
+        start = time.perf_counter()
+        with torch.no_grad():
+            probabilities = torch.softmax(self.runtime(stacked), dim=1)
+        self._record_latency((time.perf_counter() - start) * 1000 / len(stacked))
+        if views > 1:
+            probabilities = probabilities.view(views, len(batch), -1).mean(dim=0)
+        return probabilities
+    
+    def tta_views_for(self, requested: Optional[int] = None, budget_ms: Optional[float] = None, batch_size: int = 1) -> int:
+        """Number of TTA views to run: the requested count, reduced to fit the latency budget"""
+        views = max(1, min(requested or HISTO_TTA_VIEWS, self.max_tta_views))
+        budget_ms = budget_ms if budget_ms is not None else HISTO_TTA_BUDGET_MS
+        if views > 1 and budget_ms > 0 and self.sample_latency_ms is not None:
+            # Stacked views scale close to linearly once the batch saturates the cores,
+            # so the per-sample estimate gives a conservative upper bound
+            affordable = int(budget_ms // (self.sample_latency_ms * max(1, batch_size)))
+            views = max(1, min(views, affordable))
+        return views
+    
+    def _record_latency(self, sample_ms: float) -> None:
+        if self.sample_latency_ms is None:
+            self.sample_latency_ms = sample_ms
+        else:
+            self.sample_latency_ms += HISTO_LATENCY_EMA_ALPHA * (sample_ms - self.sample_latency_ms)
+    
+    def warmup(self, batch_size: int) -> None:
+        """Run one synthetic batch so kernel selection and allocations happen before real traffic"""
+        self.predict_proba(torch.zeros((batch_size, 3) + self.image_size, device=self.device))
+    
+    def predict(self, image_tensor: torch.Tensor, tta_views: int = 1) -> Dict[str, Any]:
         """Run inference on preprocessed image"""
         try:
             with torch.no_grad():
-                # Forward pass
-                outputs = self.model(image_tensor)
-                
-                # Get probabilities
-                probabilities = torch.softmax(outputs, dim=1)
-                
-                # Get predicted class
-                predicted_class_idx = torch.argmax(probabilities, dim=1).item()
-                confidence = probabilities[0][predicted_class_idx].item()
+                # Forward pass and class probabilities
+                probabilities = self.predict_proba(image_tensor, tta_views)
                 
-                # Get all class probabilities
-                class_probabilities = {
-                    class_name: probabilities[0][i].item() 
-                    for i, class_name in enumerate(self.class_names)
-                }
-                
-                return {
-                    "predicted_class": self.class_names[predicted_class_idx],
-                    "predicted_class_id": predicted_class_idx,
-                    "confidence": confidence,
-                    "class_probabilities": class_probabilities
-                }
+                return self.format_prediction(probabilities[0])
                 
         except Exception as e:
             raise RuntimeError(f"Model inference failed: {str(e)}")
     
-    def analyze(self, file_path: str, body_part: str = "Breast") -> Dict[str, Any]:
+    def format_prediction(self, probabilities: torch.Tensor) -> Dict[str, Any]:
+        """Turn one row of class probabilities into a prediction dict"""
+        # Get predicted class
+        predicted_class_idx = int(torch.argmax(probabilities).item())
+        confidence = probabilities[predicted_class_idx].item()
+        
+        # Get all class probabilities
+        class_probabilities = {
+            class_name: probabilities[i].item() 
+            for i, class_name in enumerate(self.class_names)
+        }
+        
+        return {
+            "predicted_class": self.class_names[predicted_class_idx],
+            "predicted_class_id": predicted_class_idx,
+            "confidence": confidence,
+            "class_probabilities": class_probabilities
+        }
+    
+    def analyze(
+        self,
+        file_path: str,
+        body_part: str = "Breast",
+        tta_views: Optional[int] = None,
+        tta_budget_ms: Optional[float] = None,
+    ) -> Dict[str, Any]:
         """Analyze histopathology image and return classification results"""
-        start_time = time.time()
+        timer = StageTimer()
         
         try:
             # Validate file exists
@@ -153,48 +302,186 @@ class HistoClassifier:
             if file_ext not in valid_extensions:
                 raise ValueError(f"Unsupported image format: {file_ext}")
             
-            # Preprocess image
-            image_tensor = self.preprocess_image(file_path)
+            # Whole-slide scans are classified tile by tile instead of squashed to 224x224
+            if file_ext in ('.tiff', '.tif'):
+                with SlideReader(file_path) as reader:
+                    if reader.pixel_count >= HISTO_SLIDE_MIN_PIXELS:
+                        return self._analyze_slide(reader, body_part, timer)
             
-            # Run prediction
-            prediction_result = self.predict(image_tensor)
+            # Decode and preprocess image
+            with timer.stage("preprocess"):
+                image_tensor = self.preprocess_image(file_path)
             
-            # Calculate processing time
-            processing_time = time.time() - start_time
+            # Run prediction, averaged over augmented views when TTA is enabled
+            with timer.stage("inference"):
+                views = self.tta_views_for(tta_views, tta_budget_ms)
+                prediction_result = self.predict(image_tensor, views)
             
-            # Generate mask path (for consistency with other services)
-            mask_filename = f"histo_mask_{uuid.uuid4()}.png"
-            mask_path = os.path.join("data/masks", mask_filename)
-            
-            # Determine if malignant (In Situ or Invasive Carcinoma)
-            is_malignant = prediction_result["predicted_class"] in ["In Situ Carcinoma", "Invasive Carcinoma"]
-            
-            return {
-                "model_name": self.model_name,
-                "mask_path": mask_path,
-                "tumor_volume_mm3": 0.0,  # Histopathology is 2D, no volume
-                "tumor_volume_cc": 0.0,
-                "confidence_score": prediction_result["confidence"],
-                "processing_time_seconds": processing_time,
-                "analysis_details": {
-                    "body_part": body_part,
-                    "detection_method": "CNN Classification",
-                    "predicted_class": prediction_result["predicted_class"],
-                    "predicted_class_id": prediction_result["predicted_class_id"],
-                    "is_malignant": is_malignant,
-                    "class_probabilities": prediction_result["class_probabilities"],
-                    "image_quality_score": 0.95,  # Assuming good quality histopathology images
-                    "classification_confidence": prediction_result["confidence"]
-                }
-            }
+            return self.image_result(prediction_result, body_part, timer, views)
             
         except Exception as e:
             logger.error(f"Analysis failed for {file_path}: {str(e)}")
-            return self._fallback_analysis(file_path, body_part, start_time, str(e))
+            return self._fallback_analysis(file_path, body_part, timer, str(e))
+    
+    def image_result(
+        self,
+        prediction_result: Dict[str, Any],
+        body_part: str,
+        timer: StageTimer,
+        tta_views: int = 1,
+        processing_time: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Build the analysis result for a single-image prediction"""
+        if processing_time is None:
+            processing_time = timer.elapsed
+        
+        # Generate mask path (for consistency with other services)
+        mask_filename = f"histo_mask_{uuid.uuid4()}.png"
+        mask_path = os.path.join("data/masks", mask_filename)
+        
+        # Determine if malignant (In Situ or Invasive Carcinoma)
+        is_malignant = prediction_result["predicted_class"] in MALIGNANT_CLASSES
+        
+        return {
+            "model_name": self.model_name,
+            "mask_path": mask_path,
+            "tumor_volume_mm3": 0.0,  # Histopathology is 2D, no volume
+            "tumor_volume_cc": 0.0,
+            "confidence_score": prediction_result["confidence"],
+            "processing_time_seconds": processing_time,
+            "analysis_details": {
+                "body_part": body_part,
+                "detection_method": "CNN Classification",
+                "runtime": self.runtime.name,
+                "tta_views": [name for name, _ in TTA_VIEWS[:tta_views]],
+                "predicted_class": prediction_result["predicted_class"],
+                "predicted_class_id": prediction_result["predicted_class_id"],
+                "is_malignant": is_malignant,
+                "class_probabilities": prediction_result["class_probabilities"],
+                "image_quality_score": 0.95,  # Assuming good quality histopathology images
+                "classification_confidence": prediction_result["confidence"],
+                "stage_timings": timer.report(processing_time)
+            }
+        }
+    
+    def is_slide(self, file_path: str) -> bool:
+        """Whether analyze() would classify this file tile by tile"""
+        if os.path.splitext(file_path)[1].lower() not in ('.tiff', '.tif'):
+            return False
+        try:
+            with SlideReader(file_path) as reader:
+                return reader.pixel_count >= HISTO_SLIDE_MIN_PIXELS
+        except Exception:
+            return False
+    
+    def analyze_slide(self, file_path: str, body_part: str = "Breast") -> Dict[str, Any]:
+        """Classify a slide tile by tile regardless of its size"""
+        timer = StageTimer()
+        try:
+            with SlideReader(file_path) as reader:
+                return self._analyze_slide(reader, body_part, timer)
+        except Exception as e:
+            logger.error(f"Slide analysis failed for {file_path}: {str(e)}")
+            return self._fallback_analysis(file_path, body_part, timer, str(e))
+    
+    def _analyze_slide(self, reader: SlideReader, body_part: str, timer: StageTimer) -> Dict[str, Any]:
+        """Stream tissue tiles through the model and aggregate a slide-level prediction"""
+        rows, cols = reader.grid_shape
+        malignant_ids = [self.class_names.index(name) for name in MALIGNANT_CLASSES]
+        heatmap = np.zeros((rows, cols), dtype=np.float32)
+        class_totals = torch.zeros(len(self.class_names), dtype=torch.float64)
+        weight_total = 0.0
+        tiles_analyzed = 0
+        inference_start = time.perf_counter()
+        
+        pending: List[Tile] = []
+        
+        def flush():
+            nonlocal weight_total, tiles_analyzed
+            with timer.stage("preprocess"):
+                batch = self._tile_batch(pending)
+            with timer.stage("inference"):
+                probabilities = self.predict_proba(batch).cpu()
+            with timer.stage("aggregate"):
+                weights = torch.tensor([tile.tissue_fraction for tile in pending], dtype=torch.float64)
+                class_totals.add_(weights @ probabilities.double())
+                weight_total += float(weights.sum())
+                malignant = probabilities[:, malignant_ids].sum(dim=1).numpy()
+                for tile, score in zip(pending, malignant):
+                    heatmap[tile.row, tile.col] = score
+            tiles_analyzed += len(pending)
+            pending.clear()
+        
+        tiles = reader.tiles()
+        while True:
+            # Tiles are read and tissue-filtered lazily as the generator advances
+            with timer.stage("tile_read"):
+                tile = next(tiles, None)
+            if tile is None:
+                break
+            pending.append(tile)
+            if len(pending) >= HISTO_TILE_BATCH:
+                flush()
+        if pending:
+            flush()
+        
+        inference_time = time.perf_counter() - inference_start
+        if not tiles_analyzed:
+            raise ValueError("No tissue tiles found in slide")
+        
+        # Tissue-weighted mean of tile probabilities
+        slide_probabilities = (class_totals / weight_total).tolist()
+        predicted_class_idx = int(np.argmax(slide_probabilities))
+        predicted_class = self.class_names[predicted_class_idx]
+        confidence = float(slide_probabilities[predicted_class_idx])
+        
+        # Coarse malignancy heatmap, one pixel per tile, stored as the mask
+        with timer.stage("mask_write"):
+            mask_path = os.path.join(MASKS_DIR, f"histo_heatmap_{uuid.uuid4()}.png")
+            Image.fromarray((heatmap * 255).round().astype(np.uint8)).save(mask_path)
+        
+        total_tiles = rows * cols
+        processing_time = timer.elapsed
+        return {
+            "model_name": self.model_name,
+            "mask_path": mask_path,
+            "mask_status": MASK_READY,
+            "tumor_volume_mm3": 0.0,  # Histopathology is 2D, no volume
+            "tumor_volume_cc": 0.0,
+            "confidence_score": confidence,
+            "processing_time_seconds": processing_time,
+            "analysis_details": {
+                "body_part": body_part,
+                "detection_method": "Tiled CNN Classification",
+                "runtime": self.runtime.name,
+                "predicted_class": predicted_class,
+                "predicted_class_id": predicted_class_idx,
+                "is_malignant": predicted_class in MALIGNANT_CLASSES,
+                "class_probabilities": dict(zip(self.class_names, slide_probabilities)),
+                "classification_confidence": confidence,
+                "slide_width": reader.width,
+                "slide_height": reader.height,
+                "tile_size": list(reader.tile_shape),
+                "tile_grid": [rows, cols],
+                "tiles_total": total_tiles,
+                "tiles_analyzed": tiles_analyzed,
+                "tiles_skipped": total_tiles - tiles_analyzed,
+                "tiles_per_second": tiles_analyzed / inference_time if inference_time > 0 else 0.0,
+                "heatmap_path": mask_path,
+                "stage_timings": timer.report(processing_time)
+            }
+        }
+    
+    def _tile_batch(self, tiles: List[Tile]) -> torch.Tensor:
+        """Resize and normalize tiles into one (N, 3, H, W) batch"""
+        batch = np.empty((len(tiles), 3) + tuple(self.image_size), dtype=np.float32)
+        for i, tile in enumerate(tiles):
+            self._normalize_into(Image.fromarray(tile.pixels), batch[i])
+        return torch.from_numpy(batch).to(self.device)
     
-    def _fallback_analysis(self, file_path: str, body_part: str, start_time: float, error: str) -> Dict[str, Any]:
+    def _fallback_analysis(self, file_path: str, body_part: str, timer: StageTimer, error: str) -> Dict[str, Any]:
         """Fallback analysis when processing fails"""
-        processing_time = time.time() - start_time
+        processing_time = timer.elapsed
         
         return {
             "model_name": self.model_name,
@@ -207,6 +494,7 @@ class HistoClassifier:
                 "body_part": body_part,
                 "detection_method": "CNN Classification",
                 "error": error,
+                "stage_timings": timer.report(processing_time),
                 "predicted_class": "Unknown",
                 "predicted_class_id": -1,
                 "is_malignant": False,
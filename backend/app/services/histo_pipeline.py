@@ -0,0 +1,124 @@
+import os
+import queue
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Threads decoding and transforming images ahead of the model
+HISTO_DECODE_WORKERS = int(os.getenv("HISTO_DECODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Prepared batches allowed to wait for the model
+HISTO_PREFETCH_DEPTH = int(os.getenv("HISTO_PREFETCH_DEPTH", "2"))
+# Images per forward pass
+HISTO_PIPELINE_BATCH = int(os.getenv("HISTO_PIPELINE_BATCH", "16"))
+
+_END = object()
+
+
+@dataclass
+class PreparedBatch:
+    """A contiguous input batch plus the images that could not be decoded"""
+    paths: List[str]
+    tensor: torch.Tensor
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+class DecodePipeline:
+    """Producer/consumer pipeline that overlaps image decoding with inference.
+
+    A producer thread fills batch buffers using a pool of decode workers and
+    hands them to the consumer through a queue bounded by the prefetch depth,
+    so I/O and decoding for the next batches run while the model computes the
+    current one. PIL and numpy release the GIL for the heavy parts.
+    """
+
+    def __init__(
+        self,
+        classifier: Any,
+        batch_size: int = HISTO_PIPELINE_BATCH,
+        workers: int = HISTO_DECODE_WORKERS,
+        prefetch_depth: int = HISTO_PREFETCH_DEPTH,
+    ):
+        self.classifier = classifier
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.prefetch_depth = max(1, prefetch_depth)
+        # Page-locked buffers let host-to-device copies run asynchronously
+        self.pin_memory = classifier.device.type == "cuda"
+
+    def batches(self, image_paths: Sequence[str]) -> Iterator[PreparedBatch]:
+        """Yield prepared batches in input order"""
+        ready: "queue.Queue[Any]" = queue.Queue(maxsize=self.prefetch_depth)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce, args=(list(image_paths), ready, stop), name="histo-decode", daemon=True
+        )
+        producer.start()
+        try:
+            while True:
+                item = ready.get()
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # Unblock the producer if it is waiting on a full queue
+            while producer.is_alive():
+                try:
+                    ready.get_nowait()
+                except queue.Empty:
+                    producer.join(timeout=0.05)
+
+    def run(
+        self, image_paths: Sequence[str], tta_views: int = 1
+    ) -> Iterator[Tuple[List[str], Optional[torch.Tensor], Dict[str, str]]]:
+        """Yield (paths, probabilities, errors) for each batch as inference completes"""
+        for batch in self.batches(image_paths):
+            probabilities = None
+            if batch.paths:
+                probabilities = self.classifier.predict_proba(
+                    batch.tensor.to(self.classifier.device, non_blocking=self.pin_memory), tta_views
+                ).cpu()
+            yield batch.paths, probabilities, batch.errors
+
+    def _produce(self, image_paths: List[str], ready: "queue.Queue[Any]", stop: threading.Event) -> None:
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="histo-decode") as pool:
+                for start in range(0, len(image_paths), self.batch_size):
+                    if stop.is_set():
+                        return
+                    batch = self._prepare(pool, image_paths[start:start + self.batch_size])
+                    ready.put(batch)
+            ready.put(_END)
+        except BaseException as e:
+            ready.put(e)
+
+    def _prepare(self, pool: ThreadPoolExecutor, paths: List[str]) -> PreparedBatch:
+        shape = (len(paths), 3) + tuple(self.classifier.image_size)
+        tensor = torch.empty(shape, dtype=torch.float32, pin_memory=self.pin_memory)
+        buffer = tensor.numpy()
+
+        futures = [pool.submit(self.classifier.decode_into, path, buffer[i]) for i, path in enumerate(paths)]
+        errors: Dict[str, str] = {}
+        valid: List[int] = []
+        for i, (path, future) in enumerate(zip(paths, futures)):
+            try:
+                future.result()
+                valid.append(i)
+            except Exception as e:
+                logger.warning(f"Failed to decode {path}: {e}")
+                errors[path] = str(e)
+
+        if len(valid) < len(paths):
+            # Compact the batch so failed slots never reach the model
+            tensor = tensor[valid].contiguous()
+            if self.pin_memory:
+                tensor = tensor.pin_memory()
+        return PreparedBatch(paths=[paths[i] for i in valid], tensor=tensor, errors=errors)
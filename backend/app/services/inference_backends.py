@@ -0,0 +1,177 @@
+import os
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional, Sequence
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+# Runtime used by the histopathology classifier: eager, torchscript, onnx or quantized
+HISTO_RUNTIME = os.getenv("HISTO_RUNTIME", "eager")
+HISTO_TORCHSCRIPT_PATH = os.getenv("HISTO_TORCHSCRIPT_PATH", "models/breast_cancer_cnn.ts")
+HISTO_ONNX_PATH = os.getenv("HISTO_ONNX_PATH", "models/breast_cancer_cnn.onnx")
+HISTO_QUANTIZED_PATH = os.getenv("HISTO_QUANTIZED_PATH", "models/breast_cancer_cnn.int8.ts")
+# Maximum absolute probability difference tolerated against the eager model
+HISTO_PARITY_TOLERANCE = float(os.getenv("HISTO_PARITY_TOLERANCE", "1e-3"))
+# INT8 models are approximations, so they get a looser bound
+HISTO_QUANTIZED_TOLERANCE = float(os.getenv("HISTO_QUANTIZED_TOLERANCE", "0.1"))
+
+RUNTIMES = ["eager", "torchscript", "onnx", "quantized"]
+
+
+class InferenceBackend(ABC):
+    """Callable mapping a preprocessed (N, C, H, W) batch to logits"""
+
+    name = "base"
+
+    @abstractmethod
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        ...
+
+
+class EagerBackend(InferenceBackend):
+    """Runs the PyTorch module directly"""
+
+    name = "eager"
+
+    def __init__(self, model: nn.Module):
+        self.model = model
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.model(batch)
+
+
+class TorchScriptBackend(InferenceBackend):
+    """Runs a frozen TorchScript artifact"""
+
+    name = "torchscript"
+
+    def __init__(self, path: str, device: torch.device):
+        self.path = path
+        self.module = torch.jit.load(path, map_location=device)
+        self.module.eval()
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.module(batch)
+
+
+class QuantizedBackend(TorchScriptBackend):
+    """Runs an INT8 TorchScript artifact produced by quantize_model.py"""
+
+    name = "quantized"
+
+    def __init__(self, path: str, device: torch.device):
+        from app.services.quantization import select_quantized_engine
+
+        # Quantized kernels only run on the CPU
+        select_quantized_engine()
+        super().__init__(path, torch.device("cpu"))
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        return super().__call__(batch.cpu()).to(batch.device)
+
+
+class OnnxBackend(InferenceBackend):
+    """Runs an ONNX artifact through ONNX Runtime on the CPU"""
+
+    name = "onnx"
+
+    def __init__(self, path: str):
+        import onnxruntime as ort
+
+        self.path = path
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Use the same per-worker thread budget as torch
+        from app.services.model_registry import worker_thread_budget
+        options.intra_op_num_threads = worker_thread_budget()
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        inputs = batch.detach().cpu().contiguous().numpy()
+        (logits,) = self.session.run(None, {self.input_name: inputs})
+        return torch.from_numpy(logits).to(batch.device)
+
+
+def create_backend(
+    runtime: str,
+    model: nn.Module,
+    device: torch.device,
+    torchscript_path: str = HISTO_TORCHSCRIPT_PATH,
+    onnx_path: str = HISTO_ONNX_PATH,
+    quantized_path: str = HISTO_QUANTIZED_PATH,
+) -> InferenceBackend:
+    """Build the requested runtime; the eager module is always the reference"""
+    if runtime == "eager":
+        return EagerBackend(model)
+    if runtime == "torchscript":
+        return TorchScriptBackend(torchscript_path, device)
+    if runtime == "onnx":
+        return OnnxBackend(onnx_path)
+    if runtime == "quantized":
+        return QuantizedBackend(quantized_path, device)
+    raise ValueError(f"Unsupported runtime: {runtime}. Supported runtimes: {', '.join(RUNTIMES)}")
+
+
+def parity_error(reference: InferenceBackend, candidate: InferenceBackend, input_shape: Sequence[int], device: torch.device) -> float:
+    """Maximum absolute difference between the softmax outputs of two backends"""
+    generator = torch.Generator().manual_seed(0)
+    batch = torch.randn(tuple(input_shape), generator=generator).to(device)
+    expected = torch.softmax(reference(batch).float(), dim=1)
+    actual = torch.softmax(candidate(batch).float(), dim=1)
+    return float((expected - actual).abs().max())
+
+
+def verified_backend(
+    runtime: str,
+    model: nn.Module,
+    device: torch.device,
+    input_shape: Sequence[int],
+    tolerance: Optional[float] = None,
+    **paths: Optional[str],
+) -> InferenceBackend:
+    """Create a runtime and fall back to eager if it fails to load or diverges"""
+    eager = EagerBackend(model)
+    if runtime == "eager":
+        return eager
+    if tolerance is None:
+        tolerance = HISTO_QUANTIZED_TOLERANCE if runtime == "quantized" else HISTO_PARITY_TOLERANCE
+    try:
+        backend = create_backend(runtime, model, device, **{k: v for k, v in paths.items() if v})
+        error = parity_error(eager, backend, input_shape, device)
+    except Exception as e:
+        logger.warning(f"Failed to load {runtime} runtime: {e}. Using eager runtime.")
+        return eager
+    if error > tolerance:
+        logger.error(f"{runtime} runtime diverges from eager model (max error {error:.2e} > {tolerance:.0e}). Using eager runtime.")
+        return eager
+    logger.info(f"Using {runtime} runtime (max parity error {error:.2e})")
+    return backend
+
+
+def export_torchscript(model: nn.Module, path: str, example: torch.Tensor) -> None:
+    """Save a frozen TorchScript artifact; freezing inlines weights and folds conv+BN"""
+    model.eval()
+    scripted = torch.jit.trace(model, example)
+    frozen = torch.jit.freeze(scripted)
+    frozen.save(path)
+
+
+def export_onnx(model: nn.Module, path: str, example: torch.Tensor, opset: int = 17) -> None:
+    """Save an ONNX artifact with a dynamic batch dimension"""
+    model.eval()
+    torch.onnx.export(
+        model,
+        example,
+        path,
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset,
+        do_constant_folding=True,
+    )
@@ -0,0 +1,89 @@
+import os
+import logging
+import threading
+from typing import Any, Callable, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+from app.services.inference_backends import EagerBackend
+from app.services.precision import PrecisionBackend, apply_precision, MODEL_PRECISION
+
+logger = logging.getLogger(__name__)
+
+# Forward passes allowed to run at once in a process; concurrent passes would
+# only split the same intra-op threads between them
+INFERENCE_CONCURRENCY = int(os.getenv("INFERENCE_CONCURRENCY", "1"))
+
+_forward_slots = threading.BoundedSemaphore(max(1, INFERENCE_CONCURRENCY))
+
+
+def build_model(factory: Callable[[], nn.Module], weights_path: Optional[str], seed: int = 0) -> Tuple[nn.Module, str]:
+    """Build a model from a factory and load its weights.
+
+    Without a weights file the model keeps a seeded initialization, so the
+    default CPU model is the same in every process and across runs.
+    Returns the model and a description of where its weights came from.
+    """
+    with torch.random.fork_rng(devices=[]):
+        torch.manual_seed(seed)
+        model = factory()
+    source = f"default (seed {seed})"
+    if weights_path and os.path.exists(weights_path):
+        try:
+            model.load_state_dict(torch.load(weights_path, map_location="cpu"))
+            source = weights_path
+            logger.info(f"Loaded weights from {weights_path}")
+        except Exception as e:
+            logger.warning(f"Failed to load weights from {weights_path}: {e}. Using seeded default weights.")
+    else:
+        logger.info(f"No weights found at {weights_path}. Using seeded default weights.")
+    return model.eval(), source
+
+
+class InferenceRuntime:
+    """Batched, precision-aware forward passes shared by the imaging analyzers.
+
+    Inputs larger than max_batch are split into chunks, every chunk runs
+    under the process-wide forward-pass limit, and the model runs under the
+    configured precision policy.
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        input_shape: Sequence[int],
+        max_batch: int = 8,
+        precision: str = MODEL_PRECISION,
+        weights: str = "default",
+    ):
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = model.to(self.device).eval()
+        self.input_shape = tuple(input_shape)
+        self.max_batch = max(1, max_batch)
+        self.weights = weights
+        self.backend = apply_precision(EagerBackend(self.model), self.model, self.device, self.input_shape, precision)
+
+    @property
+    def name(self) -> str:
+        return self.backend.name
+
+    def forward(self, batch: torch.Tensor, fn: Optional[Callable[[torch.Tensor], Any]] = None) -> Any:
+        """Run fn (default: the model) over a batch in chunks of at most max_batch"""
+        fn = fn or self.model
+        outputs = []
+        for start in range(0, len(batch), self.max_batch):
+            chunk = batch[start:start + self.max_batch].to(self.device)
+            with _forward_slots:
+                if isinstance(self.backend, PrecisionBackend):
+                    outputs.append(self.backend.run(fn, chunk))
+                else:
+                    with torch.no_grad():
+                        outputs.append(fn(chunk))
+        if isinstance(outputs[0], tuple):
+            return tuple(torch.cat(parts) for parts in zip(*outputs))
+        return torch.cat(outputs)
+
+    def warmup(self, batch_size: int) -> None:
+        """Run one synthetic batch of the configured input shape"""
+        self.forward(torch.zeros((batch_size,) + self.input_shape[1:]))
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import resource
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Also record the peak Python heap (including numpy buffers) of every stage.
+# tracemalloc slows allocation-heavy code and its peak counter is shared by
+# all threads, so keep it for profiling runs rather than production traffic.
+INSTRUMENT_TRACEMALLOC = os.getenv("INSTRUMENT_TRACEMALLOC", "0") == "1"
+
+if INSTRUMENT_TRACEMALLOC and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+# Called with (stage name, seconds since the timer started) as each stage
+# begins; set around an analysis to report its progress (events.StageProgress)
+stage_listener: ContextVar[Optional[Callable[[str, float], None]]] = ContextVar("stage_listener", default=None)
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def process_peak_rss_mb() -> float:
+    """High-water resident set size of the whole process since it started.
+
+    ru_maxrss never decreases and covers every request the worker has served,
+    so it bounds an analysis' memory from above but does not measure it.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT / (1024 * 1024)
+
+
+class StageTimer:
+    """Monotonic per-stage timings for one analysis, plus per-stage traced heap peaks when enabled"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.traced_peaks: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        listener = stage_listener.get()
+        if listener is not None:
+            listener(name, self.elapsed)
+        if INSTRUMENT_TRACEMALLOC:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+            if INSTRUMENT_TRACEMALLOC:
+                peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                self.traced_peaks[name] = max(peak, self.traced_peaks.get(name, 0.0))
+
+    def add(self, name: str, seconds: float) -> None:
+        """Record time measured elsewhere, e.g. a share of a batched pass"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the timer was created"""
+        return time.perf_counter() - self.start
+
+    def report(self, total: Optional[float] = None) -> Dict[str, Any]:
+        """Stage breakdown in milliseconds, ready for analysis_details and the database"""
+        total = self.elapsed if total is None else total
+        stages_ms = {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+        report = {
+            "stages_ms": stages_ms,
+            "total_ms": round(total * 1000, 3),
+            # Time spent outside any named stage (validation, bookkeeping)
+            "other_ms": round(max(0.0, total * 1000 - sum(stages_ms.values())), 3),
+            # Process-lifetime high-water mark at the end of this analysis, not its own peak
+            "process_peak_rss_mb": round(process_peak_rss_mb(), 1),
+        }
+        if self.traced_peaks:
+            report["peak_traced_mb"] = {name: round(mb, 2) for name, mb in self.traced_peaks.items()}
+        return report
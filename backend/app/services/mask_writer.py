@@ -0,0 +1,228 @@
+import os
+import gzip
+import uuid
+import queue
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MASKS_DIR = "data/masks"
+os.makedirs(MASKS_DIR, exist_ok=True)
+
+# Codec used for persisted masks: "none" (plain .nii), "zlib" (single-threaded
+# gzip at a fast level) or "parallel" (gzip members compressed on a thread pool)
+MASK_CODEC = os.getenv("MASK_CODEC", "zlib")
+MASK_COMPRESSION_LEVEL = int(os.getenv("MASK_COMPRESSION_LEVEL", "1"))
+MASK_WRITER_QUEUE_SIZE = int(os.getenv("MASK_WRITER_QUEUE_SIZE", "16"))
+# Seconds submit() waits for room in a full queue before writing the mask itself
+MASK_WRITER_SUBMIT_TIMEOUT = float(os.getenv("MASK_WRITER_SUBMIT_TIMEOUT", "1.0"))
+MASK_GZIP_THREADS = int(os.getenv("MASK_GZIP_THREADS", str(os.cpu_count() or 2)))
+MASK_GZIP_CHUNK_BYTES = 4 * 1024 * 1024
+
+CODEC_EXTENSIONS = {
+    "none": ".nii",
+    "zlib": ".nii.gz",
+    "parallel": ".nii.gz",
+}
+
+MASK_PENDING = "pending"
+MASK_READY = "ready"
+MASK_FAILED = "failed"
+
+# Completed states are remembered so that rows committed after the write
+# finished can still be reconciled
+_STATUS_HISTORY = 4096
+_SHUTDOWN = object()
+
+
+class MaskWriter:
+    """Background writer that persists segmentation masks off the request path"""
+
+    def __init__(
+        self,
+        codec: str = MASK_CODEC,
+        level: int = MASK_COMPRESSION_LEVEL,
+        queue_size: int = MASK_WRITER_QUEUE_SIZE,
+        threads: int = MASK_GZIP_THREADS,
+        submit_timeout: float = MASK_WRITER_SUBMIT_TIMEOUT,
+    ):
+        if codec not in CODEC_EXTENSIONS:
+            raise ValueError(f"Unsupported mask codec: {codec}. Supported codecs: {', '.join(CODEC_EXTENSIONS)}")
+
+        self.codec = codec
+        self.level = level
+        self.threads = max(1, threads)
+        self.submit_timeout = submit_timeout
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._status: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def mask_path(self, prefix: str) -> str:
+        """Return a new mask path whose extension matches the configured codec"""
+        return os.path.join(MASKS_DIR, f"{prefix}_{uuid.uuid4()}{CODEC_EXTENSIONS[self.codec]}")
+
+    def submit(self, image: Any, mask_path: str) -> str:
+        """Queue a nibabel image for writing.
+
+        When the queue stays full for ``submit_timeout`` seconds the mask is
+        written on the calling thread instead, so a backlog slows requests
+        down rather than stalling them indefinitely.
+        """
+        self._ensure_started()
+        self._set_status(mask_path, MASK_PENDING)
+        try:
+            self._queue.put((image, mask_path), timeout=self.submit_timeout)
+        except queue.Full:
+            logger.warning(f"Mask writer queue full, writing {mask_path} inline")
+            # The row referencing the mask is not committed yet; reconcile() picks the state up
+            self._set_status(mask_path, self._write_logged(image, mask_path))
+        return mask_path
+
+    def status(self, mask_path: str) -> Optional[str]:
+        """Return the write state of a mask, or None if it is not tracked"""
+        with self._lock:
+            return self._status.get(mask_path)
+
+    def queue_depth(self) -> int:
+        """Masks waiting to be written"""
+        return self._queue.qsize()
+
+    def reconcile(self, db: Any, segmentation: Any) -> None:
+        """Bring a freshly committed Segmentation row in line with the writer state"""
+        state = self.status(str(segmentation.mask_path))
+        if state and state != segmentation.mask_status:
+            segmentation.mask_status = state
+            db.commit()
+
+    def flush(self) -> None:
+        """Block until every queued mask has been written"""
+        self._queue.join()
+
+    def shutdown(self) -> None:
+        """Drain the queue and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(_SHUTDOWN)
+        self._thread.join()
+        self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mask-writer", daemon=True)
+                self._thread.start()
+
+    def _set_status(self, mask_path: str, state: str) -> None:
+        with self._lock:
+            self._status[mask_path] = state
+            self._status.move_to_end(mask_path)
+            while len(self._status) > _STATUS_HISTORY:
+                self._status.popitem(last=False)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _SHUTDOWN:
+                    return
+                image, mask_path = item
+                state = self._write_logged(image, mask_path)
+                # Record the state before touching the database so that a
+                # request committing its row concurrently can reconcile it
+                self._set_status(mask_path, state)
+                _mark_segmentations(mask_path, state)
+            finally:
+                self._queue.task_done()
+
+    def _write_logged(self, image: Any, mask_path: str) -> str:
+        """Write a mask and return its resulting state"""
+        try:
+            self._write(image, mask_path)
+            return MASK_READY
+        except Exception as e:
+            logger.error(f"Failed to write mask {mask_path}: {e}")
+            return MASK_FAILED
+
+    def _write(self, image: Any, mask_path: str) -> None:
+        payload = image.to_bytes()
+        if self.codec == "zlib":
+            payload = gzip.compress(payload, compresslevel=self.level)
+        elif self.codec == "parallel":
+            payload = b"".join(self._compress_parallel(payload))
+
+        directory = os.path.dirname(mask_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{mask_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, mask_path)
+        _fsync_directory(directory)
+
+    def _compress_parallel(self, payload: bytes) -> List[bytes]:
+        """Compress fixed-size chunks as independent gzip members.
+
+        Concatenated members form a valid gzip stream, and zlib releases the
+        GIL, so the chunks compress concurrently on the pool.
+        """
+        with self._lock:
+            # Inline writes may compress alongside the writer thread
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="mask-gzip")
+        view = memoryview(payload)
+        chunks = [view[i:i + MASK_GZIP_CHUNK_BYTES] for i in range(0, len(view), MASK_GZIP_CHUNK_BYTES)] or [view]
+        return list(self._pool.map(lambda chunk: gzip.compress(chunk, compresslevel=self.level), chunks))
+
+
+def _fsync_directory(directory: str) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _mark_segmentations(mask_path: str, state: str) -> None:
+    """Flip the mask state of any Segmentation rows that reference the mask"""
+    from app.db.database import SessionLocal
+    from app.db.models import Scan, Segmentation
+    from app.db.revisions import bump_revisions
+    from app.services.events import broker, scan_topics
+
+    db = SessionLocal()
+    try:
+        db.query(Segmentation).filter(Segmentation.mask_path == mask_path).update(
+            {Segmentation.mask_status: state}, synchronize_session=False
+        )
+        scans = db.query(Scan.id, Scan.patient_id).join(
+            Segmentation, Segmentation.scan_id == Scan.id
+        ).filter(Segmentation.mask_path == mask_path).all()
+        # Bulk updates skip the flush hooks, so the owning patients are bumped here
+        bump_revisions(db, [patient_id for _, patient_id in scans])
+        db.commit()
+        for scan_id, patient_id in scans:
+            broker.publish(scan_topics(scan_id, patient_id), {"type": "mask", "scan_id": scan_id, "mask_status": state})
+    except Exception as e:
+        logger.error(f"Failed to update mask state for {mask_path}: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+# Process-wide writer shared by all analyzers
+mask_writer = MaskWriter()
@@ -0,0 +1,146 @@
+import os
+import gc
+import logging
+import threading
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Load every analyzer in the master process so forked workers share the weights
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "0") == "1"
+# Number of worker processes serving the app (same variable gunicorn reads)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Intra-op threads per worker (0 = available CPUs divided by WEB_CONCURRENCY)
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "0"))
+# Weights of the served histopathology classifier, relative to the backend directory
+HISTO_MODEL_PATH = os.getenv("HISTO_MODEL_PATH", "models/breast_cancer_cnn.pt")
+
+_factories: Dict[str, Callable[[], Any]] = {}
+_instances: Dict[str, Any] = {}
+_lock = threading.Lock()
+# Process that last applied the thread budget (forked workers must re-apply it)
+_threads_pid = None
+
+
+def register(name: str, factory: Callable[[], Any]) -> None:
+    """Register a factory for a process-wide analyzer instance"""
+    _factories[name] = factory
+
+
+def registered() -> List[str]:
+    return list(_factories)
+
+
+def get(name: str) -> Any:
+    """Return the shared analyzer instance, creating it on first use"""
+    if _threads_pid != os.getpid():
+        configure_threads()
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        if name not in _instances:
+            if name not in _factories:
+                raise KeyError(f"No analyzer registered for {name}")
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+
+def loaded() -> Dict[str, Any]:
+    """Analyzer instances created so far"""
+    return dict(_instances)
+
+
+def preload() -> None:
+    """Load every registered analyzer and move its weights to shared memory.
+
+    Meant to run in the master before workers are forked. Tensors in shared
+    memory stay physically shared even if a worker writes to them, and
+    freezing the GC keeps collections in the workers from dirtying the pages
+    that hold the preloaded Python objects.
+    """
+    global _threads_pid
+    import torch
+
+    # Keep the master single-threaded so no OpenMP pool exists at fork time;
+    # each process applies its own budget on its first get()
+    torch.set_num_threads(1)
+    _threads_pid = os.getpid()
+    for name in registered():
+        instance = get(name)
+        shared = _share_modules(instance)
+        logger.info(f"Preloaded {name} analyzer ({shared} shared modules)")
+    gc.collect()
+    gc.freeze()
+    _threads_pid = None
+
+
+def worker_thread_budget() -> int:
+    """Intra-op threads for one worker so that workers do not oversubscribe the cores"""
+    if WORKER_THREADS > 0:
+        return WORKER_THREADS
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(1, cpus // max(1, WEB_CONCURRENCY))
+
+
+def configure_threads() -> int:
+    """Apply the per-worker CPU thread budget to torch"""
+    global _threads_pid
+    import torch
+
+    _threads_pid = os.getpid()
+    threads = worker_thread_budget()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Inter-op threads can only be set before any parallel work has run
+        pass
+    logger.info(f"Worker {os.getpid()} using {threads} intra-op threads")
+    return threads
+
+
+def _share_modules(instance: Any) -> int:
+    import torch.nn as nn
+
+    shared = 0
+    candidates = list(vars(instance).values())
+    runtime = getattr(instance, "runtime", None)
+    if runtime is not None and hasattr(runtime, "__dict__"):
+        candidates.extend(vars(runtime).values())
+    seen = set()
+    for candidate in candidates:
+        if isinstance(candidate, nn.Module) and id(candidate) not in seen:
+            seen.add(id(candidate))
+            candidate.share_memory()
+            shared += 1
+    return shared
+
+
+def _histo_classifier():
+    from app.services.histo_classifier import HistoClassifier
+    return HistoClassifier(model_path=HISTO_MODEL_PATH)
+
+
+def _mri_segmenter():
+    from app.services.mri_segmenter import MRISegmenter
+    return MRISegmenter()
+
+
+def _ct_analyzer():
+    from app.services.ct_analyzer import CTAnalyzer
+    return CTAnalyzer()
+
+
+def _xray_model():
+    from app.services.xray_model import XRayModel
+    return XRayModel()
+
+
+register("MRI", _mri_segmenter)
+register("CT", _ct_analyzer)
+register("XRAY", _xray_model)
+register("HISTOPATH", _histo_classifier)
@@ -1,10 +1,13 @@
 import os
 import uuid
-import time
 import numpy as np
 import nibabel as nib
 from typing import Dict, Any
 
+from app.services.mask_writer import mask_writer, MASK_PENDING
+from app.services.volume_cache import load_volume
+from app.services.instrumentation import StageTimer
+
 MASKS_DIR = "data/masks"
 os.makedirs(MASKS_DIR, exist_ok=True)
 
@@ -16,30 +19,34 @@ class MRISegmenter:
     
     def analyze(self, file_path: str, scan_type: str) -> Dict[str, Any]:
         """Analyze MRI scan and perform tumor segmentation"""
-        start_time = time.time()
+        timer = StageTimer()
         
         try:
             # Load MRI data
             if file_path.endswith(('.nii.gz', '.nii')):
-                img = nib.load(file_path)
-                data = img.get_fdata()
-                
-                # Simulate TumorTrace segmentation
-                # In production, this would call the actual TumorTrace model
-                result = self._simulate_tumor_trace(data, scan_type)
+                with timer.stage("load"):
+                    # Decoded volumes are shared read-only through the volume cache
+                    volume = load_volume(file_path)
+                    data = volume.data
                 
-                # Save segmentation mask
-                mask_filename = f"mri_mask_{uuid.uuid4()}.nii.gz"
-                mask_path = os.path.join(MASKS_DIR, mask_filename)
+                with timer.stage("inference"):
+                    # Simulate TumorTrace segmentation
+                    # In production, this would call the actual TumorTrace model
+                    result = self._simulate_tumor_trace(data, scan_type)
                 
-                mask_img = nib.Nifti1Image(result["mask"].astype(np.uint8), img.affine, img.header)
-                nib.save(mask_img, mask_path)
+                with timer.stage("mask_write"):
+                    # Queue segmentation mask for background persistence
+                    mask_path = mask_writer.mask_path("mri_mask")
+                    
+                    mask_img = nib.Nifti1Image(result["mask"].astype(np.uint8), volume.affine, volume.header)
+                    mask_writer.submit(mask_img, mask_path)
                 
-                processing_time = time.time() - start_time
+                processing_time = timer.elapsed
                 
                 return {
                     "model_name": self.model_name,
                     "mask_path": mask_path,
+                    "mask_status": MASK_PENDING,
                     "tumor_volume_mm3": result["volume_mm3"],
                     "tumor_volume_cc": result["volume_cc"],
                     "confidence_score": result["confidence"],
@@ -48,16 +55,17 @@ class MRISegmenter:
                         "scan_type": scan_type,
                         "segmentation_method": "TumorTrace",
                         "tumor_count": result.get("tumor_count", 1),
-                        "largest_tumor_volume_cc": result.get("largest_tumor_volume_cc", result["volume_cc"])
+                        "largest_tumor_volume_cc": result.get("largest_tumor_volume_cc", result["volume_cc"]),
+                        "stage_timings": timer.report(processing_time)
                     }
                 }
             else:
                 # Handle other formats (DICOM, etc.)
-                return self._simulate_analysis(file_path, scan_type, start_time)
+                return self._simulate_analysis(file_path, scan_type, timer)
                 
         except Exception as e:
             # Fallback to simulated data
-            return self._fallback_analysis(file_path, scan_type, start_time, str(e))
+            return self._fallback_analysis(file_path, scan_type, timer, str(e))
     
     def _simulate_tumor_trace(self, data: np.ndarray, scan_type: str) -> Dict[str, Any]:
         """Simulate TumorTrace segmentation results"""
@@ -88,9 +96,9 @@ class MRISegmenter:
             "largest_tumor_volume_cc": float(volume_cc)
         }
     
-    def _simulate_analysis(self, file_path: str, scan_type: str, start_time: float) -> Dict[str, Any]:
+    def _simulate_analysis(self, file_path: str, scan_type: str, timer: StageTimer) -> Dict[str, Any]:
         """Simulate analysis for non-NIfTI formats"""
-        processing_time = time.time() - start_time
+        processing_time = timer.elapsed
         
         return {
             "model_name": self.model_name,
@@ -103,13 +111,14 @@ class MRISegmenter:
                 "scan_type": scan_type,
                 "segmentation_method": "TumorTrace",
                 "tumor_count": 1,
-                "largest_tumor_volume_cc": 42.7
+                "largest_tumor_volume_cc": 42.7,
+                "stage_timings": timer.report(processing_time)
             }
         }
     
-    def _fallback_analysis(self, file_path: str, scan_type: str, start_time: float, error: str) -> Dict[str, Any]:
+    def _fallback_analysis(self, file_path: str, scan_type: str, timer: StageTimer, error: str) -> Dict[str, Any]:
         """Fallback analysis when processing fails"""
-        processing_time = time.time() - start_time
+        processing_time = timer.elapsed
         
         return {
             "model_name": self.model_name,
@@ -122,6 +131,7 @@ class MRISegmenter:
                 "scan_type": scan_type,
                 "segmentation_method": "TumorTrace",
                 "error": error,
+                "stage_timings": timer.report(processing_time),
                 "tumor_count": 1,
                 "largest_tumor_volume_cc": 35.0
             }
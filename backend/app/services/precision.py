@@ -0,0 +1,119 @@
+import os
+import logging
+from contextlib import nullcontext
+from typing import Any, Callable, Optional, Sequence
+
+import torch
+import torch.nn as nn
+
+from app.services.inference_backends import InferenceBackend, EagerBackend
+
+logger = logging.getLogger(__name__)
+
+# Default precision for eager models: fp32 or bf16 (per-model settings override it)
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32")
+# Use channels-last tensors in fp32 too (always on for bf16)
+MODEL_CHANNELS_LAST = os.getenv("MODEL_CHANNELS_LAST", "0") == "1"
+# Maximum absolute probability difference tolerated against fp32
+PRECISION_PARITY_TOLERANCE = float(os.getenv("PRECISION_PARITY_TOLERANCE", "0.05"))
+
+PRECISIONS = ["fp32", "bf16"]
+
+
+def bf16_supported(device: torch.device) -> bool:
+    """Whether the device has native bfloat16 matmul/convolution support"""
+    if device.type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    if not torch.backends.mkldnn.is_available():
+        return False
+    check = getattr(torch.ops.mkldnn, "_is_mkldnn_bf16_supported", None)
+    if check is not None:
+        try:
+            return bool(check())
+        except RuntimeError:
+            pass
+    # Older builds: look for AVX-512 BF16 or AMX in the CPU flags
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def memory_format_for(input_shape: Sequence[int]) -> Optional[torch.memory_format]:
+    """Channels-last layout for 2D (NCHW) and 3D (NCDHW) inputs"""
+    if len(input_shape) == 4:
+        return torch.channels_last
+    if len(input_shape) == 5:
+        return torch.channels_last_3d
+    return None
+
+
+class PrecisionBackend(InferenceBackend):
+    """Runs an eager module in channels-last layout, optionally under bfloat16 autocast"""
+
+    def __init__(self, model: nn.Module, device: torch.device, precision: str, memory_format: Optional[torch.memory_format]):
+        self.model = model
+        self.precision = precision
+        self.memory_format = memory_format
+        self.device_type = device.type
+        self.name = "eager" if precision == "fp32" else f"eager-{precision}"
+        if memory_format is not None:
+            self.model.to(memory_format=memory_format)
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        return self.run(self.model, batch)
+
+    def run(self, fn: Callable[[torch.Tensor], Any], batch: torch.Tensor) -> Any:
+        """Call fn (the model or one of its methods) under this precision policy"""
+        if self.memory_format is not None:
+            batch = batch.contiguous(memory_format=self.memory_format)
+        autocast = (
+            torch.autocast(self.device_type, dtype=torch.bfloat16) if self.precision == "bf16" else nullcontext()
+        )
+        with torch.no_grad(), autocast:
+            # Callers always receive fp32 outputs
+            output = fn(batch)
+        if isinstance(output, tuple):
+            return tuple(tensor.float() for tensor in output)
+        return output.float()
+
+
+def apply_precision(
+    backend: InferenceBackend,
+    model: nn.Module,
+    device: torch.device,
+    input_shape: Sequence[int],
+    precision: str = MODEL_PRECISION,
+    channels_last: bool = MODEL_CHANNELS_LAST,
+    tolerance: float = PRECISION_PARITY_TOLERANCE,
+) -> InferenceBackend:
+    """Wrap an eager backend with the requested precision, falling back to fp32 when unsupported or inaccurate"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unsupported precision: {precision}. Supported precisions: {', '.join(PRECISIONS)}")
+    if not isinstance(backend, EagerBackend):
+        # Exported artifacts carry their own numerics
+        if precision != "fp32":
+            logger.warning(f"{precision} precision only applies to the eager runtime; keeping {backend.name}")
+        return backend
+    if precision == "fp32" and not channels_last:
+        return backend
+    if precision == "bf16" and not bf16_supported(device):
+        logger.warning(f"{device.type.upper()} lacks native bfloat16 support. Using fp32.")
+        if not channels_last:
+            return backend
+        precision = "fp32"
+
+    # The reference must run before the module is converted to channels-last
+    generator = torch.Generator().manual_seed(0)
+    sample = torch.randn(tuple(input_shape), generator=generator).to(device)
+    expected = torch.softmax(backend(sample).float(), dim=1)
+
+    candidate = PrecisionBackend(model, device, precision, memory_format_for(input_shape))
+    error = float((torch.softmax(candidate(sample), dim=1) - expected).abs().max())
+    if error > tolerance:
+        logger.error(f"{precision} inference diverges from fp32 (max error {error:.2e} > {tolerance:.0e}). Using fp32.")
+        return PrecisionBackend(model, device, "fp32", candidate.memory_format)
+    logger.info(f"Using {precision} inference{' (channels-last)' if candidate.memory_format else ''}, max parity error vs fp32 {error:.2e}")
+    return candidate
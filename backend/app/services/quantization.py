@@ -0,0 +1,79 @@
+import io
+import copy
+import logging
+from typing import Iterable
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ["dynamic", "static"]
+
+
+def select_quantized_engine() -> str:
+    """Pick the best available INT8 kernel library and make it current"""
+    supported = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in supported:
+            torch.backends.quantized.engine = engine
+            return engine
+    raise RuntimeError("No quantized engine available in this PyTorch build")
+
+
+def quantize_dynamic(model: nn.Module) -> nn.Module:
+    """INT8 weights for the linear layers, activations quantized on the fly.
+
+    fc1 alone holds most of the parameters, so this gives most of the size
+    and bandwidth savings without any calibration data.
+    """
+    select_quantized_engine()
+    model = copy.deepcopy(model).eval()
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static(model: nn.Module, calibration_batches: Iterable[torch.Tensor]) -> nn.Module:
+    """Static INT8 convolutions calibrated on sample batches, dynamic INT8 linears.
+
+    FX graph mode fuses conv+BN+ReLU before observers are inserted, so the
+    quantized graph runs fused INT8 convolution kernels.
+    """
+    from torch.ao.quantization import QConfigMapping, get_default_qconfig, default_dynamic_qconfig
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    engine = select_quantized_engine()
+    model = copy.deepcopy(model).eval()
+    qconfig_mapping = (
+        QConfigMapping()
+        .set_global(get_default_qconfig(engine))
+        .set_object_type(nn.Linear, default_dynamic_qconfig)
+    )
+
+    batches = iter(calibration_batches)
+    first = next(batches, None)
+    if first is None:
+        raise ValueError("Static quantization needs at least one calibration batch")
+
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(first,))
+    with torch.no_grad():
+        prepared(first)
+        calibrated = first.shape[0]
+        for batch in batches:
+            prepared(batch)
+            calibrated += batch.shape[0]
+    logger.info(f"Calibrated static quantization on {calibrated} images")
+    return convert_fx(prepared)
+
+
+def save_quantized(model: nn.Module, path: str, example: torch.Tensor) -> None:
+    """Save a quantized model as a frozen TorchScript artifact"""
+    with torch.no_grad():
+        scripted = torch.jit.trace(model.eval(), example)
+    torch.jit.freeze(scripted).save(path)
+
+
+def serialized_size(model: nn.Module) -> int:
+    """Bytes needed to serialize a model's state_dict"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
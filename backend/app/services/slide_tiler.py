@@ -0,0 +1,250 @@
+import os
+import math
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Tile edge in source pixels for images that are not natively tiled
+HISTO_TILE_SIZE = int(os.getenv("HISTO_TILE_SIZE", "512"))
+# Minimum fraction of tissue pixels for a tile to be classified
+HISTO_TISSUE_THRESHOLD = float(os.getenv("HISTO_TISSUE_THRESHOLD", "0.1"))
+
+# Pixels are subsampled by this stride when estimating tissue coverage
+_TISSUE_STRIDE = 4
+
+
+@dataclass
+class Tile:
+    """A decoded RGB tile positioned on the slide tile grid"""
+    row: int
+    col: int
+    pixels: np.ndarray
+    tissue_fraction: float
+
+
+def tissue_mask(pixels: np.ndarray) -> np.ndarray:
+    """Boolean mask of tissue pixels in an RGB array.
+
+    Glass background is bright and unsaturated and padding is near black, so
+    tissue is taken to be pixels that are neither.
+    """
+    rgb = pixels[..., :3].astype(np.int16)
+    low = rgb.min(axis=-1)
+    high = rgb.max(axis=-1)
+    return (high - low > 20) & (low < 220) & (high > 30)
+
+
+def tissue_fraction(pixels: np.ndarray, stride: int = _TISSUE_STRIDE) -> float:
+    """Estimate the tissue fraction of a tile from a strided subsample"""
+    sample = pixels[::stride, ::stride]
+    if sample.size == 0:
+        return 0.0
+    return float(tissue_mask(sample).mean())
+
+
+def _to_rgb(pixels: np.ndarray) -> np.ndarray:
+    if pixels.ndim == 2:
+        pixels = pixels[..., np.newaxis]
+    if pixels.shape[-1] == 1:
+        pixels = np.repeat(pixels, 3, axis=-1)
+    pixels = pixels[..., :3]
+    if pixels.dtype != np.uint8:
+        # Scale deeper samples down to 8 bits for the classifier
+        peak = float(np.iinfo(pixels.dtype).max) if np.issubdtype(pixels.dtype, np.integer) else 1.0
+        pixels = np.clip(pixels.astype(np.float32) * (255.0 / peak), 0, 255).astype(np.uint8)
+    return pixels
+
+
+class SlideReader:
+    """Streams tiles from a slide image without loading the full image.
+
+    Tiled TIFF/BigTIFF pages are read one tile at a time straight from the
+    file. Stripped TIFFs are decoded strip by strip into a single band of
+    tile rows. Pages that store each sample in its own plane are read the
+    same way, one segment per plane. Other formats are small enough to be
+    decoded in one go.
+    """
+
+    def __init__(self, file_path: str, tile_size: int = HISTO_TILE_SIZE, tissue_threshold: float = HISTO_TISSUE_THRESHOLD):
+        self.file_path = file_path
+        self.tissue_threshold = tissue_threshold
+        self._tif = None
+        self._page = None
+        self._planes = 1
+
+        if file_path.lower().endswith(('.tif', '.tiff')):
+            import tifffile
+
+            self._tif = tifffile.TiffFile(file_path)
+            self._page = self._tif.pages[0]
+            self.height, self.width = int(self._page.imagelength), int(self._page.imagewidth)
+            # Separate planes split every tile and strip into one segment per sample
+            if self._page.planarconfig == tifffile.PLANARCONFIG.SEPARATE:
+                self._planes = int(self._page.samplesperpixel)
+            if self._page.is_tiled:
+                self.tile_shape = (int(self._page.tilelength), int(self._page.tilewidth))
+            else:
+                self.tile_shape = (tile_size, tile_size)
+        else:
+            with Image.open(file_path) as image:
+                self.width, self.height = image.size
+            self.tile_shape = (tile_size, tile_size)
+
+        self.grid_shape = (
+            -(-self.height // self.tile_shape[0]),
+            -(-self.width // self.tile_shape[1]),
+        )
+
+    @property
+    def pixel_count(self) -> int:
+        return self.height * self.width
+
+    def close(self) -> None:
+        if self._tif is not None:
+            self._tif.close()
+            self._tif = None
+
+    def __enter__(self) -> "SlideReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def tiles(self) -> Iterator[Tile]:
+        """Yield tiles that pass the tissue check, in row-major order"""
+        if self._page is not None and self._page.is_tiled:
+            source = self._tiled_tiff_tiles()
+        elif self._page is not None:
+            source = self._stripped_tiff_tiles(self._tiff_strips())
+        else:
+            source = self._image_tiles()
+
+        for row, col, pixels in source:
+            pixels = _to_rgb(pixels)
+            fraction = tissue_fraction(pixels)
+            if fraction >= self.tissue_threshold:
+                yield Tile(row=row, col=col, pixels=pixels, tissue_fraction=fraction)
+
+    def _read_segment(self, index: int) -> Optional[np.ndarray]:
+        """Decode one tile or strip as (rows, columns, samples), or None if it is sparse"""
+        page = self._page
+        bytecount = page.databytecounts[index]
+        if not bytecount:
+            return None
+        fh = self._tif.filehandle
+        fh.seek(page.dataoffsets[index])
+        segment, _, shape = page.decode(
+            fh.read(bytecount),
+            index,
+            jpegtables=page.jpegtables,
+            jpegheader=getattr(page, "jpegheader", None),
+        )
+        if segment is None:
+            return None
+        return np.asarray(segment).reshape(shape[-3:])
+
+    def _read_position(self, index: int) -> Optional[np.ndarray]:
+        """Decode the segment at a position of the first plane, with the other planes stacked as samples"""
+        if self._planes == 1:
+            return self._read_segment(index)
+        # Each plane's segments follow those of the previous plane
+        per_plane = len(self._page.dataoffsets) // self._planes
+        planes = [self._read_segment(index + plane * per_plane) for plane in range(self._planes)]
+        if any(plane is None for plane in planes):
+            return None
+        return np.concatenate(planes, axis=-1)
+
+    def _tiled_tiff_tiles(self) -> Iterator[Tuple[int, int, np.ndarray]]:
+        tile_h, tile_w = self.tile_shape
+        thumbnail = self._tissue_thumbnail()
+
+        for index in range(len(self._page.dataoffsets) // self._planes):
+            row, col = divmod(index, self.grid_shape[1])
+            if thumbnail is not None and not self._thumbnail_has_tissue(thumbnail, row, col):
+                continue
+            # Sparse tiles are never written for empty regions
+            pixels = self._read_position(index)
+            if pixels is None:
+                continue
+            # Edge tiles are padded to the full tile size
+            height = min(tile_h, self.height - row * tile_h)
+            width = min(tile_w, self.width - col * tile_w)
+            yield row, col, pixels[:height, :width]
+
+    def _tiff_strips(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """(top row, pixels) of every strip, in order"""
+        if self._planes == 1:
+            for segment, indices, shape in self._page.segments():
+                yield indices[-3], np.asarray(segment).reshape(shape[-3:])
+            return
+        rows_per_strip = int(self._page.rowsperstrip)
+        for index in range(len(self._page.dataoffsets) // self._planes):
+            strip = self._read_position(index)
+            if strip is None:
+                strip = np.zeros((rows_per_strip, self.width, self._planes), dtype=self._page.dtype)
+            yield index * rows_per_strip, strip
+
+    def _stripped_tiff_tiles(self, strips: Iterator[Tuple[int, np.ndarray]]) -> Iterator[Tuple[int, int, np.ndarray]]:
+        tile_h, tile_w = self.tile_shape
+        band: Optional[np.ndarray] = None
+        band_row = 0
+        filled = 0
+
+        for strip_top, strip in strips:
+            strip = strip[:max(0, min(strip.shape[0], self.height - strip_top))]
+            if band is None:
+                band = np.zeros((tile_h, self.width, strip.shape[-1]), dtype=strip.dtype)
+
+            position = 0
+            while position < strip.shape[0]:
+                take = min(tile_h - filled, strip.shape[0] - position)
+                band[filled:filled + take] = strip[position:position + take, :self.width]
+                filled += take
+                position += take
+                if filled == tile_h:
+                    yield from self._cut_band(band, band_row, tile_h)
+                    band_row += 1
+                    filled = 0
+
+        if band is not None and filled:
+            yield from self._cut_band(band, band_row, filled)
+
+    def _cut_band(self, band: np.ndarray, row: int, height: int) -> Iterator[Tuple[int, int, np.ndarray]]:
+        tile_w = self.tile_shape[1]
+        for col in range(self.grid_shape[1]):
+            yield row, col, band[:height, col * tile_w:(col + 1) * tile_w].copy()
+
+    def _image_tiles(self) -> Iterator[Tuple[int, int, np.ndarray]]:
+        tile_h, tile_w = self.tile_shape
+        with Image.open(self.file_path) as image:
+            pixels = np.asarray(image.convert("RGB"))
+        for row in range(self.grid_shape[0]):
+            for col in range(self.grid_shape[1]):
+                yield row, col, pixels[row * tile_h:(row + 1) * tile_h, col * tile_w:(col + 1) * tile_w]
+
+    def _tissue_thumbnail(self) -> Optional[np.ndarray]:
+        """Tissue mask from the lowest pyramid level, if the slide has one"""
+        try:
+            levels = self._tif.series[0].levels
+        except (IndexError, AttributeError):
+            return None
+        if len(levels) < 2:
+            return None
+        thumbnail = levels[-1].asarray()
+        if levels[-1].axes.startswith("S"):
+            # Planar levels come back sample-first
+            thumbnail = np.moveaxis(thumbnail, 0, -1)
+        return tissue_mask(_to_rgb(thumbnail))
+
+    def _thumbnail_has_tissue(self, thumbnail: np.ndarray, row: int, col: int) -> bool:
+        scale_y = thumbnail.shape[0] / self.height
+        scale_x = thumbnail.shape[1] / self.width
+        tile_h, tile_w = self.tile_shape
+        top, left = int(row * tile_h * scale_y), int(col * tile_w * scale_x)
+        bottom = max(top + 1, math.ceil((row + 1) * tile_h * scale_y))
+        right = max(left + 1, math.ceil((col + 1) * tile_w * scale_x))
+        region = thumbnail[top:bottom, left:right]
+        # Thumbnails blur thin tissue, so the pre-pass only drops clearly empty tiles
+        return region.size > 0 and region.mean() >= self.tissue_threshold / 2
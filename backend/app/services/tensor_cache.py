@@ -0,0 +1,158 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Directory holding preprocessed histopathology inputs (opt-in, empty disables the cache)
+HISTO_TENSOR_CACHE_DIR = os.getenv("HISTO_TENSOR_CACHE_DIR", "")
+# "uint8" stores the resized image and normalizes in float32, matching the uncached
+# transform exactly; "float16" stores the normalized tensor at reduced precision
+HISTO_TENSOR_CACHE_DTYPE = os.getenv("HISTO_TENSOR_CACHE_DTYPE", "uint8")
+
+# Bump when the on-disk layout or preprocessing semantics change
+_CACHE_VERSION = 1
+_DIGEST_MEMO_SIZE = 65536
+
+
+class TensorCache:
+    """On-disk cache of preprocessed images stored as memory-mappable .npy files.
+
+    Entries are keyed by the image content digest plus a signature of the
+    transform parameters, so a new model with different preprocessing never
+    reads stale inputs. Cached arrays are channel-first, ready for batching.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        image_size: Tuple[int, int] = (224, 224),
+        mean: Sequence[float] = (0.485, 0.456, 0.406),
+        std: Sequence[float] = (0.229, 0.224, 0.225),
+        dtype: str = HISTO_TENSOR_CACHE_DTYPE,
+    ):
+        if dtype not in ("float16", "uint8"):
+            raise ValueError(f"Unsupported tensor cache dtype: {dtype}")
+        self.directory = directory
+        self.image_size = tuple(image_size)
+        self.dtype = dtype
+        self._mean = np.asarray(mean, dtype=np.float32).reshape(3, 1, 1)
+        self._std = np.asarray(std, dtype=np.float32).reshape(3, 1, 1)
+        self.signature = hashlib.blake2b(
+            repr((_CACHE_VERSION, self.image_size, tuple(mean), tuple(std), dtype)).encode(),
+            digest_size=8,
+        ).hexdigest()
+        self._digests: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return (3, self.image_size[0], self.image_size[1])
+
+    def get(self, image_path: str) -> np.ndarray:
+        """Return the cached array for an image, preprocessing it on a miss"""
+        entry_path = self._entry_path(image_path)
+        try:
+            array = np.load(entry_path, mmap_mode="r")
+            with self._lock:
+                self._hits += 1
+            return array
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # Truncated or corrupt entries are rebuilt like any other miss
+            logger.warning(f"Discarding unreadable tensor cache entry {entry_path}: {e}")
+
+        with self._lock:
+            self._misses += 1
+        array = self._preprocess(image_path)
+        self._store(entry_path, array)
+        return array
+
+    def get_normalized(self, image_path: str) -> np.ndarray:
+        """Return a float32 normalized CHW array for an image"""
+        out = np.empty(self.shape, dtype=np.float32)
+        self.copy_into(image_path, out)
+        return out
+
+    def copy_into(self, image_path: str, out: np.ndarray) -> None:
+        """Write the normalized CHW array for an image into ``out``"""
+        self._copy_normalized(self.get(image_path), out)
+
+    def load_batch(self, image_paths: Sequence[str], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Fill a contiguous float32 (N, C, H, W) buffer from cached entries"""
+        if out is None:
+            out = np.empty((len(image_paths),) + self.shape, dtype=np.float32)
+        for i, image_path in enumerate(image_paths):
+            self.copy_into(image_path, out[i])
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+            }
+
+    def _copy_normalized(self, array: np.ndarray, out: np.ndarray) -> None:
+        if self.dtype == "float16":
+            np.copyto(out, array, casting="unsafe")
+        else:
+            np.divide(array, 255.0, out=out, casting="unsafe")
+            out -= self._mean
+            out /= self._std
+
+    def _preprocess(self, image_path: str) -> np.ndarray:
+        # Mirrors Resize -> ToTensor -> Normalize from the classifier transform
+        with Image.open(image_path) as image:
+            image = image.convert("RGB").resize(self.image_size[::-1], Image.BILINEAR)
+            resized = np.asarray(image, dtype=np.uint8).transpose(2, 0, 1)
+        if self.dtype == "uint8":
+            return np.ascontiguousarray(resized)
+        normalized = (resized.astype(np.float32) / np.float32(255.0) - self._mean) / self._std
+        return normalized.astype(np.float16)
+
+    def _store(self, entry_path: str, array: np.ndarray) -> None:
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, entry_path)
+
+    def _entry_path(self, image_path: str) -> str:
+        digest = self._digest(image_path)
+        return os.path.join(self.directory, digest[:2], f"{digest}-{self.signature}.npy")
+
+    def _digest(self, image_path: str) -> str:
+        # Hashing is far cheaper than decoding, and the memo skips it entirely
+        # for files that have not changed since they were last seen
+        stat = os.stat(image_path)
+        memo_key = (os.path.realpath(image_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(memo_key)
+            if digest is not None:
+                self._digests.move_to_end(memo_key)
+                return digest
+
+        hasher = hashlib.blake2b(digest_size=20)
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+
+        with self._lock:
+            self._digests[memo_key] = digest
+            while len(self._digests) > _DIGEST_MEMO_SIZE:
+                self._digests.popitem(last=False)
+        return digest
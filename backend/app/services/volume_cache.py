@@ -0,0 +1,150 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import nibabel as nib
+
+# Byte budget for decoded volumes held in memory (0 disables caching)
+VOLUME_CACHE_BYTES = int(os.getenv("VOLUME_CACHE_BYTES", str(512 * 1024 * 1024)))
+# "mtime" keys on path + size + mtime; "digest" keys on the file contents, so
+# files rewritten with identical bytes keep hitting
+VOLUME_CACHE_KEY = os.getenv("VOLUME_CACHE_KEY", "mtime")
+
+# Digests remembered per file version so unchanged files are hashed once
+_DIGEST_MEMO_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class CachedVolume:
+    """Decoded volume shared between callers; ``data`` is read-only"""
+    data: np.ndarray
+    affine: np.ndarray
+    header: Any
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.data.nbytes)
+
+
+class VolumeCache:
+    """Process-wide LRU cache of decoded NIfTI volumes bounded by a byte budget"""
+
+    def __init__(self, max_bytes: int = VOLUME_CACHE_BYTES, key_mode: str = VOLUME_CACHE_KEY):
+        if key_mode not in ("mtime", "digest"):
+            raise ValueError(f"Unsupported volume cache key mode: {key_mode}")
+        self.max_bytes = max_bytes
+        self.key_mode = key_mode
+        self._entries: "OrderedDict[Tuple, CachedVolume]" = OrderedDict()
+        self._resident_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._digests: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, file_path: str) -> CachedVolume:
+        """Return the decoded volume for a file, decoding it on a miss"""
+        key = self._key(file_path)
+        with self._lock:
+            volume = self._entries.get(key)
+            if volume is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return volume
+            self._misses += 1
+
+        # Decode outside the lock so other volumes can be served meanwhile
+        img = nib.load(file_path)
+        data = np.asanyarray(img.get_fdata())
+        data.flags.writeable = False
+        volume = CachedVolume(data=data, affine=img.affine, header=img.header)
+        self._insert(key, volume)
+        return volume
+
+    def invalidate(self, file_path: str) -> None:
+        """Drop every cached entry for a path"""
+        path = os.path.realpath(file_path)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                self._resident_bytes -= self._entries.pop(key).nbytes
+            for key in [k for k in self._digests if k[0] == path]:
+                del self._digests[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._digests.clear()
+            self._resident_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit ratio and memory usage of the cache"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "resident_bytes": self._resident_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _insert(self, key: Tuple, volume: CachedVolume) -> None:
+        if volume.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._resident_bytes -= previous.nbytes
+            self._entries[key] = volume
+            self._resident_bytes += volume.nbytes
+            while self._resident_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._resident_bytes -= evicted.nbytes
+                self._evictions += 1
+
+    def _key(self, file_path: str) -> Tuple:
+        path = os.path.realpath(file_path)
+        stat = os.stat(path)
+        if self.key_mode == "digest":
+            return (path, stat.st_size, self._digest(path, stat))
+        return (path, stat.st_size, stat.st_mtime_ns)
+
+    def _digest(self, path: str, stat: os.stat_result) -> str:
+        # Any write or replacement changes the inode, mtime or ctime (which
+        # cannot be set back), so a file is only rehashed after it changed
+        memo_key = (path, stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+        with self._lock:
+            digest = self._digests.get(memo_key)
+            if digest is not None:
+                self._digests.move_to_end(memo_key)
+                return digest
+
+        digest = _file_digest(path)
+        with self._lock:
+            self._digests[memo_key] = digest
+            while len(self._digests) > _DIGEST_MEMO_SIZE:
+                self._digests.popitem(last=False)
+        return digest
+
+
+def _file_digest(file_path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Process-wide cache shared by the MRI segmenter and the segmentation endpoints
+volume_cache = VolumeCache()
+
+
+def load_volume(file_path: str) -> CachedVolume:
+    """Load a NIfTI volume through the shared cache"""
+    return volume_cache.load(file_path)
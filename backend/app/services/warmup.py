@@ -0,0 +1,112 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from app.services import model_registry
+
+logger = logging.getLogger(__name__)
+
+# Warm every registered analyzer in the background at startup
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+# Synthetic batch sizes run through each model (single requests, pipeline and slide tile batches)
+WARMUP_BATCH_SIZES = [int(size) for size in os.getenv("WARMUP_BATCH_SIZES", "1,16,32").split(",") if size.strip()]
+# Passes per batch size; the first pays for kernel selection, the rest settle the allocator
+WARMUP_ITERATIONS = int(os.getenv("WARMUP_ITERATIONS", "2"))
+
+WARMUP_PENDING = "pending"
+WARMUP_RUNNING = "running"
+WARMUP_READY = "ready"
+
+
+class ModelWarmup:
+    """Loads and exercises the registered analyzers once, off the request path"""
+
+    def __init__(self, batch_sizes: List[int], iterations: int):
+        self.batch_sizes = batch_sizes
+        self.iterations = max(1, iterations)
+        self.state = WARMUP_PENDING
+        self.models: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self, models: Optional[List[str]] = None) -> None:
+        """Start warming in a daemon thread; later calls are no-ops"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.state = WARMUP_RUNNING
+            self.started_at = time.perf_counter()
+            self._thread = threading.Thread(
+                target=self._run, args=(models or model_registry.registered(),), name="model-warmup", daemon=True
+            )
+            self._thread.start()
+
+    def skip(self) -> None:
+        """Mark the process ready without loading any model"""
+        self.state = WARMUP_READY
+
+    @property
+    def ready(self) -> bool:
+        return self.state == WARMUP_READY
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def status(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        return {
+            "state": self.state,
+            "batch_sizes": self.batch_sizes,
+            "elapsed_seconds": elapsed,
+            "models": self.models,
+        }
+
+    def _run(self, models: List[str]) -> None:
+        for name in models:
+            self.models[name] = {"state": WARMUP_RUNNING}
+            try:
+                self.models[name] = self._warm(name)
+                timings = ", ".join(f"bs{size}={ms:.1f}ms" for size, ms in self.models[name]["batch_ms"].items())
+                logger.info(
+                    f"Warmed up {name} in {self.models[name]['total_ms']:.1f}ms "
+                    f"(load {self.models[name]['load_ms']:.1f}ms{', ' + timings if timings else ''})"
+                )
+            except Exception as e:
+                # The analyzers fall back on their own, so a failed warm-up does not block readiness
+                self.models[name] = {"state": "failed", "error": str(e)}
+                logger.error(f"Warm-up failed for {name}: {e}")
+        self.finished_at = time.perf_counter()
+        self.state = WARMUP_READY
+        logger.info(f"Model warm-up finished in {self.finished_at - self.started_at:.2f}s")
+
+    def _warm(self, name: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        analyzer = model_registry.get(name)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        batch_ms: Dict[int, float] = {}
+        warm = getattr(analyzer, "warmup", None)
+        if warm is not None:
+            for size in self.batch_sizes:
+                for _ in range(self.iterations):
+                    iteration_start = time.perf_counter()
+                    warm(size)
+                    # Report the last pass: the steady-state cost after warming
+                    batch_ms[size] = (time.perf_counter() - iteration_start) * 1000
+        return {
+            "state": WARMUP_READY,
+            "load_ms": load_ms,
+            "batch_ms": batch_ms,
+            "total_ms": (time.perf_counter() - start) * 1000,
+        }
+
+
+model_warmup = ModelWarmup(WARMUP_BATCH_SIZES, WARMUP_ITERATIONS)
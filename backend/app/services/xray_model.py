@@ -1,128 +1,211 @@
 import os
 import uuid
-import time
-from typing import Dict, Any
+import logging
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torchvision.models import DenseNet
+from PIL import Image
+from typing import Dict, Any, List, Tuple
+
+from app.services.inference_runtime import InferenceRuntime, build_model
+from app.services.instrumentation import StageTimer
+from app.services.mask_writer import MASK_READY
+from app.services.precision import MODEL_PRECISION
+
+logger = logging.getLogger(__name__)
 
 MASKS_DIR = "data/masks"
 os.makedirs(MASKS_DIR, exist_ok=True)
 
+# Weights for the classifier; without them a small seeded model is used
+XRAY_MODEL_PATH = os.getenv("XRAY_MODEL_PATH", "models/xray_densenet.pt")
+# "small" (CPU-friendly default) or "densenet121" (full CheXNet backbone)
+XRAY_ARCH = os.getenv("XRAY_ARCH", "small")
+XRAY_IMAGE_SIZE = int(os.getenv("XRAY_IMAGE_SIZE", "224"))
+# Probability above which a finding is reported
+XRAY_THRESHOLD = float(os.getenv("XRAY_THRESHOLD", "0.5"))
+# Detector pixel size used when the file carries no spacing (typical chest radiograph)
+XRAY_DEFAULT_PIXEL_SPACING_MM = float(os.getenv("XRAY_DEFAULT_PIXEL_SPACING_MM", "0.14"))
+XRAY_PRECISION = os.getenv("XRAY_PRECISION", MODEL_PRECISION)
+
+# ChestX-ray14 findings predicted by CheXNet
+CHEXNET_LABELS = [
+    "atelectasis", "cardiomegaly", "effusion", "infiltration", "mass", "nodule", "pneumonia",
+    "pneumothorax", "consolidation", "edema", "emphysema", "fibrosis", "pleural_thickening", "hernia",
+]
+
+DENSENET_CONFIGS = {
+    "small": {"growth_rate": 16, "block_config": (2, 4, 6, 4), "num_init_features": 32},
+    "densenet121": {"growth_rate": 32, "block_config": (6, 12, 24, 16), "num_init_features": 64},
+}
+
+class ChestXRayDenseNet(nn.Module):
+    """DenseNet multi-label classifier with class activation maps"""
+
+    def __init__(self, arch: str = XRAY_ARCH, num_classes: int = len(CHEXNET_LABELS)):
+        super(ChestXRayDenseNet, self).__init__()
+        if arch not in DENSENET_CONFIGS:
+            raise ValueError(f"Unsupported X-ray architecture: {arch}. Supported: {', '.join(DENSENET_CONFIGS)}")
+        backbone = DenseNet(num_classes=num_classes, **DENSENET_CONFIGS[arch])
+        self.features = backbone.features
+        self.classifier = backbone.classifier
+
+    def forward(self, x):
+        return self.forward_cam(x)[0]
+
+    def forward_cam(self, x) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Return logits and per-class activation maps from one pass"""
+        features = F.relu(self.features(x))
+        logits = self.classifier(F.adaptive_avg_pool2d(features, 1).flatten(1))
+        # CAM: classifier weights applied at every spatial position
+        cams = torch.einsum("kc,nchw->nkhw", self.classifier.weight, features)
+        return logits, cams
+
 class XRayModel:
-    """X-ray analysis service using CheXNet-like processing"""
-    
-    def __init__(self):
+    """X-ray analysis service using a CheXNet-style DenseNet"""
+
+    def __init__(self, model_path: str = XRAY_MODEL_PATH, arch: str = XRAY_ARCH):
         self.model_name = "CheXNet"
-    
+        self.image_size = (XRAY_IMAGE_SIZE, XRAY_IMAGE_SIZE)
+        self.mean = np.asarray([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+        self.std = np.asarray([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+
+        model, weights = build_model(lambda: ChestXRayDenseNet(arch), model_path)
+        self.runtime = InferenceRuntime(
+            model, (2, 3) + self.image_size, precision=XRAY_PRECISION, weights=weights
+        )
+
     def analyze(self, file_path: str, body_part: str) -> Dict[str, Any]:
         """Analyze X-ray image and perform abnormality detection"""
-        start_time = time.time()
-        
+        timer = StageTimer()
+
         try:
-            # Simulate CheXNet analysis
-            # In production, this would call the actual CheXNet model
-            result = self._simulate_chexnet_analysis(file_path, body_part)
-            
-            # Save detection mask
-            mask_filename = f"xray_mask_{uuid.uuid4()}.png"
-            mask_path = os.path.join(MASKS_DIR, mask_filename)
-            
-            processing_time = time.time() - start_time
-            
+            with timer.stage("load"):
+                pixels, spacing = self.load_image(file_path)
+            with timer.stage("preprocess"):
+                batch = torch.from_numpy(self.preprocess(pixels)[None])
+            with timer.stage("inference"):
+                logits, cams = self.runtime.forward(batch, self.runtime.model.forward_cam)
+            with timer.stage("postprocess"):
+                result = self._postprocess(torch.sigmoid(logits[0]), cams[0], pixels, spacing)
+            with timer.stage("mask_write"):
+                # Save the activation map of the reported findings as the detection mask
+                mask_filename = f"xray_mask_{uuid.uuid4()}.png"
+                mask_path = os.path.join(MASKS_DIR, mask_filename)
+                Image.fromarray(result["mask"]).save(mask_path)
+
+            processing_time = timer.elapsed
+
             return {
                 "model_name": self.model_name,
                 "mask_path": mask_path,
-                "tumor_volume_mm3": result["volume_mm3"],
-                "tumor_volume_cc": result["volume_cc"],
+                "mask_status": MASK_READY,
+                "tumor_volume_mm3": 0.0,  # X-rays are 2D, so volume is 0
+                "tumor_volume_cc": 0.0,
                 "confidence_score": result["confidence"],
                 "processing_time_seconds": processing_time,
                 "analysis_details": {
                     "body_part": body_part,
                     "detection_method": "CheXNet",
-                    "abnormality_count": result.get("abnormality_count", 1),
-                    "largest_abnormality_area_mm2": result.get("largest_abnormality_area_mm2", 0),
-                    "abnormality_types": result.get("abnormality_types", []),
-                    "image_quality_score": result.get("image_quality_score", 0.85)
+                    "runtime": self.runtime.name,
+                    "weights": self.runtime.weights,
+                    "abnormality_count": result["abnormality_count"],
+                    "largest_abnormality_area_mm2": result["largest_abnormality_area_mm2"],
+                    "abnormality_types": result["abnormality_types"],
+                    "finding_probabilities": result["finding_probabilities"],
+                    "image_quality_score": result["image_quality_score"],
+                    "stage_timings": timer.report(processing_time)
                 }
             }
-                
+
         except Exception as e:
-            # Fallback to simulated data
-            return self._fallback_analysis(file_path, body_part, start_time, str(e))
-    
-    def _simulate_chexnet_analysis(self, file_path: str, body_part: str) -> Dict[str, Any]:
-        """Simulate CheXNet analysis results"""
-        # Simulate different analysis based on body part
-        body_part_analysis = {
-            "Chest": {
-                "volume_mm3": 0.0,  # X-rays are 2D, so volume is 0
-                "volume_cc": 0.0,
-                "confidence": 0.94,
-                "abnormality_count": 1,
-                "largest_abnormality_area_mm2": 450.0,
-                "abnormality_types": ["pneumonia", "nodule"],
-                "image_quality_score": 0.92
-            },
-            "Chest PA": {
-                "volume_mm3": 0.0,
-                "volume_cc": 0.0,
-                "confidence": 0.96,
-                "abnormality_count": 1,
-                "largest_abnormality_area_mm2": 380.0,
-                "abnormality_types": ["pneumonia"],
-                "image_quality_score": 0.94
-            },
-            "Chest Lateral": {
-                "volume_mm3": 0.0,
-                "volume_cc": 0.0,
-                "confidence": 0.91,
-                "abnormality_count": 1,
-                "largest_abnormality_area_mm2": 320.0,
-                "abnormality_types": ["nodule"],
-                "image_quality_score": 0.89
-            },
-            "Abdomen": {
-                "volume_mm3": 0.0,
-                "volume_cc": 0.0,
-                "confidence": 0.87,
-                "abnormality_count": 1,
-                "largest_abnormality_area_mm2": 280.0,
-                "abnormality_types": ["calcification"],
-                "image_quality_score": 0.85
-            },
-            "Pelvis": {
-                "volume_mm3": 0.0,
-                "volume_cc": 0.0,
-                "confidence": 0.89,
-                "abnormality_count": 1,
-                "largest_abnormality_area_mm2": 350.0,
-                "abnormality_types": ["fracture"],
-                "image_quality_score": 0.88
-            }
-        }
-        
-        analysis = body_part_analysis.get(body_part, {
-            "volume_mm3": 0.0,
-            "volume_cc": 0.0,
-            "confidence": 0.83,
-            "abnormality_count": 1,
-            "largest_abnormality_area_mm2": 300.0,
-            "abnormality_types": ["unknown"],
-            "image_quality_score": 0.80
-        })
-        
+            logger.error(f"X-ray analysis failed for {file_path}: {str(e)}")
+            return self._fallback_analysis(file_path, body_part, timer, str(e))
+
+    def load_image(self, file_path: str) -> Tuple[np.ndarray, Tuple[float, float]]:
+        """Return the radiograph as float32 in [0, 1] (H, W) plus the pixel spacing in mm"""
+        if file_path.lower().endswith(".dcm"):
+            return self._load_dicom(file_path)
+        with Image.open(file_path) as image:
+            pixels = np.asarray(image.convert("L"), dtype=np.float32) / 255.0
+        return pixels, (XRAY_DEFAULT_PIXEL_SPACING_MM, XRAY_DEFAULT_PIXEL_SPACING_MM)
+
+    def _load_dicom(self, file_path: str) -> Tuple[np.ndarray, Tuple[float, float]]:
+        import pydicom
+        try:
+            from pydicom.pixels import apply_voi_lut
+        except ImportError:
+            from pydicom.pixel_data_handlers.util import apply_voi_lut
+
+        dataset = pydicom.dcmread(file_path)
+        pixels = apply_voi_lut(dataset.pixel_array, dataset).astype(np.float32)
+        if pixels.ndim == 3:
+            # Multi-frame or colour data: use the first frame or channel
+            pixels = pixels[..., 0] if pixels.shape[-1] in (3, 4) else pixels[0]
+        low, high = float(pixels.min()), float(pixels.max())
+        pixels = (pixels - low) / (high - low) if high > low else np.zeros_like(pixels)
+        if getattr(dataset, "PhotometricInterpretation", "") == "MONOCHROME1":
+            pixels = 1.0 - pixels
+        spacing = getattr(dataset, "PixelSpacing", None) or getattr(dataset, "ImagerPixelSpacing", None)
+        if spacing:
+            return pixels, (float(spacing[0]), float(spacing[1]))
+        return pixels, (XRAY_DEFAULT_PIXEL_SPACING_MM, XRAY_DEFAULT_PIXEL_SPACING_MM)
+
+    def preprocess(self, pixels: np.ndarray) -> np.ndarray:
+        """Resize and normalize a [0, 1] radiograph into a (3, H, W) ImageNet-style input"""
+        image = Image.fromarray(pixels).resize(self.image_size[::-1], Image.BILINEAR)
+        gray = np.asarray(image, dtype=np.float32)
+        return (np.broadcast_to(gray, (3,) + gray.shape) - self.mean) / self.std
+
+    def warmup(self, batch_size: int) -> None:
+        self.runtime.warmup(batch_size)
+
+    def _postprocess(
+        self, probabilities: torch.Tensor, cams: torch.Tensor, pixels: np.ndarray, spacing: Tuple[float, float]
+    ) -> Dict[str, Any]:
+        from skimage.measure import label, regionprops
+
+        probabilities = probabilities.float().cpu()
+        detected = [i for i, p in enumerate(probabilities.tolist()) if p >= XRAY_THRESHOLD]
+        top = int(torch.argmax(probabilities))
+        # Without a finding the map shows where the most likely one would be
+        shown = detected or [top]
+
+        cam = cams[shown].float().mean(dim=0, keepdim=True)[None]
+        cam = F.interpolate(cam, size=pixels.shape, mode="bilinear", align_corners=False)[0, 0].cpu().numpy()
+        cam -= cam.min()
+        if cam.max() > 0:
+            cam /= cam.max()
+
+        regions: List[Any] = []
+        if detected:
+            regions = regionprops(label(cam >= 0.5, connectivity=2))
+        pixel_area_mm2 = spacing[0] * spacing[1]
+
+        if detected:
+            confidence = float(probabilities[detected].max())
+        else:
+            confidence = 1.0 - float(probabilities.max())
+
+        # Share of pixels that are neither clipped black nor clipped white
+        saturated = float(np.mean((pixels <= 0.01) | (pixels >= 0.99)))
+
         return {
-            "volume_mm3": float(analysis["volume_mm3"]),
-            "volume_cc": float(analysis["volume_cc"]),
-            "confidence": analysis["confidence"],
-            "abnormality_count": analysis["abnormality_count"],
-            "largest_abnormality_area_mm2": float(analysis["largest_abnormality_area_mm2"]),
-            "abnormality_types": analysis["abnormality_types"],
-            "image_quality_score": analysis["image_quality_score"]
+            "mask": (cam * 255).round().astype(np.uint8),
+            "confidence": confidence,
+            "abnormality_count": len(detected),
+            "largest_abnormality_area_mm2": float(max((r.area for r in regions), default=0) * pixel_area_mm2),
+            "abnormality_types": [CHEXNET_LABELS[i] for i in detected],
+            "finding_probabilities": dict(zip(CHEXNET_LABELS, probabilities.tolist())),
+            "image_quality_score": round(1.0 - saturated, 3)
         }
-    
-    def _fallback_analysis(self, file_path: str, body_part: str, start_time: float, error: str) -> Dict[str, Any]:
+
+    def _fallback_analysis(self, file_path: str, body_part: str, timer: StageTimer, error: str) -> Dict[str, Any]:
         """Fallback analysis when processing fails"""
-        processing_time = time.time() - start_time
-        
+        processing_time = timer.elapsed
+
         return {
             "model_name": self.model_name,
             "mask_path": f"/masks/fallback_xray_{uuid.uuid4()}.png",
@@ -134,9 +217,10 @@ class XRayModel:
                 "body_part": body_part,
                 "detection_method": "CheXNet",
                 "error": error,
+                "stage_timings": timer.report(processing_time),
                 "abnormality_count": 1,
                 "largest_abnormality_area_mm2": 250.0,
                 "abnormality_types": ["unknown"],
                 "image_quality_score": 0.75
             }
-        } 
\ No newline at end of file
+        }
@@ -0,0 +1,25 @@
+"""
+Gunicorn settings for multi-process deployments.
+
+Run from the backend directory:
+    PRELOAD_MODELS=1 WEB_CONCURRENCY=4 gunicorn app.main:app -c gunicorn.conf.py
+
+With preload_app the app module (and every analyzer model when
+PRELOAD_MODELS=1) is imported once in the master, so forked workers share
+the weight pages instead of each loading their own copy.
+"""
+
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+
+
+def post_fork(server, worker):
+    from app.db.database import engine
+
+    # Connections opened in the master must not be shared with the workers
+    engine.dispose(close=False)
@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scratch database and no background warm-up, set before the app is imported
+SCRATCH = tempfile.mkdtemp(prefix="tumortrace-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH, 'test.db')}"
+os.environ["WARMUP_ENABLED"] = "0"
+
+sys.path.insert(0, BACKEND)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in a scratch directory so data/uploads and data/masks stay out of the tree"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "masks").mkdir(parents=True)
+    (tmp_path / "data" / "uploads").mkdir(parents=True)
+    return tmp_path
@@ -0,0 +1,114 @@
+import os
+
+import nibabel as nib
+import numpy as np
+import pytest
+from PIL import Image
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from app.services.ct_analyzer import CTAnalyzer
+from app.services.mask_writer import mask_writer
+from app.services.xray_model import XRayModel
+
+RESULT_KEYS = {
+    "model_name", "mask_path", "mask_status", "tumor_volume_mm3", "tumor_volume_cc",
+    "confidence_score", "processing_time_seconds", "analysis_details",
+}
+
+
+def _dicom(path, modality, pixels, sop_class):
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = sop_class
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    dataset = FileDataset(str(path), {}, file_meta=meta, preamble=b"\0" * 128)
+    dataset.SOPClassUID = sop_class
+    dataset.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    dataset.Modality = modality
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = "MONOCHROME2"
+    dataset.Rows, dataset.Columns = pixels.shape[-2:]
+    dataset.BitsAllocated = dataset.BitsStored = 16
+    dataset.HighBit = 15
+    dataset.PixelRepresentation = 0
+    dataset.PixelData = pixels.astype(np.uint16).tobytes()
+    return dataset
+
+
+def _ct_volume():
+    """Soft tissue with a bright spherical lesion, in HU"""
+    rng = np.random.default_rng(0)
+    x, y, z = np.ogrid[:48, :48, :24]
+    volume = 40.0 + rng.normal(0.0, 10.0, (48, 48, 24))
+    volume[(x - 24) ** 2 + (y - 24) ** 2 + ((z - 12) * 2) ** 2 <= 64] = 120.0
+    return volume.astype(np.float32)
+
+
+@pytest.fixture
+def xray_png(workdir):
+    rng = np.random.default_rng(0)
+    path = workdir / "xray.png"
+    Image.fromarray(rng.integers(0, 256, (96, 96), dtype=np.uint8)).save(path)
+    return str(path)
+
+
+@pytest.fixture
+def xray_dicom(workdir):
+    rng = np.random.default_rng(1)
+    path = workdir / "xray.dcm"
+    dataset = _dicom(path, "DX", rng.integers(0, 4096, (96, 96)), "1.2.840.10008.5.1.4.1.1.1.1")
+    dataset.ImagerPixelSpacing = [0.14, 0.14]
+    dataset.save_as(str(path), write_like_original=False)
+    return str(path)
+
+
+@pytest.fixture
+def ct_nifti(workdir):
+    path = workdir / "ct.nii.gz"
+    nib.save(nib.Nifti1Image(_ct_volume(), np.diag([1.5, 1.5, 3.0, 1.0])), str(path))
+    return str(path)
+
+
+@pytest.fixture
+def ct_dicom(workdir):
+    path = workdir / "ct.dcm"
+    intercept = -1024.0
+    frames = np.ascontiguousarray(_ct_volume().transpose(2, 1, 0) - intercept)
+    dataset = _dicom(path, "CT", frames, "1.2.840.10008.5.1.4.1.1.2")
+    dataset.NumberOfFrames = frames.shape[0]
+    dataset.RescaleIntercept = intercept
+    dataset.RescaleSlope = 1.0
+    dataset.PixelSpacing = [1.5, 1.5]
+    dataset.SliceThickness = 3.0
+    dataset.save_as(str(path), write_like_original=False)
+    return str(path)
+
+
+def _check_result(result):
+    assert RESULT_KEYS <= set(result)
+    details = result["analysis_details"]
+    assert "error" not in details, details.get("error")
+    assert 0.0 <= result["confidence_score"] <= 1.0
+    assert result["tumor_volume_cc"] >= 0.0
+    assert set(details["stage_timings"]["stages_ms"]) >= {"load", "inference", "mask_write"}
+    assert details["stage_timings"]["process_peak_rss_mb"] > 0
+
+
+@pytest.mark.parametrize("image", ["xray_png", "xray_dicom"])
+def test_xray_analyze(image, request):
+    result = XRayModel().analyze(request.getfixturevalue(image), "Chest")
+    _check_result(result)
+    assert result["mask_status"] == "ready"
+    assert os.path.isfile(result["mask_path"])
+    assert len(result["analysis_details"]["finding_probabilities"]) == 14
+
+
+@pytest.mark.parametrize("volume", ["ct_nifti", "ct_dicom"])
+def test_ct_analyze(volume, request):
+    result = CTAnalyzer().analyze(request.getfixturevalue(volume), "Abdomen")
+    _check_result(result)
+    mask_writer.flush()
+    assert mask_writer.status(result["mask_path"]) == "ready"
+    assert os.path.isfile(result["mask_path"])
+    assert result["tumor_volume_mm3"] == pytest.approx(result["tumor_volume_cc"] * 1000)
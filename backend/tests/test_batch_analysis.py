@@ -0,0 +1,141 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.main import app
+from app.api.v1.endpoints import analyze
+from app.db.database import SessionLocal
+from app.db.models import Patient, Scan, Segmentation
+
+URL = "/api/v1/analyze/batch"
+
+
+def _png(path, seed):
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)).save(path)
+
+
+@pytest.fixture
+def client(workdir):
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def scans(workdir):
+    """Scan IDs by role: two readable images, an unreadable one and an MRI scan"""
+    uploads = workdir / "data" / "uploads"
+    _png(uploads / "tile_a.png", 0)
+    _png(uploads / "tile_b.png", 1)
+    (uploads / "corrupt.png").write_bytes(b"not an image")
+    (uploads / "brain.nii.gz").write_bytes(b"")
+
+    db = SessionLocal()
+    patient = Patient(patient_id=f"BATCH-{workdir.name}", first_name="Ada", last_name="Test",
+                      date_of_birth=datetime(1970, 1, 1), gender="F")
+    ids = {}
+    for role, filename, modality in [
+        ("a", "tile_a.png", "HISTOPATH"), ("b", "tile_b.png", "histopath"),
+        ("corrupt", "corrupt.png", "HISTOPATH"), ("mri", "brain.nii.gz", "MRI"),
+    ]:
+        scan = Scan(patient=patient, scan_date=datetime(2024, 1, 1), scan_type="Standard",
+                    file_path=str(uploads / filename), modality=modality, body_part="Breast")
+        db.add(scan)
+        db.flush()
+        ids[role] = scan.id
+    db.commit()
+    db.close()
+    return ids
+
+
+@pytest.fixture
+def commits():
+    count = []
+
+    def on_commit(session):
+        count.append(session)
+
+    event.listen(Session, "after_commit", on_commit)
+    yield count
+    event.remove(Session, "after_commit", on_commit)
+
+
+def _stream(client, body):
+    with client.stream("POST", URL, json=body) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        return [json.loads(line) for line in response.iter_lines() if line]
+
+
+def test_batch_streams_results_errors_and_a_summary(client, scans, commits):
+    lines = _stream(client, {
+        "scan_ids": [scans["a"], scans["b"], scans["a"], scans["mri"], "no-such-scan", scans["corrupt"]],
+        "filenames": ["tile_a.png", "../tile_a.png", "missing.png"],
+    })
+    summary = lines.pop()
+    by_index = {line["index"]: line for line in lines}
+    assert sorted(by_index) == list(range(9))
+
+    for index in (0, 1, 6):
+        assert by_index[index]["type"] == "result"
+        assert by_index[index]["model_name"] == "BreastCancerCNN"
+        assert "error" not in by_index[index]["analysis_details"]
+    assert by_index[2]["error"] == f"Duplicate scan ID {scans['a']}"
+    assert "HISTOPATH scans only" in by_index[3]["error"]
+    assert by_index[4]["error"] == "Scan with ID no-such-scan not found"
+    assert by_index[5]["error"].startswith("Failed to preprocess image")
+    assert by_index[7]["error"] == "Invalid filename: ../tile_a.png"
+    assert "not found in uploads directory" in by_index[8]["error"]
+    assert all(by_index[i]["status"] == "failed" for i in (2, 3, 4, 5, 7, 8))
+
+    assert summary["type"] == "summary"
+    assert (summary["total"], summary["completed"], summary["failed"]) == (9, 3, 6)
+    # Only scan-backed results are stored, in one commit
+    assert summary["segmentations_stored"] == 2
+    assert len(commits) == 1
+
+    db = SessionLocal()
+    stored = {s.scan_id: s.id for s in db.query(Segmentation).filter(Segmentation.scan_id.in_(scans.values()))}
+    db.close()
+    assert stored == {scans["a"]: by_index[0]["segmentation_id"], scans["b"]: by_index[1]["segmentation_id"]}
+
+    # Analyzed scans are refused on the next batch
+    again = _stream(client, {"scan_ids": [scans["a"]]})
+    assert again[0]["error"] == f"Analysis already exists for scan {scans['a']}"
+    assert again[-1]["completed"] == 0
+
+
+def test_batch_reports_a_failed_commit(client, scans, monkeypatch):
+    class FailingSession:
+        def __init__(self):
+            self.session = SessionLocal()
+
+        def add_all(self, rows):
+            self.session.add_all(rows)
+
+        def commit(self):
+            raise RuntimeError("database is locked")
+
+        def rollback(self):
+            self.session.rollback()
+
+        def close(self):
+            self.session.close()
+
+    monkeypatch.setattr(analyze, "SessionLocal", FailingSession)
+    lines = _stream(client, {"scan_ids": [scans["a"]]})
+    assert lines[0]["type"] == "result"
+    assert lines[-1]["segmentations_stored"] == 0
+    assert lines[-1]["error"] == "Failed to store segmentations: database is locked"
+
+
+def test_batch_validates_the_request(client):
+    assert client.post(URL, json={}).status_code == 400
+    too_many = {"filenames": ["x.png"] * (analyze.ANALYZE_BATCH_MAX_ITEMS + 1)}
+    assert client.post(URL, json=too_many).status_code == 400
@@ -0,0 +1,12 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def test_stream_events_validates_subscriptions():
+    with TestClient(app) as client:
+        assert client.get("/api/v1/events/").status_code == 400
+
+        missing = client.get("/api/v1/events/", params={"patient_id": "NO-SUCH-PATIENT"})
+        assert missing.status_code == 404
+        assert "NO-SUCH-PATIENT" in missing.json()["detail"]
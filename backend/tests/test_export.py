@@ -0,0 +1,93 @@
+import io
+import json
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.v1.endpoints import export
+from app.db.database import SessionLocal
+from app.db.models import Patient, Scan, Segmentation
+
+URL = "/api/v1/export/segmentations"
+# Unique to this module, so rows written by other tests are filtered out
+BODY_PART = "ExportTest"
+# Contains the row separator the NDJSON encoder splits on
+TRICKY_DIAGNOSIS = 'left breast },{"segmentation_id": "x"}\n'
+SCANS = [
+    ("MRI", datetime(2024, 1, 1)),
+    ("CT", datetime(2024, 2, 1)),
+    ("MRI", datetime(2024, 3, 1)),
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        db = SessionLocal()
+        patient = Patient(
+            patient_id="EXPORT-001", first_name="Ada", last_name="Test",
+            date_of_birth=datetime(1970, 1, 1), gender="F", diagnosis=TRICKY_DIAGNOSIS,
+        )
+        db.add(patient)
+        for i, (modality, scan_date) in enumerate(SCANS):
+            scan = Scan(
+                patient=patient, scan_date=scan_date, scan_type="T1", file_path=f"data/uploads/{i}",
+                file_size=1000 + i, modality=modality, body_part=BODY_PART,
+            )
+            db.add(Segmentation(
+                scan=scan, mask_path=f"data/masks/{i}.nii.gz", mask_status="ready", tumor_volume_cc=float(i + 1),
+                tumor_volume_mm3=1000.0 * (i + 1), confidence_score=0.9, processing_time_seconds=0.5,
+            ))
+        db.commit()
+        db.close()
+        yield client
+
+
+def _ndjson(client, **params):
+    response = client.get(URL, params={"body_part": BODY_PART, **params})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_ndjson_rows_in_scan_date_order(client, monkeypatch):
+    # Rows span several batches
+    monkeypatch.setattr(export, "EXPORT_BATCH_ROWS", 2)
+    rows = _ndjson(client)
+    assert [row["tumor_volume_cc"] for row in rows] == [1.0, 2.0, 3.0]
+    assert all(row["diagnosis"] == TRICKY_DIAGNOSIS for row in rows)
+    assert rows[0]["patient_id"] == "EXPORT-001"
+    assert "first_name" not in rows[0]
+    assert rows[0]["scan_date"] == "2024-01-01T00:00:00"
+
+
+def test_modality_filter_is_case_insensitive(client):
+    rows = _ndjson(client, modality=["mri"])
+    assert [row["modality"] for row in rows] == ["MRI", "MRI"]
+    assert len(_ndjson(client, modality=["ct", "Mri"])) == 3
+
+
+def test_date_range_excludes_end_date(client):
+    rows = _ndjson(client, start_date="2024-01-01T00:00:00", end_date="2024-03-01T00:00:00")
+    assert [row["scan_date"] for row in rows] == ["2024-01-01T00:00:00", "2024-02-01T00:00:00"]
+
+
+def test_arrow_stream(client):
+    response = client.get(URL, params={"format": "arrow", "body_part": BODY_PART})
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 3
+    assert table.schema.field("scan_date").type == pa.timestamp("us")
+    assert table.column("tumor_volume_mm3").to_pylist() == [1000.0, 2000.0, 3000.0]
+
+
+def test_parquet(client):
+    response = client.get(URL, params={"format": "parquet", "body_part": BODY_PART, "modality": "ct"})
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column("modality").to_pylist() == ["CT"]
+    assert table.column("file_size").to_pylist() == [1001]
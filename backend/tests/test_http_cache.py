@@ -0,0 +1,38 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+PATIENT = {
+    "patient_id": "ETAG-001",
+    "first_name": "Ada",
+    "last_name": "Test",
+    "date_of_birth": "1970-01-01T00:00:00",
+    "gender": "F",
+    "diagnosis": "synthetic",
+}
+
+
+def test_conditional_get_returns_304_until_the_patient_changes():
+    with TestClient(app) as client:
+        assert client.post("/api/v1/patients/", json=PATIENT).status_code == 201
+        url = f"/api/v1/patients/{PATIENT['patient_id']}"
+
+        first = client.get(url)
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert first.json()["patient_id"] == PATIENT["patient_id"]
+
+        cached = client.get(url, headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["etag"] == etag
+
+        assert client.put(url, json={**PATIENT, "diagnosis": "updated"}).status_code == 200
+        changed = client.get(url, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert changed.json()["diagnosis"] == "updated"
+
+        trend = f"/api/v1/monitor/patient/{PATIENT['patient_id']}/trend"
+        trend_etag = client.get(trend).headers["etag"]
+        assert client.get(trend, headers={"If-None-Match": trend_etag}).status_code == 304
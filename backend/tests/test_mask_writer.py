@@ -0,0 +1,161 @@
+import gzip
+import os
+import threading
+from datetime import datetime
+
+import nibabel as nib
+import numpy as np
+import pytest
+
+from app.db.database import SessionLocal, engine
+from app.db.models import Base, Patient, Scan, Segmentation
+from app.services import mask_writer as mask_writer_module
+from app.services.mask_writer import MaskWriter, MASK_FAILED, MASK_PENDING, MASK_READY
+
+
+def _image():
+    rng = np.random.default_rng(0)
+    return nib.Nifti1Image((rng.random((16, 16, 8)) > 0.7).astype(np.uint8), np.eye(4))
+
+
+class _Unwritable:
+    def to_bytes(self):
+        raise OSError("disk full")
+
+
+@pytest.fixture
+def writer(workdir):
+    writer = MaskWriter(codec="zlib", queue_size=1, submit_timeout=0.1)
+    yield writer
+    writer.shutdown()
+
+
+@pytest.fixture
+def gate(writer, monkeypatch):
+    """Holds the writer thread inside _write until set"""
+    gate = threading.Event()
+    write = writer._write
+
+    def gated(image, mask_path):
+        if threading.current_thread().name == "mask-writer":
+            gate.wait(10)
+        write(image, mask_path)
+
+    monkeypatch.setattr(writer, "_write", gated)
+    yield gate
+    gate.set()
+
+
+@pytest.fixture
+def segmentation_row():
+    Base.metadata.create_all(bind=engine)
+
+    def create(mask_path, mask_status=MASK_PENDING):
+        db = SessionLocal()
+        patient = Patient(
+            patient_id=f"MASK-{os.path.basename(mask_path)}", first_name="Ada", last_name="Test",
+            date_of_birth=datetime(1970, 1, 1), gender="F",
+        )
+        scan = Scan(patient=patient, scan_date=datetime(2024, 1, 1), scan_type="T1",
+                    file_path="data/uploads/x.nii.gz", modality="MRI", body_part="Brain")
+        segmentation = Segmentation(scan=scan, mask_path=mask_path, mask_status=mask_status)
+        db.add(segmentation)
+        db.commit()
+        return db, segmentation
+
+    return create
+
+
+def _stored_status(segmentation_id):
+    db = SessionLocal()
+    try:
+        return db.get(Segmentation, segmentation_id).mask_status
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib", "parallel"])
+def test_codecs_round_trip(codec, workdir, monkeypatch):
+    # Several gzip members for the parallel codec
+    monkeypatch.setattr(mask_writer_module, "MASK_GZIP_CHUNK_BYTES", 1024)
+    writer = MaskWriter(codec=codec)
+    image = _image()
+    mask_path = writer.mask_path("mask")
+    assert mask_path.endswith(".nii" if codec == "none" else ".nii.gz")
+
+    writer.submit(image, mask_path)
+    writer.flush()
+    writer.shutdown()
+
+    assert writer.status(mask_path) == MASK_READY
+    assert not os.path.exists(f"{mask_path}.tmp")
+    with open(mask_path, "rb") as f:
+        header = f.read(2)
+    assert (header == b"\x1f\x8b") == (codec != "none")
+    np.testing.assert_array_equal(np.asanyarray(nib.load(mask_path).dataobj), image.get_fdata())
+    if codec == "parallel":
+        assert gzip.decompress(open(mask_path, "rb").read()) == image.to_bytes()
+
+
+def test_pending_then_ready(writer, gate):
+    mask_path = writer.mask_path("mask")
+    writer.submit(_image(), mask_path)
+    assert writer.status(mask_path) == MASK_PENDING
+    assert not os.path.exists(mask_path)
+
+    gate.set()
+    writer.flush()
+    assert writer.status(mask_path) == MASK_READY
+    assert os.path.exists(mask_path)
+
+
+def test_failed_write(writer):
+    mask_path = writer.mask_path("mask")
+    writer.submit(_Unwritable(), mask_path)
+    writer.flush()
+    assert writer.status(mask_path) == MASK_FAILED
+    assert not os.path.exists(mask_path)
+
+
+def test_row_committed_before_the_write_is_flipped_by_the_writer(writer, gate, segmentation_row):
+    mask_path = writer.mask_path("mask")
+    writer.submit(_image(), mask_path)
+    db, segmentation = segmentation_row(mask_path)
+    writer.reconcile(db, segmentation)
+    assert segmentation.mask_status == MASK_PENDING
+
+    gate.set()
+    writer.flush()
+    assert _stored_status(segmentation.id) == MASK_READY
+    db.close()
+
+
+def test_row_committed_after_the_write_is_reconciled(writer, segmentation_row):
+    mask_path = writer.mask_path("mask")
+    writer.submit(_Unwritable(), mask_path)
+    # The writer finished before the row existed, so it had nothing to update
+    writer.flush()
+    db, segmentation = segmentation_row(mask_path)
+    assert _stored_status(segmentation.id) == MASK_PENDING
+
+    writer.reconcile(db, segmentation)
+    assert _stored_status(segmentation.id) == MASK_FAILED
+    db.close()
+
+
+def test_full_queue_writes_inline(writer, gate):
+    first, second, third = (writer.mask_path("mask") for _ in range(3))
+    writer.submit(_image(), first)
+    # Wait for the writer thread to take the first mask, leaving the queue empty
+    while writer.queue_depth():
+        threading.Event().wait(0.01)
+    writer.submit(_image(), second)
+
+    writer.submit(_image(), third)
+    assert writer.status(third) == MASK_READY
+    assert os.path.exists(third)
+    assert writer.status(first) == writer.status(second) == MASK_PENDING
+
+    gate.set()
+    writer.flush()
+    assert writer.status(first) == writer.status(second) == MASK_READY
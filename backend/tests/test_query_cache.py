@@ -0,0 +1,232 @@
+import socket
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.core import query_cache as query_cache_module
+from app.core.query_cache import (
+    CacheServer, MemoryBackend, PATIENTS_TAG, QueryCache, SocketBackend, patient_tag,
+)
+from app.db.database import SessionLocal, engine
+from app.db.models import Base, Patient, Scan
+
+ENTRY = ({"ETag": 'W/"1.0"'}, b'{"id":1}')
+
+
+def _load(tags=("patient:1",), content=None):
+    calls = []
+
+    def load():
+        calls.append(1)
+        return list(tags), {"ETag": 'W/"1.0"'}, content or {"id": 1}
+
+    return load, calls
+
+
+def test_memory_backend_drops_entries_loaded_during_a_write():
+    backend = MemoryBackend()
+    _, clock = backend.get("a")
+    # A write commits between reading the clock and storing the result
+    backend.invalidate(["patient:1"])
+    backend.set("a", ENTRY, ["patient:1"], 60, clock)
+    backend.set("b", ENTRY, ["patient:2"], 60, clock)
+    assert backend.get("a")[0] is None
+    assert backend.get("b")[0] == ENTRY
+
+
+def test_memory_backend_invalidates_tagged_entries():
+    backend = MemoryBackend()
+    clock = backend.get("a")[1]
+    backend.set("a", ENTRY, ["patient:1", PATIENTS_TAG], 60, clock)
+    backend.set("b", ENTRY, ["patient:2"], 60, clock)
+    backend.invalidate([PATIENTS_TAG])
+    assert backend.get("a")[0] is None
+    assert backend.get("b")[0] == ENTRY
+    assert backend.stats()["entries"] == 1
+
+
+def test_memory_backend_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache_module.time, "monotonic", lambda: now[0])
+    backend = MemoryBackend()
+    backend.set("a", ENTRY, [], 5, backend.get("a")[1])
+    now[0] += 4.9
+    assert backend.get("a")[0] == ENTRY
+    now[0] += 0.2
+    assert backend.get("a")[0] is None
+
+
+def test_memory_backend_lru_eviction():
+    backend = MemoryBackend(max_entries=2)
+    clock = backend.get("a")[1]
+    backend.set("a", ENTRY, [], 60, clock)
+    backend.set("b", ENTRY, [], 60, clock)
+    backend.get("a")
+    backend.set("c", ENTRY, [], 60, clock)
+    assert backend.get("b")[0] is None
+    assert backend.get("a")[0] == ENTRY and backend.get("c")[0] == ENTRY
+    assert backend.stats()["evictions"] == 1
+
+
+def test_memory_backend_refuses_sets_older_than_a_tag_clock_reset():
+    backend = MemoryBackend(max_entries=1)
+    clock = backend.get("a")[1]
+    # More tags than the clock table keeps, so every tag clock is forgotten
+    backend.invalidate([f"patient:{i}" for i in range(5)])
+    backend.set("a", ENTRY, ["patient:0"], 60, clock)
+    assert backend.get("a")[0] is None
+    backend.set("a", ENTRY, ["patient:0"], 60, backend.get("a")[1])
+    assert backend.get("a")[0] == ENTRY
+
+
+def test_get_or_load_reads_through():
+    cache = QueryCache(MemoryBackend())
+    load, calls = _load()
+    assert cache.get_or_load("a", load) == ENTRY
+    assert cache.get_or_load("a", load) == ENTRY
+    assert len(calls) == 1
+    cache.invalidate(["patient:1"])
+    cache.get_or_load("a", load)
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_get_or_load_without_backend():
+    load, calls = _load()
+    cache = QueryCache(None)
+    cache.get_or_load("a", load)
+    cache.get_or_load("a", load)
+    assert len(calls) == 2
+    assert cache.stats()["backend"] == "off"
+
+
+class _BrokenBackend(MemoryBackend):
+    name = "broken"
+
+    def __init__(self, broken_op):
+        super().__init__()
+        self.broken_op = broken_op
+
+    def get(self, key):
+        if self.broken_op == "get":
+            raise OSError("backend down")
+        return super().get(key)
+
+    def set(self, key, entry, tags, ttl, clock):
+        if self.broken_op == "set":
+            raise OSError("backend down")
+        super().set(key, entry, tags, ttl, clock)
+
+
+@pytest.mark.parametrize("broken_op", ["get", "set"])
+def test_get_or_load_falls_back_to_load_on_backend_errors(broken_op):
+    cache = QueryCache(_BrokenBackend(broken_op))
+    load, calls = _load()
+    assert cache.get_or_load("a", load) == ENTRY
+    assert cache.get_or_load("a", load) == ENTRY
+    assert len(calls) == 2
+    assert cache.stats()["errors"] == 2
+
+
+@pytest.fixture
+def server(workdir):
+    # Relative to the working directory, which keeps the path within the unix socket limit
+    servers = []
+
+    def start():
+        server = CacheServer("cache.sock")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_socket_round_trip(server):
+    server()
+    backend = SocketBackend("cache.sock")
+    entry, clock = backend.get("a")
+    assert entry is None
+    body = bytes(range(256)) * 1000
+    backend.set("a", ({"ETag": 'W/"1.0"'}, body), ["patient:1"], 60, clock)
+    assert backend.get("a")[0] == ({"ETag": 'W/"1.0"'}, body)
+
+    # A second client shares the server's entries
+    assert SocketBackend("cache.sock").get("a")[0] is not None
+    backend.invalidate(["patient:1"])
+    assert backend.get("a")[0] is None
+    assert backend.stats()["max_entries"] > 0
+
+
+def test_socket_backend_retries_once_on_a_broken_connection(server):
+    first = server()
+    backend = SocketBackend("cache.sock")
+    backend.set("a", ENTRY, [], 60, backend.get("a")[1])
+
+    # Restart: the old connection is gone and a fresh server owns the path
+    broken = backend._local.sock
+    broken.shutdown(socket.SHUT_RDWR)
+    first.shutdown()
+    first.server_close()
+    server()
+    assert backend.get("a")[0] is None
+    assert backend._local.sock is not broken
+
+
+def test_query_cache_survives_a_missing_server(workdir):
+    cache = QueryCache(SocketBackend("missing.sock"))
+    load, calls = _load()
+    assert cache.get_or_load("a", load) == ENTRY
+    cache.invalidate(["patient:1"])
+    assert len(calls) == 1
+    assert cache.stats()["errors"] == 2
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    """Tags invalidated by committed writes"""
+    Base.metadata.create_all(bind=engine)
+    tags = []
+
+    class Recorder(QueryCache):
+        def invalidate(self, batch):
+            tags.append(set(batch))
+
+    monkeypatch.setattr(query_cache_module, "query_cache", Recorder(None))
+    return tags
+
+
+def test_patient_writes_invalidate_the_patient_list(invalidated):
+    db = SessionLocal()
+    patient = Patient(patient_id="QC-001", first_name="Ada", last_name="Test",
+                      date_of_birth=datetime(1970, 1, 1), gender="F")
+    db.add(patient)
+    db.commit()
+    assert invalidated == [{PATIENTS_TAG}]
+    row_id = patient.id
+
+    invalidated.clear()
+    patient.diagnosis = "updated"
+    db.commit()
+    assert set().union(*invalidated) == {PATIENTS_TAG, patient_tag(row_id)}
+
+    invalidated.clear()
+    db.add(Scan(patient_id=row_id, scan_date=datetime(2024, 1, 1), scan_type="T1",
+                file_path="x.nii.gz", modality="MRI", body_part="Brain"))
+    db.commit()
+    assert invalidated == [{patient_tag(row_id)}]
+
+    invalidated.clear()
+    patient.diagnosis = "rolled back"
+    db.flush()
+    db.rollback()
+    assert invalidated == []
+
+    db.delete(db.get(Patient, row_id))
+    db.commit()
+    assert PATIENTS_TAG in set().union(*invalidated) and patient_tag(row_id) in set().union(*invalidated)
+    db.close()
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import tifffile
+
+from app.services.slide_tiler import SlideReader
+
+
+def _slide():
+    """Tissue-coloured RGB slide whose tiles are all distinct"""
+    rng = np.random.default_rng(0)
+    pixels = np.empty((200, 300, 3), dtype=np.uint8)
+    pixels[..., 0] = rng.integers(150, 200, pixels.shape[:2])
+    pixels[..., 1] = rng.integers(60, 110, pixels.shape[:2])
+    pixels[..., 2] = rng.integers(120, 170, pixels.shape[:2])
+    return pixels
+
+
+def _tiles(path):
+    with SlideReader(str(path), tile_size=64, tissue_threshold=0.0) as reader:
+        return {(tile.row, tile.col): tile.pixels for tile in reader.tiles()}
+
+
+@pytest.fixture
+def no_full_decode(monkeypatch):
+    def asarray(self, *args, **kwargs):
+        raise AssertionError("slide decoded whole")
+    monkeypatch.setattr(tifffile.TiffPage, "asarray", asarray)
+
+
+@pytest.mark.parametrize("tile", [(64, 64), None])
+@pytest.mark.parametrize("planarconfig", ["contig", "separate"])
+def test_tiff_tiles_cover_the_slide(tile, planarconfig, tmp_path, no_full_decode):
+    pixels = _slide()
+    path = tmp_path / "slide.tif"
+    data = np.moveaxis(pixels, -1, 0) if planarconfig == "separate" else pixels
+    tifffile.imwrite(path, data, photometric="rgb", planarconfig=planarconfig, tile=tile, rowsperstrip=48)
+
+    tiles = _tiles(path)
+    assert sorted(tiles) == [(row, col) for row in range(4) for col in range(5)]
+    for (row, col), block in tiles.items():
+        np.testing.assert_array_equal(block, pixels[row * 64:(row + 1) * 64, col * 64:(col + 1) * 64])
+
+
+def test_planar_pyramid_skips_tiles_without_tissue(tmp_path, monkeypatch):
+    pixels = _slide()
+    # Glass background on the right half of the slide
+    pixels[:, 128:] = 240
+    path = tmp_path / "pyramid.tif"
+    planar = np.moveaxis(pixels, -1, 0)
+    with tifffile.TiffWriter(path) as tif:
+        tif.write(planar, photometric="rgb", planarconfig="separate", tile=(64, 64), subifds=1)
+        tif.write(planar[:, ::4, ::4], photometric="rgb", planarconfig="separate", subfiletype=1)
+
+    reads = []
+    read_segment = SlideReader._read_segment
+    monkeypatch.setattr(SlideReader, "_read_segment", lambda self, index: reads.append(index) or read_segment(self, index))
+    with SlideReader(str(path), tile_size=64, tissue_threshold=0.5) as reader:
+        columns = {tile.col for tile in reader.tiles()}
+    assert columns == {0, 1}
+    # Glass tiles are never decoded: 4 rows x 2 columns x 3 planes
+    assert len(reads) == 24
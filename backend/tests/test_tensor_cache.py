@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from app.services.histo_classifier import HistoClassifier
+from app.services.tensor_cache import TensorCache
+
+
+@pytest.fixture
+def classifier():
+    torch.manual_seed(0)
+    return HistoClassifier()
+
+
+@pytest.fixture
+def images(workdir):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i, size in enumerate([(300, 260), (224, 224), (97, 131)]):
+        path = workdir / f"tile{i}.png"
+        Image.fromarray(rng.integers(0, 256, size + (3,), dtype=np.uint8)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def _logits(classifier, paths):
+    with torch.no_grad():
+        return classifier.model(classifier.preprocess_batch(paths))
+
+
+def test_cached_logits_match_uncached(classifier, images, workdir):
+    classifier.tensor_cache = None
+    uncached = _logits(classifier, images)
+
+    classifier.tensor_cache = TensorCache(str(workdir / "cache"), classifier.image_size, classifier.mean, classifier.std)
+    cold = _logits(classifier, images)
+    warm = _logits(classifier, images)
+    assert classifier.tensor_cache.stats()["hits"] == len(images)
+
+    torch.testing.assert_close(cold, uncached)
+    torch.testing.assert_close(warm, uncached)
+    for path in images:
+        expected = classifier.transform(Image.open(path).convert("RGB"))
+        torch.testing.assert_close(torch.from_numpy(classifier.tensor_cache.get_normalized(path)), expected)
+
+
+def test_unreadable_entry_is_a_miss(images, workdir):
+    cache = TensorCache(str(workdir / "cache"))
+    expected = cache.get_normalized(images[0])
+    with open(cache._entry_path(images[0]), "r+b") as f:
+        f.truncate(0)
+
+    np.testing.assert_array_equal(cache.get_normalized(images[0]), expected)
+    assert cache.stats()["misses"] == 2
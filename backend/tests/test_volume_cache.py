@@ -0,0 +1,36 @@
+import os
+
+import nibabel as nib
+import numpy as np
+
+from app.services import volume_cache as volume_cache_module
+from app.services.volume_cache import VolumeCache
+
+
+def _write(path, value):
+    nib.save(nib.Nifti1Image(np.full((8, 8, 4), value, dtype=np.float32), np.eye(4)), str(path))
+
+
+def test_digest_mode_hashes_each_file_version_once(tmp_path, monkeypatch):
+    hashed = []
+    file_digest = volume_cache_module._file_digest
+    monkeypatch.setattr(volume_cache_module, "_file_digest", lambda path: hashed.append(path) or file_digest(path))
+    path = tmp_path / "scan.nii"
+    _write(path, 1.0)
+    cache = VolumeCache(key_mode="digest")
+
+    first = cache.load(str(path))
+    assert cache.load(str(path)) is first
+    assert len(hashed) == 1
+
+    # Same bytes rewritten: rehashed once, still served from the cache
+    _write(path, 1.0)
+    assert cache.load(str(path)) is first
+    assert len(hashed) == 2
+
+    # New contents with the old timestamps restored are still picked up
+    stat = os.stat(path)
+    _write(path, 2.0)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.load(str(path)).data[0, 0, 0] == 2.0
+    assert cache.stats()["hits"] == 2
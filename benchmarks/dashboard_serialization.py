@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the patient dashboard response path.
+Seeds one patient with many scans and compares, stage by stage, the
+Pydantic path (model building, response-model validation, stdlib json)
+with the fast path (row dicts, orjson), plus gzip/brotli compression.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+
+# Scratch database, set before the app's engine is created
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-'), 'dashboard.db')}"
+
+# Add backend to path
+sys.path.append(os.path.join(BENCHMARKS, "..", "backend"))
+
+import json
+from sqlalchemy import desc
+from fastapi.encoders import jsonable_encoder
+
+from app.db.database import SessionLocal, engine
+from app.db.models import Base, Patient as PatientModel, Scan as ScanModel, Segmentation as SegmentationModel, MonitoringAlert as AlertModel
+from app.core.schemas import PatientDashboard, Patient as PatientSchema, Scan as ScanSchema, Segmentation as SegmentationSchema, MonitoringAlert
+from app.core.responses import dumps, row_dict, row_dicts, orjson
+from app.core.compression import compress, brotli
+from app.api.v1.endpoints.monitor import calculate_tumor_trend
+from suite import seed_database
+
+
+def median_ms(fn, iterations: int):
+    timings, result = [], None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def seed(scans: int, alerts: int):
+    db = SessionLocal()
+    seed_database(db, 1, scans, seed=0)
+    patient = db.query(PatientModel).first()
+    for i in range(alerts):
+        db.add(AlertModel(patient_id=patient.id, alert_type="rapid_growth", severity="high", message=f"Synthetic alert {i}"))
+    db.commit()
+    return db, patient
+
+
+def load(db, patient):
+    """The dashboard's queries"""
+    scans = db.query(ScanModel).filter(ScanModel.patient_id == patient.id).order_by(desc(ScanModel.scan_date)).all()
+    latest = db.query(SegmentationModel).filter(SegmentationModel.scan_id == scans[0].id).first() if scans else None
+    alerts = db.query(AlertModel).filter(AlertModel.patient_id == patient.id, AlertModel.is_resolved == False).all()
+    trend = calculate_tumor_trend(patient.id, db)
+    return scans, latest, alerts, trend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, nargs="+", default=[100, 1000, 5000], help="Scans per patient")
+    parser.add_argument("--alerts", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+
+    print("📦 Dashboard Serialization Benchmark")
+    print("=" * 72)
+    print(f"⚙️  Encoder: {'orjson' if orjson else 'stdlib json (orjson not installed)'}; "
+          f"brotli: {'yes' if brotli else 'not installed'}")
+
+    for count in args.scans:
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        db, patient = seed(count, args.alerts)
+        query_ms, (scans, latest, alerts, trend) = median_ms(lambda: load(db, patient), args.iterations)
+
+        # Current path: per-row models, response_model validation, jsonable_encoder, json.dumps
+        build_ms, dashboard = median_ms(lambda: PatientDashboard(
+            patient=patient,
+            scans=[ScanSchema.model_validate(scan) for scan in scans],
+            latest_segmentation=latest,
+            alerts=[MonitoringAlert.model_validate(alert) for alert in alerts],
+            tumor_trend=trend,
+        ), args.iterations)
+        validate_ms, validated = median_ms(lambda: PatientDashboard.model_validate(dashboard, from_attributes=True), args.iterations)
+        encode_ms, encoded = median_ms(lambda: jsonable_encoder(validated), args.iterations)
+        json_ms, slow_body = median_ms(
+            lambda: json.dumps(encoded, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), args.iterations
+        )
+
+        # Fast path: row dicts straight from the ORM, one encoder pass
+        rows_ms, content = median_ms(lambda: {
+            "patient": row_dict(patient, PatientSchema),
+            "scans": row_dicts(scans, ScanSchema),
+            "latest_segmentation": row_dict(latest, SegmentationSchema),
+            "alerts": row_dicts(alerts, MonitoringAlert),
+            "tumor_trend": trend,
+        }, args.iterations)
+        dumps_ms, fast_body = median_ms(lambda: dumps(content), args.iterations)
+
+        slow_total = build_ms + validate_ms + encode_ms + json_ms
+        fast_total = rows_ms + dumps_ms
+        print(f"\n📊 {count} scans, {args.alerts} alerts (ORM queries {query_ms:.2f} ms)")
+        print(f"{'stage':<40} {'ms':>10} {'KB':>10}")
+        print("-" * 72)
+        for label, ms in [
+            ("pydantic: build models", build_ms),
+            ("pydantic: response_model validation", validate_ms),
+            ("pydantic: jsonable_encoder", encode_ms),
+            ("pydantic: json.dumps", json_ms),
+        ]:
+            print(f"{label:<40} {ms:>10.2f}")
+        print(f"{'pydantic total':<40} {slow_total:>10.2f} {len(slow_body) / 1024:>10.1f}")
+        print(f"{'fast: row dicts':<40} {rows_ms:>10.2f}")
+        print(f"{'fast: encode':<40} {dumps_ms:>10.2f}")
+        print(f"{'fast total':<40} {fast_total:>10.2f} {len(fast_body) / 1024:>10.1f}")
+        for encoding in ["gzip"] + (["br"] if brotli else []):
+            ms, compressed = median_ms(lambda: compress(fast_body, encoding), args.iterations)
+            print(f"{'compress: ' + encoding:<40} {ms:>10.2f} {len(compressed) / 1024:>10.1f}")
+        print(f"⚡ Serialization speedup: {slow_total / fast_total:.1f}×")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the cohort export stream.
+Seeds a scratch database with synthetic segmentations and reports rows/s,
+output size and peak traced memory for each export format.
+"""
+
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Scratch database, set before the app's engine is created
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-'), 'export.db')}"
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from sqlalchemy import insert
+
+from app.db.database import engine
+from app.db.models import Base, Patient, Scan, Segmentation
+from app.api.v1.endpoints.export import ENCODERS, FORMATS, _batches, export_query
+
+
+def seed(rows: int, patients: int, seed: int) -> None:
+    """Bulk-insert patients, scans and one segmentation per scan"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    patient_rows = [{
+        "id": str(uuid.uuid4()), "patient_id": f"EXPORT-{i:06d}", "first_name": "Export", "last_name": f"Patient{i}",
+        "date_of_birth": datetime(1950, 1, 1) + timedelta(days=rng.randrange(20000)),
+        "gender": rng.choice(["F", "M"]), "diagnosis": "synthetic", "created_at": now, "updated_at": now,
+    } for i in range(patients)]
+    scan_rows, segmentation_rows = [], []
+    for i in range(rows):
+        scan_id = str(uuid.uuid4())
+        modality = rng.choice(["MRI", "CT", "XRAY", "HISTOPATH"])
+        scan_rows.append({
+            "id": scan_id, "patient_id": rng.choice(patient_rows)["id"], "scan_date": now - timedelta(days=rng.randrange(1000)),
+            "scan_type": "T1", "file_path": f"data/uploads/{scan_id}", "file_size": rng.randrange(10**6, 10**8),
+            "modality": modality, "body_part": rng.choice(["Brain", "Chest", "Breast"]), "created_at": now,
+        })
+        volume = rng.uniform(1, 80)
+        segmentation_rows.append({
+            "id": str(uuid.uuid4()), "scan_id": scan_id, "mask_path": f"data/masks/{scan_id}.nii.gz", "mask_status": "ready",
+            "tumor_volume_cc": volume, "tumor_volume_mm3": volume * 1000, "confidence_score": rng.uniform(0.7, 0.99),
+            "segmentation_method": "TumorTrace", "processing_time_seconds": rng.uniform(0.5, 10), "created_at": now,
+        })
+    with engine.begin() as conn:
+        conn.execute(insert(Patient), patient_rows)
+        conn.execute(insert(Scan), scan_rows)
+        conn.execute(insert(Segmentation), segmentation_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--patients", type=int, default=5_000)
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("📤 Cohort Export Benchmark")
+    print("=" * 60)
+    Base.metadata.create_all(bind=engine)
+    start = time.perf_counter()
+    seed(args.rows, args.patients, args.seed)
+    print(f"⚙️  Seeded {args.rows} segmentations in {time.perf_counter() - start:.1f} s")
+
+    query = export_query()
+
+    print(f"\n{'format':<10} {'rows/s':>12} {'MB':>9} {'peak MB':>9}")
+    print("-" * 60)
+    # Reading the rows without encoding them bounds every format
+    start = time.perf_counter()
+    for _ in _batches(query):
+        pass
+    print(f"{'(fetch)':<10} {args.rows / (time.perf_counter() - start):>12,.0f}")
+    for name in args.formats:
+        try:
+            start = time.perf_counter()
+            size = sum(len(chunk) for chunk in ENCODERS[name](_batches(query)))
+            elapsed = time.perf_counter() - start
+        except ImportError as e:
+            print(f"{name:<10} skipped ({e})")
+            continue
+        # Memory is measured in a second pass since tracing slows the encoders down
+        tracemalloc.start()
+        for _ in ENCODERS[name](_batches(query)):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:<10} {args.rows / elapsed:>12,.0f} {size / 1e6:>9.1f} {peak / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Report comparing INT8 histopathology classifiers against the float model.
+Measures top-1 agreement, probability drift and (when the evaluation
+directory has one sub-folder per class) accuracy deltas, plus latency and
+model size for dynamic and static quantization.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+import torch
+
+# Add backend and project root to path
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "backend"))
+sys.path.append(ROOT)
+
+from app.services.histo_classifier import HistoClassifier
+from app.services.quantization import quantize_dynamic, quantize_static, serialized_size
+from quantize_model import IMAGE_EXTENSIONS, calibration_batches
+
+
+def load_eval_set(classifier: HistoClassifier, directory: str, limit: int):
+    """Return (paths, labels) where labels come from class-named sub-folders, if any"""
+    paths, labels = [], []
+    class_dirs = [name for name in classifier.class_names if os.path.isdir(os.path.join(directory, name))]
+    if class_dirs:
+        for name in class_dirs:
+            folder = os.path.join(directory, name)
+            for file_name in sorted(os.listdir(folder)):
+                if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(folder, file_name))
+                    labels.append(classifier.class_names.index(name))
+    else:
+        paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    if limit:
+        paths, labels = paths[:limit], labels[:limit]
+    return paths, (labels or None)
+
+
+def evaluate(model, inputs: torch.Tensor, batch_size: int) -> torch.Tensor:
+    with torch.no_grad():
+        return torch.cat([
+            torch.softmax(model(inputs[i:i + batch_size]), dim=1) for i in range(0, len(inputs), batch_size)
+        ])
+
+
+def latency_ms(model, batch_size: int, iterations: int) -> float:
+    batch = torch.randn(batch_size, 3, 224, 224)
+    with torch.no_grad():
+        for _ in range(3):
+            model(batch)
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            model(batch)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("eval_dir", help="Evaluation images (optionally in one sub-folder per class)")
+    parser.add_argument("--weights", default="backend/models/breast_cancer_cnn.pt")
+    parser.add_argument("--calibration-dir", help="Calibration images for static mode (defaults to the evaluation images)")
+    parser.add_argument("--limit", type=int, default=512)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    classifier = HistoClassifier(model_path=args.weights, runtime="eager")
+    classifier.tensor_cache = None
+    float_model = classifier.model.cpu().eval()
+
+    paths, labels = load_eval_set(classifier, args.eval_dir, args.limit)
+    if not paths:
+        print(f"❌ No images found in {args.eval_dir}")
+        sys.exit(1)
+    inputs = classifier.preprocess_batch(paths).cpu()
+
+    if args.calibration_dir:
+        calibration = calibration_batches(classifier, args.calibration_dir, args.limit, 32)
+    else:
+        # Calibrate on the already preprocessed evaluation inputs
+        calibration = inputs.split(32)
+    models = {
+        "float32": float_model,
+        "dynamic": quantize_dynamic(float_model),
+        "static": quantize_static(float_model, calibration),
+    }
+
+    print("🗜️  Histopathology Quantization Report")
+    print("=" * 90)
+    print(f"📁 Evaluation images: {len(paths)} ({'labelled' if labels else 'unlabelled'})")
+
+    reference = evaluate(float_model, inputs, 32)
+    target = torch.tensor(labels) if labels else None
+    float_size = serialized_size(float_model)
+    report = {}
+    for name, model in models.items():
+        probabilities = reference if name == "float32" else evaluate(model, inputs, 32)
+        entry = {
+            "size_mb": serialized_size(model) / (1024 * 1024),
+            "size_ratio": serialized_size(model) / float_size,
+            "top1_agreement": float((probabilities.argmax(1) == reference.argmax(1)).float().mean()),
+            "max_prob_error": float((probabilities - reference).abs().max()),
+            "latency_ms": {str(b): latency_ms(model, b, args.iterations) for b in args.batch_sizes},
+        }
+        if target is not None:
+            entry["accuracy"] = float((probabilities.argmax(1) == target).float().mean())
+        report[name] = entry
+
+    header = f"{'model':<9} {'size MB':>8} {'ratio':>6} {'agree':>6} {'max err':>8}"
+    if target is not None:
+        header += f" {'acc':>6} {'Δacc':>7}"
+    header += "".join(f" {'bs' + str(b) + ' ms':>9}" for b in args.batch_sizes)
+    print(header)
+    print("-" * 90)
+    for name, entry in report.items():
+        line = f"{name:<9} {entry['size_mb']:>8.2f} {entry['size_ratio']:>6.2f} {entry['top1_agreement']:>6.3f} {entry['max_prob_error']:>8.4f}"
+        if target is not None:
+            line += f" {entry['accuracy']:>6.3f} {entry['accuracy'] - report['float32']['accuracy']:>+7.3f}"
+        line += "".join(f" {entry['latency_ms'][str(b)]:>9.2f}" for b in args.batch_sizes)
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
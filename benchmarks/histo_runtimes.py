@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the histopathology classifier runtimes.
+Exports BreastCancerCNN to TorchScript and ONNX in a temporary directory and
+compares latency and throughput against eager PyTorch (fp32 and, where the
+CPU supports it, bf16 channels-last) at several batch sizes.
+"""
+
+import os
+import sys
+import copy
+import time
+import argparse
+import tempfile
+import statistics
+
+import torch
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.services.histo_classifier import BreastCancerCNN
+from app.services.inference_backends import (
+    EagerBackend, TorchScriptBackend, OnnxBackend, export_torchscript, export_onnx, parity_error
+)
+from app.services.precision import PrecisionBackend, bf16_supported
+
+
+def time_backend(backend, batch_size: int, iterations: int, warmup: int) -> dict:
+    """Return latency percentiles (ms) and throughput (images/s) for one batch size"""
+    batch = torch.randn(batch_size, 3, 224, 224)
+    for _ in range(warmup):
+        backend(batch)
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        backend(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p90_ms": latencies[int(0.9 * (len(latencies) - 1))],
+        "images_per_second": batch_size * 1000 / statistics.mean(latencies),
+    }
+
+
+def build_backends(weights: str, workdir: str) -> dict:
+    model = BreastCancerCNN(num_classes=4)
+    if weights and os.path.exists(weights):
+        model.load_state_dict(torch.load(weights, map_location="cpu"))
+    model.eval()
+    folded = copy.deepcopy(model).fold_batchnorm()
+    example = torch.randn(1, 3, 224, 224)
+    device = torch.device("cpu")
+
+    backends = {"eager": EagerBackend(model)}
+
+    if bf16_supported(device):
+        backends["eager-bf16"] = PrecisionBackend(copy.deepcopy(model), device, "bf16", torch.channels_last)
+    else:
+        print("⚠️  Skipping bf16: CPU lacks native bfloat16 support")
+
+    ts_path = os.path.join(workdir, "model.ts")
+    export_torchscript(folded, ts_path, example)
+    backends["torchscript"] = TorchScriptBackend(ts_path, device)
+
+    onnx_path = os.path.join(workdir, "model.onnx")
+    try:
+        export_onnx(folded, onnx_path, example)
+        backends["onnx"] = OnnxBackend(onnx_path)
+    except ImportError as e:
+        print(f"⚠️  Skipping ONNX Runtime: {e}")
+
+    for name, backend in backends.items():
+        if name != "eager":
+            error = parity_error(backends["eager"], backend, (8, 3, 224, 224), device)
+            print(f"🔍 {name} parity vs eager: max error {error:.2e}")
+    return backends
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="backend/models/breast_cancer_cnn.pt")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print("⏱️  Histopathology Runtime Benchmark")
+    print("=" * 70)
+    print(f"🧵 Threads: {torch.get_num_threads()}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        backends = build_backends(args.weights, workdir)
+
+        print(f"\n{'runtime':<12} {'batch':>5} {'p50 ms':>10} {'p90 ms':>10} {'images/s':>10}")
+        print("-" * 70)
+        for batch_size in args.batch_sizes:
+            for name, backend in backends.items():
+                result = time_backend(backend, batch_size, args.iterations, args.warmup)
+                print(f"{name:<12} {batch_size:>5} {result['p50_ms']:>10.2f} {result['p90_ms']:>10.2f} {result['images_per_second']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark for histopathology test-time augmentation.
+Compares stacking N views into one forward pass against running the views
+one after another, for every view count from 1 to 8.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import torch
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.services.histo_classifier import HistoClassifier, TTA_VIEWS
+
+
+def median_ms(fn, iterations: int, warmup: int) -> float:
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="backend/models/breast_cancer_cnn.pt")
+    parser.add_argument("--runtime", default="eager")
+    parser.add_argument("--batch-size", type=int, default=1, help="Images per request")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    args = parser.parse_args()
+
+    classifier = HistoClassifier(model_path=args.weights, runtime=args.runtime)
+    batch = torch.randn(args.batch_size, 3, *classifier.image_size).to(classifier.device)
+
+    print("🔄 Histopathology TTA Benchmark")
+    print("=" * 60)
+    print(f"⚙️  Runtime: {classifier.runtime.name}, batch size {args.batch_size}")
+
+    print(f"\n{'views':>5} {'stacked ms':>11} {'sequential ms':>14} {'× single':>9}")
+    print("-" * 60)
+    single = None
+    for views in range(1, classifier.max_tta_views + 1):
+        stacked = median_ms(lambda: classifier.predict_proba(batch, views), args.iterations, args.warmup)
+        sequential = median_ms(
+            lambda: [classifier.predict_proba(view(batch)) for _, view in TTA_VIEWS[:views]],
+            args.iterations, args.warmup,
+        )
+        single = single or stacked
+        print(f"{views:>5} {stacked:>11.2f} {sequential:>14.2f} {stacked / single:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
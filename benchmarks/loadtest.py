@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+HTTP load test with a realistic traffic mix.
+Drives the FastAPI app in-process through httpx's ASGI transport (default)
+or a running server (--url) with async clients, replaying a weighted mix of
+patient lists, dashboards, uploads and per-modality analyses at increasing
+concurrency. Reports throughput, latency percentiles and error rates per
+endpoint, server CPU and RSS, and the concurrency at which each endpoint
+stops scaling.
+"""
+
+import os
+import sys
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.abspath(os.path.join(BENCHMARKS, "..", "backend"))
+
+DEFAULT_MIX = "patients=35,dashboard=35,upload=10,analyze_mri=5,analyze_ct=5,analyze_xray=5,analyze_histopath=5"
+MODALITIES = ["MRI", "CT", "XRAY", "HISTOPATH"]
+SAMPLE_EXTENSIONS = {
+    "MRI": (".nii.gz", ".nii"),
+    "CT": (".dcm", ".nii.gz", ".nii"),
+    "XRAY": (".png", ".jpg", ".jpeg", ".dcm"),
+    "HISTOPATH": (".jpg", ".jpeg", ".png", ".tif", ".tiff"),
+}
+# Words in a file name that mark its modality, e.g. sample_xray.jpg
+SAMPLE_HINTS = {"MRI": "mri", "CT": "ct", "XRAY": "xray", "HISTOPATH": "histo"}
+# A throughput gain below this between concurrency levels counts as saturated
+SATURATION_GAIN = 0.10
+
+
+class ProcessSampler:
+    """CPU and RSS of a process from /proc (Linux), sampled in the background"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.samples: List[Tuple[float, float, float]] = []
+
+    def _read(self) -> Tuple[float, float]:
+        """(user + system CPU seconds, RSS in MB)"""
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self.ticks
+        with open(f"/proc/{self.pid}/statm") as f:
+            rss_mb = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        return cpu_seconds, rss_mb
+
+    async def run(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            try:
+                cpu, rss = self._read()
+            except OSError:
+                return
+            self.samples.append((time.perf_counter(), cpu, rss))
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        if len(self.samples) < 2:
+            return {"cpu_percent": None, "rss_mb_peak": None}
+        (t0, cpu0, _), (t1, cpu1, _) = self.samples[0], self.samples[-1]
+        return {
+            # 100% is one core
+            "cpu_percent": 100.0 * (cpu1 - cpu0) / (t1 - t0) if t1 > t0 else None,
+            "rss_mb_peak": max(rss for _, _, rss in self.samples),
+        }
+
+
+class Recorder:
+    """Latencies and errors per endpoint for one concurrency level"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, endpoint: str, seconds: float, ok: bool) -> None:
+        self.latencies.setdefault(endpoint, []).append(seconds * 1000)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, duration: float) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values.sort()
+            report[endpoint] = {
+                "requests": len(values),
+                "rps": len(values) / duration,
+                "p50_ms": percentile(values, 50),
+                "p90_ms": percentile(values, 90),
+                "p99_ms": percentile(values, 99),
+                "max_ms": values[-1],
+                "error_rate": self.errors.get(endpoint, 0) / len(values),
+            }
+        return report
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation in mix: {name}. Supported: {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def decodes(path: str) -> bool:
+    """Whether a sample file is a readable image or volume, not a placeholder"""
+    name = path.lower()
+    try:
+        if name.endswith((".nii.gz", ".nii")):
+            import nibabel as nib
+            nib.load(path).get_fdata()
+        elif name.endswith(".dcm"):
+            import pydicom
+            pydicom.dcmread(path).pixel_array
+        elif name.endswith((".tif", ".tiff")):
+            import tifffile
+            with tifffile.TiffFile(path) as tif:
+                tif.pages[0].shape
+        else:
+            from PIL import Image
+            with Image.open(path) as image:
+                image.load()
+    except Exception:
+        return False
+    return True
+
+
+def find_samples(directory: str) -> Dict[str, str]:
+    """One file per modality from the samples directory.
+
+    Files whose name mentions a modality are matched first; the rest are
+    assigned by extension to modalities still missing a sample. Files that
+    fail to decode are skipped, so placeholders never stand in for a scan.
+    """
+    names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+    samples: Dict[str, str] = {}
+    readable: Dict[str, bool] = {}
+    for hinted in (True, False):
+        for name in names:
+            path = os.path.join(directory, name)
+            if path in samples.values():
+                continue
+            stem = os.path.basename(name).lower()
+            for modality, extensions in SAMPLE_EXTENSIONS.items():
+                if modality in samples or not stem.endswith(extensions):
+                    continue
+                if hinted and SAMPLE_HINTS[modality] not in re.split(r"[^a-z0-9]+", stem):
+                    continue
+                if path not in readable:
+                    readable[path] = decodes(path)
+                if not readable[path]:
+                    break
+                samples[modality] = path
+                break
+    return samples
+
+
+def analysis_succeeded(response: httpx.Response) -> bool:
+    """Analyzers report decode and inference failures in the body of a 200 response"""
+    try:
+        return not response.json().get("analysis_details", {}).get("error")
+    except ValueError:
+        return False
+
+
+class Traffic:
+    """Requests issued by the virtual users against one client"""
+
+    def __init__(self, client: httpx.AsyncClient, patients: List[str], samples: Dict[str, Tuple[str, bytes]], seed: int):
+        self.client = client
+        self.patients = patients
+        self.samples = samples
+        self.rng = random.Random(seed)
+
+    async def timed(self, recorder: Recorder, endpoint: str, method: str, url: str,
+                    succeeded: Callable[[httpx.Response], bool] = lambda response: True,
+                    **kwargs: Any) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            recorder.add(endpoint, time.perf_counter() - start, False)
+            return None
+        recorder.add(endpoint, time.perf_counter() - start, response.status_code < 400 and succeeded(response))
+        return response
+
+    async def patients_list(self, recorder: Recorder) -> None:
+        await self.timed(recorder, "GET /patients", "GET", "/api/v1/patients/", params={"limit": 100})
+
+    async def dashboard(self, recorder: Recorder) -> None:
+        patient = self.rng.choice(self.patients)
+        await self.timed(recorder, "GET /monitor/dashboard", "GET", f"/api/v1/monitor/patient/{patient}/dashboard")
+
+    async def upload(self, recorder: Recorder, modality: Optional[str] = None) -> Optional[str]:
+        modality = modality or self.rng.choice(list(self.samples))
+        filename, content = self.samples[modality]
+        response = await self.timed(
+            recorder, "POST /upload", "POST", "/api/v1/upload/",
+            files={"file": (filename, content)},
+            data={
+                "patient_id": self.rng.choice(self.patients),
+                "scan_date": datetime.utcnow().isoformat(),
+                "scan_type": "T1" if modality == "MRI" else "Standard",
+                "modality": modality,
+                "body_part": {"MRI": "Brain", "HISTOPATH": "Breast"}.get(modality, "Chest"),
+            },
+        )
+        return response.json()["scan_id"] if response is not None and response.status_code < 400 else None
+
+    async def analyze(self, recorder: Recorder, modality: str) -> None:
+        # Every analysis needs a scan that has not been analyzed yet
+        scan_id = await self.upload(recorder, modality)
+        if scan_id:
+            await self.timed(recorder, f"GET /analyze [{modality}]", "GET", "/api/v1/analyze/",
+                             succeeded=analysis_succeeded, params={"scan_id": scan_id})
+
+
+OPERATIONS = {
+    "patients": lambda traffic, recorder: traffic.patients_list(recorder),
+    "dashboard": lambda traffic, recorder: traffic.dashboard(recorder),
+    "upload": lambda traffic, recorder: traffic.upload(recorder),
+    **{
+        f"analyze_{modality.lower()}": (lambda modality: lambda traffic, recorder: traffic.analyze(recorder, modality))(modality)
+        for modality in MODALITIES
+    },
+}
+
+
+async def seed_patients(client: httpx.AsyncClient, count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    patients = []
+    for i in range(count):
+        patient_id = f"LOAD-{seed}-{i:05d}"
+        response = await client.post("/api/v1/patients/", json={
+            "patient_id": patient_id, "first_name": "Load", "last_name": f"Test{i}",
+            "date_of_birth": (datetime(1950, 1, 1) + timedelta(days=rng.randrange(20000))).isoformat(),
+            "gender": rng.choice(["F", "M"]), "diagnosis": "synthetic",
+        })
+        # 400 means the patient exists from an earlier run against the same database
+        if response.status_code not in (201, 400):
+            raise RuntimeError(f"Creating patient failed: {response.status_code} {response.text[:200]}")
+        patients.append(patient_id)
+    return patients
+
+
+async def run_level(traffic: Traffic, mix: Dict[str, float], concurrency: int, duration: float,
+                    sampler: Optional[ProcessSampler]) -> Dict[str, Any]:
+    recorder = Recorder()
+    names, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + duration
+
+    async def user() -> None:
+        while time.perf_counter() < deadline:
+            name = traffic.rng.choices(names, weights)[0]
+            await OPERATIONS[name](traffic, recorder)
+
+    stop = asyncio.Event()
+    sampling = asyncio.ensure_future(sampler.run(stop)) if sampler else None
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    if sampling:
+        await sampling
+
+    endpoints = recorder.report(elapsed)
+    total = sum(entry["requests"] for entry in endpoints.values())
+    errors = sum(entry["requests"] * entry["error_rate"] for entry in endpoints.values())
+    return {
+        "concurrency": concurrency,
+        "duration_s": elapsed,
+        "requests": total,
+        "rps": total / elapsed,
+        "error_rate": errors / total if total else 0.0,
+        "server": sampler.summary() if sampler else {},
+        "endpoints": endpoints,
+    }
+
+
+def saturation(levels: List[Dict[str, Any]]) -> Dict[str, Optional[int]]:
+    """Per endpoint, the first concurrency after which throughput grew by less than SATURATION_GAIN"""
+    result = {}
+    endpoints = {name for level in levels for name in level["endpoints"]}
+    for endpoint in sorted(endpoints):
+        result[endpoint] = None
+        previous = None
+        for level in levels:
+            rps = level["endpoints"].get(endpoint, {}).get("rps", 0.0)
+            if previous is not None and rps < previous[1] * (1 + SATURATION_GAIN):
+                result[endpoint] = previous[0]
+                break
+            previous = (level["concurrency"], rps)
+    return result
+
+
+def prepare_in_process(database_url: Optional[str]):
+    """Import the app in a scratch working directory and return (app, workdir)"""
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    # Uploads and masks stay in the scratch directory; model weights are shared
+    os.symlink(os.path.join(BACKEND, "models"), os.path.join(workdir, "models"))
+    os.environ["DATABASE_URL"] = database_url or f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    os.chdir(workdir)
+    sys.path.append(BACKEND)
+    from app.main import app
+    return app, workdir
+
+
+def load_samples(directory: str, workdir: str, seed: int) -> Dict[str, Tuple[str, bytes]]:
+    paths = find_samples(directory)
+    missing = [m for m in MODALITIES if m not in paths]
+    if missing:
+        # Fill gaps with small synthetic inputs
+        sys.path.append(BENCHMARKS)
+        from synthetic import generate
+        generated = generate(os.path.join(workdir, "samples"), "small", seed)
+        fallback = {"MRI": "mri_nifti", "CT": "ct_dicom", "XRAY": "xray_png", "HISTOPATH": "histo_jpeg"}
+        for modality in missing:
+            paths[modality] = generated[fallback[modality]]
+    samples = {}
+    for modality, path in paths.items():
+        with open(path, "rb") as f:
+            samples[modality] = (os.path.basename(path), f.read())
+    return samples
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    samples_dir = os.path.abspath(args.samples)
+
+    if args.url:
+        transport, base_url, workdir = None, args.url, tempfile.mkdtemp(prefix="loadtest-")
+        sampler_pid = args.server_pid
+    else:
+        # ASGITransport does not send lifespan events, so models load on first use
+        app, workdir = prepare_in_process(args.database_url)
+        transport, base_url = httpx.ASGITransport(app=app), "http://loadtest"
+        # The server is this process, so its CPU includes the client's own work
+        sampler_pid = os.getpid()
+
+    samples = load_samples(samples_dir, workdir, args.seed)
+    print(f"⚙️  Target: {args.url or 'in-process ASGI'}; samples: " + ", ".join(f"{m}={name}" for m, (name, _) in samples.items()))
+
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        patients = await seed_patients(client, args.patients, args.seed)
+        traffic = Traffic(client, patients, samples, args.seed)
+        levels = []
+        for concurrency in args.concurrency:
+            sampler = ProcessSampler(sampler_pid) if sampler_pid and os.path.exists(f"/proc/{sampler_pid}") else None
+            level = await run_level(traffic, mix, concurrency, args.duration, sampler)
+            levels.append(level)
+            print_level(level)
+
+    return {
+        "target": args.url or "in-process",
+        "mix": mix,
+        "patients": args.patients,
+        "levels": levels,
+        "saturation": saturation(levels),
+    }
+
+
+def print_level(level: Dict[str, Any]) -> None:
+    server = level["server"]
+    cpu = f"{server['cpu_percent']:.0f}%" if server.get("cpu_percent") is not None else "n/a"
+    rss = f"{server['rss_mb_peak']:.0f} MB" if server.get("rss_mb_peak") is not None else "n/a"
+    print(f"\n👥 Concurrency {level['concurrency']}: {level['rps']:.1f} req/s, "
+          f"{level['error_rate']:.1%} errors, server CPU {cpu}, RSS {rss}")
+    print(f"{'endpoint':<28} {'req':>6} {'req/s':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'err':>6}")
+    print("-" * 80)
+    for endpoint, entry in level["endpoints"].items():
+        print(f"{endpoint:<28} {entry['requests']:>6} {entry['rps']:>8.1f} {entry['p50_ms']:>9.1f} "
+              f"{entry['p90_ms']:>9.1f} {entry['p99_ms']:>9.1f} {entry['error_rate']:>6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server (default: drive the app in-process)")
+    parser.add_argument("--server-pid", type=int, help="PID of the server process to sample CPU/RSS from (with --url)")
+    parser.add_argument("--database-url", help="Database for the in-process app (default: scratch SQLite)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted operations (default: {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64], help="Concurrent virtual users per level")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level")
+    parser.add_argument("--patients", type=int, default=50, help="Patients created before the run")
+    parser.add_argument("--samples", default=os.path.join(BENCHMARKS, "..", "data", "uploads"),
+                        help="Directory with sample files to upload; synthetic files fill missing modalities")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    print("🔥 HTTP Load Test")
+    print("=" * 80)
+    report = asyncio.run(main_async(args))
+
+    print("\n📈 Saturation (concurrency after which throughput grew < "
+          f"{SATURATION_GAIN:.0%}; '-' = still scaling at {max(args.concurrency)})")
+    for endpoint, concurrency in report["saturation"].items():
+        print(f"   {endpoint:<28} {concurrency if concurrency is not None else '-'}")
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {json_path}")
+
+
+if __name__ == "__main__":
+    main()
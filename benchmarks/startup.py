@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the API process roles.
+Imports app.main in a fresh interpreter per APP_ROLE with -X importtime and
+reports total import time, wall time, peak RSS and the slowest imports.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+ROLES = ["api", "worker", "all"]
+
+PROBE = "import resource, app.main; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+
+def parse_importtime(stderr: str):
+    """Return (total_us, [(cumulative_us, module)]) for the top-level imports"""
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2]
+        # Nested imports are indented below their parent
+        if name.startswith(" ") and not name.startswith("  "):
+            top_level.append((int(fields[1]), name.strip()))
+    return sum(us for us, _ in top_level), sorted(top_level, reverse=True)
+
+
+def measure(role: str, database_url: str):
+    env = dict(os.environ, APP_ROLE=role, DATABASE_URL=database_url, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{role} startup failed:\n{result.stderr[-2000:]}")
+    total_us, imports = parse_importtime(result.stderr)
+    return {
+        "import_s": total_us / 1e6,
+        "wall_s": wall,
+        # ru_maxrss is reported in kilobytes on Linux
+        "rss_mb": int(result.stdout.strip().splitlines()[-1]) / 1024,
+        "top_imports": [{"module": name, "ms": us / 1000} for us, name in imports[:10]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--roles", nargs="+", choices=ROLES, default=ROLES)
+    parser.add_argument("--runs", type=int, default=3, help="Runs per role (best run is reported)")
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports to list per role")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    print("🚀 API Startup Benchmark")
+    print("=" * 60)
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        for role in args.roles:
+            runs = [measure(role, database_url) for _ in range(args.runs)]
+            report[role] = min(runs, key=lambda r: r["wall_s"])
+
+    print(f"{'role':<8} {'import s':>9} {'wall s':>8} {'RSS MB':>8}")
+    print("-" * 60)
+    for role, entry in report.items():
+        print(f"{role:<8} {entry['import_s']:>9.2f} {entry['wall_s']:>8.2f} {entry['rss_mb']:>8.1f}")
+    for role, entry in report.items():
+        print(f"\n🐢 Slowest imports ({role}):")
+        for item in entry["top_imports"][:args.top]:
+            print(f"   {item['ms']:>8.1f} ms  {item['module']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
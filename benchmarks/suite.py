@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark suite for the analysis services and monitoring queries.
+Generates seeded synthetic inputs, times every analyzer's analyze(), the
+MRI thresholding, mask write/read, and calculate_tumor_trend/check_for_alerts
+on a seeded database, then writes the results as JSON. With --baseline, cases
+whose median got slower than --threshold are flagged and the exit code is 1.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.join(BENCHMARKS, "..", "backend")
+GROUPS = ["analyzers", "threshold", "mask_io", "monitor"]
+
+# Add backend to path
+sys.path.append(BACKEND)
+
+from synthetic import SIZES, generate, mri_volume
+
+
+class Case:
+    """One timed operation; setup and teardown run outside the measurement"""
+
+    def __init__(self, name: str, fn: Callable[[], Any], setup: Optional[Callable[[], Any]] = None,
+                 teardown: Optional[Callable[[], Any]] = None, **params: Any):
+        self.name = name
+        self.fn = fn
+        self.setup = setup
+        self.teardown = teardown
+        self.params = params
+
+    def run(self, iterations: int, warmup: int) -> Dict[str, Any]:
+        timings = []
+        for i in range(warmup + iterations):
+            if self.setup:
+                self.setup()
+            start = time.perf_counter()
+            self.fn()
+            elapsed = (time.perf_counter() - start) * 1000
+            if self.teardown:
+                self.teardown()
+            if i >= warmup:
+                timings.append(elapsed)
+        timings.sort()
+        return {
+            "median_ms": statistics.median(timings),
+            "mean_ms": statistics.fmean(timings),
+            "min_ms": timings[0],
+            "p95_ms": timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+            "stdev_ms": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            "iterations": iterations,
+            "params": self.params,
+        }
+
+
+def analyzer_cases(inputs: Dict[str, Dict[str, str]], cold: bool) -> List[Case]:
+    from app.services import model_registry
+    from app.services.mask_writer import mask_writer
+    from app.services.volume_cache import volume_cache
+
+    # Volumes are decoded once per file and cached; clear it to time a first analysis
+    setup = volume_cache.clear if cold else None
+    cases = []
+    for size, paths in inputs.items():
+        analyses = [
+            ("mri.nifti", "MRI", paths["mri_nifti"], "T1"),
+            ("ct.nifti", "CT", paths["ct_nifti"], "Chest"),
+            ("ct.dicom", "CT", paths["ct_dicom"], "Chest"),
+            ("xray.png", "XRAY", paths["xray_png"], "Chest"),
+            ("xray.dicom", "XRAY", paths["xray_dicom"], "Chest"),
+            ("histo.jpeg", "HISTOPATH", paths["histo_jpeg"], "Breast"),
+        ]
+        for label, modality, path, body_part in analyses:
+            analyzer = model_registry.get(modality)
+            cases.append(Case(
+                f"analyzers.{label}.{size}",
+                lambda analyzer=analyzer, path=path, body_part=body_part: _checked(analyzer.analyze(path, body_part)),
+                setup=setup,
+                # Queued NIfTI masks are written in the background; drain them between runs
+                teardown=mask_writer.flush,
+                size=size, file_mb=round(os.path.getsize(path) / 1e6, 3),
+            ))
+    return cases
+
+
+def _checked(result: Dict[str, Any]) -> Dict[str, Any]:
+    # A fallback result would time the error path instead of the analysis
+    error = result.get("analysis_details", {}).get("error")
+    if error:
+        raise RuntimeError(f"{result.get('model_name')} fell back: {error}")
+    return result
+
+
+def threshold_cases(sizes: List[str], seed: int) -> List[Case]:
+    from app.services.mri_segmenter import MRISegmenter
+
+    segmenter = MRISegmenter()
+    cases = []
+    for size in sizes:
+        volume = mri_volume(SIZES[size]["volume"], seed)
+        cases.append(Case(
+            f"threshold.mri_percentile.{size}",
+            lambda volume=volume: segmenter._simulate_tumor_trace(volume, "T1"),
+            size=size, voxels=int(volume.size),
+        ))
+    return cases
+
+
+def mask_io_cases(sizes: List[str], seed: int, directory: str) -> List[Case]:
+    import nibabel as nib
+    import numpy as np
+    from app.services.mask_writer import mask_writer, CODEC_EXTENSIONS
+
+    cases = []
+    for size in sizes:
+        mask = (mri_volume(SIZES[size]["volume"], seed) > 500).astype(np.uint8)
+        image = nib.Nifti1Image(mask, np.eye(4))
+        path = os.path.join(directory, f"mask_{size}{CODEC_EXTENSIONS[mask_writer.codec]}")
+
+        def write(image=image, path=path):
+            mask_writer.submit(image, path)
+            mask_writer.flush()
+
+        cases.append(Case(f"mask_io.write.{size}", write, size=size, codec=mask_writer.codec))
+        write()
+        cases.append(Case(
+            f"mask_io.read.{size}",
+            lambda path=path: np.asarray(nib.load(path).dataobj),
+            size=size, file_mb=round(os.path.getsize(path) / 1e6, 3),
+        ))
+    return cases
+
+
+def seed_database(session, patients: int, scans_per_patient: int, seed: int) -> List[str]:
+    """Insert patients with dated scans and segmentations; returns the patient row ids"""
+    from app.db.models import Patient, Scan, Segmentation
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    patient_ids = []
+    for p in range(patients):
+        patient = Patient(
+            patient_id=f"BENCH-{p:06d}", first_name="Bench", last_name=f"Patient{p}",
+            date_of_birth=datetime(1950, 1, 1) + timedelta(days=rng.randrange(20000)),
+            gender=rng.choice(["F", "M"]), diagnosis="synthetic",
+        )
+        session.add(patient)
+        session.flush()
+        patient_ids.append(patient.id)
+        volume = rng.uniform(5.0, 60.0)
+        for s in range(scans_per_patient):
+            # Spread scans over the last year so the 90-day alert window sees a few
+            scan = Scan(
+                patient_id=patient.id,
+                scan_date=now - timedelta(days=365 * (scans_per_patient - s) / scans_per_patient),
+                scan_type=rng.choice(["T1", "T2", "FLAIR"]), file_path=f"data/uploads/bench_{p}_{s}.nii.gz",
+                file_size=rng.randrange(1_000_000, 50_000_000), modality="MRI", body_part="Brain",
+            )
+            volume *= rng.uniform(0.9, 1.25)
+            scan.segmentation = Segmentation(
+                mask_path=f"data/masks/bench_{p}_{s}.nii.gz", mask_status="ready",
+                tumor_volume_cc=volume, tumor_volume_mm3=volume * 1000,
+                confidence_score=rng.uniform(0.8, 0.95), processing_time_seconds=rng.uniform(1, 10),
+            )
+            session.add(scan)
+    session.commit()
+    return patient_ids
+
+
+def monitor_cases(patients: int, scans_per_patient: int, seed: int) -> List[Case]:
+    from app.db.database import SessionLocal
+    from app.api.v1.endpoints.monitor import calculate_tumor_trend, check_for_alerts
+
+    session = SessionLocal()
+    patient_ids = seed_database(session, patients, scans_per_patient, seed)
+    # Visit patients in a fixed shuffled order so runs are comparable
+    order = patient_ids[:]
+    random.Random(seed).shuffle(order)
+    cursor = {"i": 0}
+
+    def next_patient() -> str:
+        cursor["i"] = (cursor["i"] + 1) % len(order)
+        return order[cursor["i"]]
+
+    params = {"patients": patients, "scans_per_patient": scans_per_patient}
+    return [
+        Case("monitor.calculate_tumor_trend", lambda: calculate_tumor_trend(next_patient(), session), **params),
+        Case("monitor.check_for_alerts", lambda: check_for_alerts(next_patient(), session), **params),
+    ]
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Median ratio against the baseline for every case present in both runs"""
+    rows = []
+    for name, entry in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        ratio = entry["median_ms"] / previous["median_ms"] if previous["median_ms"] else float("inf")
+        rows.append({"case": name, "baseline_ms": previous["median_ms"], "current_ms": entry["median_ms"],
+                     "ratio": ratio, "regression": ratio > 1.0 + threshold})
+    return rows
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=GROUPS)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--patients", type=int, default=200, help="Patients in the seeded database")
+    parser.add_argument("--scans-per-patient", type=int, default=12)
+    parser.add_argument("--warm-cache", action="store_true", help="Keep decoded volumes cached between analyzer runs")
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS, "results", f"suite-{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown ratio flagged as a regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    # Analyzers write masks relative to the working directory and the mask
+    # writer updates rows through the app database; keep both in a scratch dir
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.chdir(workdir)
+
+    from app.db.database import engine
+    from app.db.models import Base
+    Base.metadata.create_all(bind=engine)
+
+    print("📏 Service Benchmark Suite")
+    print("=" * 72)
+    print(f"⚙️  Groups: {', '.join(args.groups)}; sizes: {', '.join(args.sizes)}; work dir: {workdir}")
+
+    cases: List[Case] = []
+    if "analyzers" in args.groups:
+        inputs = {size: generate(os.path.join(workdir, "inputs"), size, args.seed) for size in args.sizes}
+        cases += analyzer_cases(inputs, cold=not args.warm_cache)
+    if "threshold" in args.groups:
+        cases += threshold_cases(args.sizes, args.seed)
+    if "mask_io" in args.groups:
+        cases += mask_io_cases(args.sizes, args.seed, os.path.join(workdir, "masks"))
+    if "monitor" in args.groups:
+        cases += monitor_cases(args.patients, args.scans_per_patient, args.seed)
+
+    print(f"\n{'case':<40} {'median ms':>10} {'p95 ms':>10} {'min ms':>10}")
+    print("-" * 72)
+    results = {}
+    for case in cases:
+        try:
+            results[case.name] = case.run(args.iterations, args.warmup)
+        except Exception as e:
+            print(f"{case.name:<40} ❌ {e}")
+            continue
+        entry = results[case.name]
+        print(f"{case.name:<40} {entry['median_ms']:>10.2f} {entry['p95_ms']:>10.2f} {entry['min_ms']:>10.2f}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if baseline:
+        with open(baseline) as f:
+            rows = compare(results, json.load(f), args.threshold)
+        regressions = [row for row in rows if row["regression"]]
+        report["comparison"] = {"baseline": baseline, "threshold": args.threshold, "cases": rows}
+        print(f"\n{'case':<40} {'baseline':>10} {'current':>10} {'ratio':>8}")
+        print("-" * 72)
+        for row in rows:
+            flag = " ⚠️" if row["regression"] else ""
+            print(f"{row['case']:<40} {row['baseline_ms']:>10.2f} {row['current_ms']:>10.2f} {row['ratio']:>8.2f}{flag}")
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+    if regressions:
+        print(f"⚠️  {len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
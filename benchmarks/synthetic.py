@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Synthetic inputs for the benchmarks.
+Writes seeded NIfTI volumes, CT and X-ray DICOM files, chest radiograph PNGs
+and histopathology JPEGs at several sizes, so every run analyzes the same data.
+"""
+
+import os
+import argparse
+from typing import Dict, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Input sizes per preset: volumes are voxels, images are pixels per side
+SIZES: Dict[str, Dict[str, Tuple[int, ...]]] = {
+    "small": {"volume": (64, 64, 48), "xray": (512, 512), "histo": (256, 256)},
+    "medium": {"volume": (128, 128, 96), "xray": (1024, 1024), "histo": (512, 512)},
+    "large": {"volume": (256, 256, 160), "xray": (2048, 2048), "histo": (1024, 1024)},
+}
+
+
+def _lesions(shape: Tuple[int, ...], rng: np.random.Generator, count: int = 3) -> np.ndarray:
+    """Boolean mask of a few random ellipsoids, roughly 1-5% of the volume"""
+    grid = np.ogrid[tuple(slice(0, n) for n in shape)]
+    mask = np.zeros(shape, dtype=bool)
+    for _ in range(count):
+        center = [rng.uniform(0.25, 0.75) * n for n in shape]
+        radii = [rng.uniform(0.05, 0.12) * n for n in shape]
+        distance = sum(((axis - c) / r) ** 2 for axis, c, r in zip(grid, center, radii))
+        mask |= distance <= 1.0
+    return mask
+
+
+def mri_volume(shape: Tuple[int, ...], seed: int = 0) -> np.ndarray:
+    """T1-like intensities: noisy tissue with brighter lesions"""
+    rng = np.random.default_rng(seed)
+    volume = rng.normal(300.0, 40.0, shape).astype(np.float32)
+    volume[_lesions(shape, rng)] += 400.0
+    return volume
+
+
+def ct_volume(shape: Tuple[int, ...], seed: int = 0) -> np.ndarray:
+    """Hounsfield units: air around a soft-tissue body with denser lesions"""
+    rng = np.random.default_rng(seed)
+    volume = np.full(shape, -1000.0, dtype=np.float32)
+    grid = np.ogrid[tuple(slice(0, n) for n in shape[:2])]
+    body = sum(((axis - n / 2) / (0.42 * n)) ** 2 for axis, n in zip(grid, shape[:2])) <= 1.0
+    volume[body] = 40.0
+    volume += rng.normal(0.0, 15.0, shape).astype(np.float32)
+    volume[_lesions(shape, rng)] = 90.0
+    return volume
+
+
+def write_nifti(path: str, volume: np.ndarray, spacing: Tuple[float, ...] = (1.0, 1.0, 1.0)) -> str:
+    import nibabel as nib
+
+    image = nib.Nifti1Image(volume, np.diag(list(spacing) + [1.0]))
+    image.header.set_zooms(spacing)
+    nib.save(image, path)
+    return path
+
+
+def _save_dicom(path: str, dataset) -> None:
+    try:
+        dataset.save_as(path, enforce_file_format=True)
+    except TypeError:
+        # pydicom < 3
+        dataset.is_little_endian = True
+        dataset.is_implicit_VR = False
+        dataset.save_as(path, write_like_original=False)
+
+
+def _dicom_dataset(modality: str, pixels: np.ndarray, sop_class: str):
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = sop_class
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    dataset = Dataset()
+    dataset.file_meta = meta
+    dataset.SOPClassUID = sop_class
+    dataset.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    dataset.StudyInstanceUID = generate_uid()
+    dataset.SeriesInstanceUID = generate_uid()
+    dataset.Modality = modality
+    dataset.PatientID = "BENCH"
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = "MONOCHROME2"
+    dataset.Rows, dataset.Columns = pixels.shape[-2:]
+    dataset.BitsAllocated = 16
+    dataset.BitsStored = 16
+    dataset.HighBit = 15
+    dataset.PixelData = pixels.tobytes()
+    return dataset
+
+
+def write_ct_dicom(path: str, volume: np.ndarray, spacing: Tuple[float, ...] = (1.0, 1.0, 1.0)) -> str:
+    """Multi-frame CT with the volume stored as frames (z, y, x) and a HU rescale"""
+    intercept = -1024.0
+    frames = np.ascontiguousarray(volume.transpose(2, 1, 0) - intercept).clip(0, 65535).astype(np.uint16)
+    dataset = _dicom_dataset("CT", frames, "1.2.840.10008.5.1.4.1.1.2")
+    dataset.NumberOfFrames = frames.shape[0]
+    dataset.PixelRepresentation = 0
+    dataset.RescaleIntercept = intercept
+    dataset.RescaleSlope = 1.0
+    dataset.PixelSpacing = [spacing[1], spacing[0]]
+    dataset.SliceThickness = spacing[2]
+    _save_dicom(path, dataset)
+    return path
+
+
+def xray_image(shape: Tuple[int, int], seed: int = 0) -> np.ndarray:
+    """Chest-radiograph-like 8-bit image: bright mediastinum, darker lungs"""
+    rng = np.random.default_rng(seed)
+    rows, cols = np.ogrid[0:shape[0], 0:shape[1]]
+    lungs = (((cols - shape[1] * 0.3) / (shape[1] * 0.18)) ** 2 + ((rows - shape[0] * 0.5) / (shape[0] * 0.32)) ** 2 <= 1) | \
+            (((cols - shape[1] * 0.7) / (shape[1] * 0.18)) ** 2 + ((rows - shape[0] * 0.5) / (shape[0] * 0.32)) ** 2 <= 1)
+    image = np.full(shape, 170.0, dtype=np.float32)
+    image[lungs] = 60.0
+    image += rng.normal(0.0, 12.0, shape)
+    return image.clip(0, 255).astype(np.uint8)
+
+
+def write_xray_png(path: str, image: np.ndarray) -> str:
+    Image.fromarray(image).save(path)
+    return path
+
+
+def write_xray_dicom(path: str, image: np.ndarray, spacing_mm: float = 0.14) -> str:
+    dataset = _dicom_dataset("DX", image.astype(np.uint16) * 256, "1.2.840.10008.5.1.4.1.1.1.1")
+    dataset.PixelRepresentation = 0
+    dataset.ImagerPixelSpacing = [spacing_mm, spacing_mm]
+    _save_dicom(path, dataset)
+    return path
+
+
+def histo_image(shape: Tuple[int, int], seed: int = 0) -> np.ndarray:
+    """H&E-like RGB texture: pink stroma with purple nuclei"""
+    rng = np.random.default_rng(seed)
+    image = np.empty(shape + (3,), dtype=np.float32)
+    image[...] = (232.0, 180.0, 205.0)
+    nuclei = rng.random(shape) < 0.02
+    for _ in range(2):
+        # Grow the seeds into small blobs
+        nuclei |= np.roll(nuclei, 1, 0) | np.roll(nuclei, 1, 1)
+    image[nuclei] = (110.0, 60.0, 150.0)
+    image += rng.normal(0.0, 10.0, image.shape)
+    return image.clip(0, 255).astype(np.uint8)
+
+
+def write_histo_jpeg(path: str, image: np.ndarray, quality: int = 90) -> str:
+    Image.fromarray(image).save(path, quality=quality)
+    return path
+
+
+def generate(directory: str, size: str, seed: int = 0) -> Dict[str, str]:
+    """Write one input of every kind for a size preset and return their paths"""
+    os.makedirs(directory, exist_ok=True)
+    shapes = SIZES[size]
+    paths = {
+        "mri_nifti": write_nifti(os.path.join(directory, f"mri_{size}.nii.gz"), mri_volume(shapes["volume"], seed)),
+        "ct_nifti": write_nifti(os.path.join(directory, f"ct_{size}.nii.gz"), ct_volume(shapes["volume"], seed)),
+        "ct_dicom": write_ct_dicom(os.path.join(directory, f"ct_{size}.dcm"), ct_volume(shapes["volume"], seed)),
+        "xray_png": write_xray_png(os.path.join(directory, f"xray_{size}.png"), xray_image(shapes["xray"], seed)),
+        "xray_dicom": write_xray_dicom(os.path.join(directory, f"xray_{size}.dcm"), xray_image(shapes["xray"], seed)),
+        "histo_jpeg": write_histo_jpeg(os.path.join(directory, f"histo_{size}.jpg"), histo_image(shapes["histo"], seed)),
+    }
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Output directory")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("🧪 Synthetic Benchmark Data")
+    print("=" * 60)
+    for size in args.sizes:
+        for kind, path in generate(args.directory, size, args.seed).items():
+            print(f"{size:<7} {kind:<11} {os.path.getsize(path) / 1e6:>8.2f} MB  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Script to export the histopathology classifier for optimized inference.
+Produces a frozen TorchScript artifact and an ONNX artifact with BatchNorm
+folded into the convolutions, then checks both against the eager model.
+"""
+
+import os
+import sys
+import argparse
+import copy
+
+import torch
+
+# Add backend to path
+sys.path.append('backend')
+
+from app.services.histo_classifier import BreastCancerCNN
+from app.services.inference_backends import (
+    EagerBackend, TorchScriptBackend, OnnxBackend,
+    export_torchscript, export_onnx, parity_error, HISTO_PARITY_TOLERANCE
+)
+
+INPUT_SHAPE = (1, 3, 224, 224)
+
+
+def load_model(weights_path: str) -> BreastCancerCNN:
+    """Load BreastCancerCNN weights in eval mode"""
+    model = BreastCancerCNN(num_classes=4)
+    if weights_path and os.path.exists(weights_path):
+        model.load_state_dict(torch.load(weights_path, map_location="cpu"))
+        print(f"📦 Loaded weights from: {weights_path}")
+    else:
+        print(f"⚠️  Weights not found at {weights_path}. Exporting random weights.")
+    return model.eval()
+
+
+def export_models(weights_path: str, out_dir: str, formats: list, opset: int):
+    """Export the requested artifacts and verify numerical parity"""
+    print("📤 Exporting BreastCancerCNN")
+    print("=" * 50)
+
+    os.makedirs(out_dir, exist_ok=True)
+    model = load_model(weights_path)
+    folded = copy.deepcopy(model).fold_batchnorm()
+    example = torch.randn(*INPUT_SHAPE)
+    reference = EagerBackend(model)
+    device = torch.device("cpu")
+    failed = False
+
+    if "torchscript" in formats:
+        path = os.path.join(out_dir, "breast_cancer_cnn.ts")
+        export_torchscript(folded, path, example)
+        error = parity_error(reference, TorchScriptBackend(path, device), (8,) + INPUT_SHAPE[1:], device)
+        failed |= error > HISTO_PARITY_TOLERANCE
+        print(f"✅ TorchScript saved to: {path} ({os.path.getsize(path) / (1024*1024):.2f} MB, max error {error:.2e})")
+
+    if "onnx" in formats:
+        path = os.path.join(out_dir, "breast_cancer_cnn.onnx")
+        export_onnx(folded, path, example, opset=opset)
+        try:
+            error = parity_error(reference, OnnxBackend(path), (8,) + INPUT_SHAPE[1:], device)
+            failed |= error > HISTO_PARITY_TOLERANCE
+            print(f"✅ ONNX saved to: {path} ({os.path.getsize(path) / (1024*1024):.2f} MB, max error {error:.2e})")
+        except ImportError:
+            print(f"✅ ONNX saved to: {path} (onnxruntime not installed, parity not checked)")
+
+    if failed:
+        print(f"❌ Parity check failed (tolerance {HISTO_PARITY_TOLERANCE:.0e})")
+        sys.exit(1)
+
+    print("\n" + "=" * 50)
+    print("🎉 Export completed!")
+    print("💡 Select a runtime with HISTO_RUNTIME=torchscript or HISTO_RUNTIME=onnx")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="backend/models/breast_cancer_cnn.pt", help="Eager state_dict to export")
+    parser.add_argument("--out-dir", default="backend/models", help="Directory for the exported artifacts")
+    parser.add_argument("--formats", nargs="+", choices=["torchscript", "onnx"], default=["torchscript", "onnx"])
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    args = parser.parse_args()
+
+    export_models(args.weights, args.out_dir, args.formats, args.opset)
@@ -23,6 +23,7 @@ const AnalysisForm = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [analysisStep, setAnalysisStep] = useState<"pending" | "processing" | "complete" | "error">("pending");
+  const [currentStage, setCurrentStage] = useState<string | null>(null);
 
   useEffect(() => {
     if (scanId) {
@@ -57,6 +58,13 @@ const AnalysisForm = () => {
 
     setLoading(true);
     setAnalysisStep("processing");
+    setCurrentStage(null);
+
+    // Stage progress is pushed by the server while the analysis request runs
+    const events = new EventSource(`http://localhost:8000/api/v1/events/?scan_id=${scanId}`);
+    events.addEventListener("stage", (event) => {
+      setCurrentStage(JSON.parse((event as MessageEvent).data).stage);
+    });
 
     try {
       const response = await fetch(`http://localhost:8000/api/v1/analyze/?scan_id=${scanId}`);
@@ -73,6 +81,7 @@ const AnalysisForm = () => {
       setError("Network error during analysis");
       setAnalysisStep("error");
     } finally {
+      events.close();
       setLoading(false);
     }
   };
@@ -151,7 +160,11 @@ const AnalysisForm = () => {
                 <div className="spinner"></div>
               </div>
               <h3>Running AI Analysis</h3>
-              <p>Processing medical image with advanced machine learning models...</p>
+              <p>
+                {currentStage
+                  ? `Current stage: ${currentStage.replace(/_/g, " ")}`
+                  : "Processing medical image with advanced machine learning models..."}
+              </p>
               <div className="processing-steps">
                 <div className="step-item">
                   <span className="step-icon">✓</span>
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Script to build an INT8 version of the histopathology classifier.
+Dynamic mode quantizes the linear layers only; static mode also quantizes
+the convolutions using activation ranges calibrated on sample images.
+"""
+
+import os
+import sys
+import argparse
+
+import torch
+
+# Add backend to path
+sys.path.append('backend')
+
+from app.services.histo_classifier import HistoClassifier
+from app.services.quantization import (
+    QUANTIZATION_MODES, quantize_dynamic, quantize_static, save_quantized, serialized_size
+)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif')
+
+
+def calibration_batches(classifier: HistoClassifier, directory: str, limit: int, batch_size: int):
+    """Yield preprocessed batches of sample images for calibration"""
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:limit]
+    if not paths:
+        raise ValueError(f"No calibration images found in {directory}")
+    for start in range(0, len(paths), batch_size):
+        yield classifier.preprocess_batch(paths[start:start + batch_size]).cpu()
+
+
+def build_quantized_model(weights: str, mode: str, calibration_dir: str, limit: int, batch_size: int):
+    """Load the float classifier and return (float_model, quantized_model)"""
+    classifier = HistoClassifier(model_path=weights, runtime="eager")
+    float_model = classifier.model.cpu().eval()
+    if mode == "dynamic":
+        return float_model, quantize_dynamic(float_model)
+    if not calibration_dir:
+        raise ValueError("Static quantization requires --calibration-dir")
+    batches = calibration_batches(classifier, calibration_dir, limit, batch_size)
+    return float_model, quantize_static(float_model, batches)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="backend/models/breast_cancer_cnn.pt", help="Float state_dict to quantize")
+    parser.add_argument("--mode", choices=QUANTIZATION_MODES, default="dynamic")
+    parser.add_argument("--calibration-dir", help="Directory of sample images for static calibration")
+    parser.add_argument("--calibration-limit", type=int, default=256, help="Maximum calibration images")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--out", default="backend/models/breast_cancer_cnn.int8.ts", help="Quantized TorchScript artifact")
+    args = parser.parse_args()
+
+    print(f"🗜️  Quantizing BreastCancerCNN ({args.mode})")
+    print("=" * 50)
+
+    float_model, quantized = build_quantized_model(
+        args.weights, args.mode, args.calibration_dir, args.calibration_limit, args.batch_size
+    )
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    save_quantized(quantized, args.out, torch.randn(1, 3, 224, 224))
+
+    float_size = serialized_size(float_model) / (1024 * 1024)
+    print(f"✅ Quantized model saved to: {args.out}")
+    print(f"📊 Float state_dict: {float_size:.2f} MB")
+    print(f"📊 INT8 artifact:    {os.path.getsize(args.out) / (1024 * 1024):.2f} MB")
+    print("💡 Load it with HISTO_RUNTIME=quantized")
+    print("📈 Compare accuracy and latency with: python benchmarks/histo_quantization.py")